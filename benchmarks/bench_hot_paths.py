@@ -0,0 +1,175 @@
+"""
+Benchmark the analysis and dashboard hot paths on synthetic logs of increasing length.
+
+Each history size runs in fresh worker processes, one timing the steps and one tracing their peak memory with
+tracemalloc, so module-level caches and tracing overhead do not leak between measurements. The steps run in the order
+the dashboard first calls them, followed by the incremental calls made once new readings are logged. Streamlit
+placeholders are replaced with stubs that discard their updates.
+
+```
+python benchmarks/bench_hot_paths.py --days 7 30 90 --output results.json
+```
+"""
+
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parents[0] / "src"))
+sys.path.insert(0, str(BENCH_DIR))
+
+import config  # noqa: E402
+
+
+class Placeholder:
+    """Stands in for the Streamlit elements updated by the dashboard."""
+
+    def __getattr__(self, name: str):
+        return lambda *args, **kwargs: None
+
+
+class Recorder:
+    def __init__(self, mode: str) -> None:
+        self.mode = mode
+        self.results = []
+
+    def __call__(self, name: str, fn, *args):
+        if self.mode == "memory":
+            tracemalloc.start()
+            result = fn(*args)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+            self.results.append({"step": name, "peak_mb": peak / 2**20})
+        else:
+            start = time.perf_counter()
+            result = fn(*args)
+            self.results.append({"step": name, "seconds": time.perf_counter() - start})
+        return result
+
+
+def log_new_readings(storage, sensors: list, n_rows: int) -> None:
+    """Append readings continuing each log, as the logger would between two polls."""
+    for sensor in sensors:
+        last = storage.load(sensor).tail(1)
+        value, ts = float(last[sensor].iloc[0]), last["timestamp"].iloc[0]
+        rows = [(value, (ts + timedelta(seconds=config.log_interval * (i + 1))).to_pydatetime()) for i in range(n_rows)]
+        storage.append(sensor, rows)
+
+
+def run_worker(days: float, backend: str, mode: str, new_rows: int) -> list:
+    with tempfile.TemporaryDirectory() as tmp:
+        # Point the plant registry at the synthetic logs before anything reads the paths
+        config.data_path = Path(tmp) / "data"
+        config.state_path = Path(tmp) / "state"
+        config.storage_backend = backend
+
+        from generate_data import generate_logs
+
+        generate_logs(config.data_path, days, backend)
+
+        from rollups import rebuild_rollups
+        from sensor_calculations import (
+            calc_cycle,
+            calc_metrics,
+            determine_last_watered,
+            determine_next_water,
+            load_latest_data,
+            load_latest_reading,
+            log_storage,
+            plant,
+            poll_sensors,
+            read_sensor_updates,
+        )
+        from sensor_store import SensorRingBuffer
+        from window_stats import SensorStats
+
+        sensors = list(config.configured_sensors)
+        record = Recorder(mode)
+        for sensor in sensors:
+            rebuild_rollups(sensor, log_storage, plant.rollup_path)
+
+        record("load_latest_data", load_latest_data, log_storage.log_path("moisture"))
+        last_day = datetime.now() - timedelta(days=1)
+        record("load_latest_data (last day)", load_latest_data, log_storage.log_path("moisture"), last_day)
+        for sensor in sensors:
+            record(f"load_latest_reading {sensor} (first)", load_latest_reading, sensor)
+        log_new_readings(log_storage, sensors, new_rows)
+        for sensor in sensors:
+            record(f"load_latest_reading {sensor} (new rows)", load_latest_reading, sensor)
+
+        record("calc_cycle (first)", calc_cycle, None)
+        last_watered = record("determine_last_watered", determine_last_watered, None)
+        record("determine_next_water (first)", determine_next_water, last_watered)
+        log_new_readings(log_storage, sensors, new_rows)
+        record("determine_next_water (new rows)", determine_next_water, last_watered)
+
+        sensor_dict = {"all": Placeholder()}
+        for sensor in sensors:
+            history = load_latest_data(log_storage.log_path(sensor))
+            store = SensorRingBuffer.from_df(history, sensor, config.chart_window_points)
+            stats = SensorStats()
+            stats.extend(*store.window())
+            sensor_dict[sensor] = [Placeholder(), Placeholder(), store, Placeholder(), stats]
+        log_new_readings(log_storage, sensors, new_rows)
+        updates = record("read_sensor_updates", read_sensor_updates, sensors)
+        record("poll_sensors", poll_sensors, sensor_dict, sensors, updates)
+        record("calc_metrics", calc_metrics, sensor_dict["moisture"][4], "moisture")
+    return record.results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the analysis and dashboard hot paths")
+    parser.add_argument("--days", type=float, nargs="+", default=[7, 30, 90], help="History sizes in days")
+    parser.add_argument("--backend", default="csv", help="Storage backend of the synthetic logs")
+    parser.add_argument("--new-rows", type=int, default=10, help="Readings logged between incremental calls")
+    parser.add_argument("--output", type=Path, help="Write the results as JSON to this file")
+    parser.add_argument("--worker", choices=["time", "memory"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.worker:
+        # Worker output goes to stdout as JSON, progress printed by the dashboard code goes to stderr
+        stdout, sys.stdout = sys.stdout, sys.stderr
+        results = run_worker(args.days[0], args.backend, args.worker, args.new_rows)
+        stdout.write(json.dumps(results))
+        return
+
+    rows_per_day = 86400 / config.log_interval
+    runs = []
+    for days in args.days:
+        steps = {}
+        for mode in ["time", "memory"]:
+            command = [sys.executable, __file__, "--worker", mode, "--days", str(days), "--backend", args.backend]
+            command += ["--new-rows", str(args.new_rows)]
+            output = subprocess.run(command, check=True, stdout=subprocess.PIPE, text=True).stdout
+            for result in json.loads(output):
+                steps.setdefault(result["step"], {"step": result["step"]}).update(result)
+        runs.append({"days": days, "rows": int(days * rows_per_day), "steps": list(steps.values())})
+        for step in steps.values():
+            print(f"{days:>6g} days  {step['step']:<45}{step['seconds'] * 1000:>10.1f} ms{step['peak_mb']:>10.1f} MB")
+
+    if args.output:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, stdout=subprocess.PIPE, text=True
+        ).stdout.strip()
+        report = {
+            "commit": commit,
+            "created": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "backend": args.backend,
+            "runs": runs,
+        }
+        args.output.write_text(json.dumps(report, indent=2))
+        print(f"Wrote results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+Benchmark the cold-start import time of each entry point.
+
+Every run imports the entry point in a fresh interpreter with `-X importtime`. The first run also pays for compiling
+bytecode and reading the libraries from disk, so it is reported separately from the median of the later runs. The
+libraries deferred until first use are timed on their own to show what the entry points no longer pay for up front.
+
+```
+python benchmarks/bench_import.py --runs 5 --output imports.json
+```
+"""
+
+import argparse
+import json
+import platform
+import statistics
+import subprocess
+import sys
+from datetime import datetime
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+SRC_DIR = BENCH_DIR.parents[0] / "src"
+
+ENTRY_POINTS = {
+    "plant_watch": "plant_watch",
+    "plant_log": "plant_log",
+    "fleet": "fleet",
+    "rollups": "rollups",
+}
+# Imported on first use rather than at startup
+DEFERRED = {
+    "statsmodels (first forecast)": "statsmodels.tsa.ar_model",
+}
+SCRIPT = "import time; start = time.perf_counter(); import {module}; print(time.perf_counter() - start)"
+
+
+def time_import(module: str) -> dict:
+    """
+    Import a module in a fresh interpreter.
+
+    Args:
+        module (str): The module to import.
+
+    Returns:
+        dict: The import time in seconds and the seconds spent importing each top-level package, or the error if the
+        import failed.
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", SCRIPT.format(module=module)],
+        cwd=SRC_DIR,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+    )
+    if result.returncode != 0:
+        return {"error": result.stderr.strip().splitlines()[-1]}
+    packages = {}
+    for line in result.stderr.splitlines():
+        self_us, _, name = line.partition(":")[2].split("|") if "|" in line else ("", "", "")
+        if not self_us.strip().isdigit():
+            continue
+        # Sum the time spent in each module itself by distribution, e.g. every pandas.* module under pandas
+        package = name.strip().split(".")[0]
+        packages[package] = packages.get(package, 0) + int(self_us) / 1e6
+    return {"seconds": float(result.stdout.strip().splitlines()[-1]), "packages": packages}
+
+
+def benchmark(module: str, runs: int, top: int) -> dict:
+    results = [time_import(module) for _ in range(runs)]
+    if "error" in results[0]:
+        return {"module": module, "error": results[0]["error"]}
+    later = [result["seconds"] for result in results[1:]] or [results[0]["seconds"]]
+    packages = sorted(results[-1]["packages"].items(), key=lambda item: item[1], reverse=True)
+    return {
+        "module": module,
+        "first_s": results[0]["seconds"],
+        "median_s": statistics.median(later),
+        "slowest_imports": [{"package": name, "seconds": seconds} for name, seconds in packages[:top]],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Benchmark the import time of the entry points")
+    parser.add_argument("--runs", type=int, default=5, help="Fresh interpreters per entry point")
+    parser.add_argument("--top", type=int, default=5, help="Slowest packages listed per entry point")
+    parser.add_argument("--output", type=Path, help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    entries = []
+    for group, modules in [("entry point", ENTRY_POINTS), ("deferred", DEFERRED)]:
+        for name, module in modules.items():
+            entry = {"name": name, "kind": group, **benchmark(module, args.runs, args.top)}
+            entries.append(entry)
+            if "error" in entry:
+                print(f"{name:<30}failed: {entry['error']}")
+                continue
+            slowest = ", ".join(f"{item['package']} {item['seconds']:.2f}s" for item in entry["slowest_imports"])
+            print(f"{name:<30}first {entry['first_s']:>6.2f} s  median {entry['median_s']:>6.2f} s  ({slowest})")
+
+    if args.output:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BENCH_DIR, stdout=subprocess.PIPE, text=True
+        ).stdout.strip()
+        report = {
+            "commit": commit,
+            "created": datetime.now().isoformat(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "runs": args.runs,
+            "imports": entries,
+        }
+        args.output.write_text(json.dumps(report, indent=2))
+        print(f"Wrote results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""
+Generate realistic synthetic sensor logs for benchmarking.
+
+Moisture dries towards the dry calibration value along an exponential curve, jumps back up on each watering every 4
+to 9 days and carries sensor noise with occasional spikes. The last watering is placed a day before the end of the
+logs so the forecaster has a cycle to fit. Temperature and humidity follow daily cycles and are rounded to whole
+numbers like the DHT11 readings.
+
+```
+python benchmarks/generate_data.py --days 90 --output /tmp/plant_data
+```
+"""
+
+import argparse
+import sys
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "src"))
+
+from config import log_interval, sensor_dry, sensor_wet  # noqa: E402
+from storage import get_storage_backend  # noqa: E402
+
+# Rows encoded per append so long histories do not build one huge buffer
+CHUNK_ROWS = 100_000
+
+
+def generate_moisture(times: np.ndarray, rng: np.random.Generator) -> np.ndarray:
+    days = (times - times[0]) / np.timedelta64(1, "D")
+    total = days[-1]
+    waterings = [total - 1]
+    while waterings[0] > 0:
+        waterings.insert(0, waterings[0] - rng.uniform(4, 9))
+    # The first watering is at or before the start, so every reading belongs to a cycle
+    cycle = np.searchsorted(waterings, days, side="right") - 1
+    since = days - np.asarray(waterings)[cycle]
+    peak = rng.uniform(88, 96, len(waterings))[cycle]
+    tau = rng.uniform(2.5, 5, len(waterings))[cycle]
+    floor = 5
+    moisture_pct = floor + (peak - floor) * np.exp(-since / tau)
+    raw = sensor_dry + moisture_pct / 100 * (sensor_wet - sensor_dry)
+    noise = rng.normal(0, 4, len(raw))
+    spikes = rng.random(len(raw)) < 0.001
+    noise[spikes] += rng.normal(0, 80, spikes.sum())
+    return np.round(raw + noise, 1)
+
+
+def generate_climate(times: np.ndarray, rng: np.random.Generator) -> tuple:
+    days = (times - times[0]) / np.timedelta64(1, "D")
+    hour = pd.DatetimeIndex(times).hour.values + pd.DatetimeIndex(times).minute.values / 60
+    daily = np.sin(2 * np.pi * (hour - 9) / 24)
+    seasonal = 2 * np.sin(2 * np.pi * days / 365)
+    temperature = np.round(21 + 3 * daily + seasonal + rng.normal(0, 0.5, len(times)))
+    humidity = np.round(55 - 6 * daily - seasonal + rng.normal(0, 2, len(times)))
+    return temperature, humidity
+
+
+def generate_logs(root: Path, days: float, backend: str = "csv", seed: int = 0, interval: float = log_interval) -> int:
+    """
+    Write synthetic moisture, temperature and humidity logs.
+
+    Args:
+        root (Path): The directory to write the logs to, existing logs are replaced.
+        days (float): The days of history to generate, ending now.
+        backend (str, optional): The storage backend to write. Defaults to "csv".
+        seed (int, optional): The random seed. Defaults to 0.
+        interval (float, optional): Seconds between readings. Defaults to `log_interval`.
+
+    Returns:
+        int: The number of readings written per sensor.
+    """
+    rng = np.random.default_rng(seed)
+    n_rows = int(days * 86400 / interval)
+    end = np.datetime64(pd.Timestamp.now().floor("s"))
+    times = end - (np.arange(n_rows)[::-1] * interval * 10**9).astype("timedelta64[ns]")
+    temperature, humidity = generate_climate(times, rng)
+    series = {"moisture": generate_moisture(times, rng), "temperature": temperature, "humidity": humidity}
+
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    storage = get_storage_backend(backend, root)
+    timestamps = pd.DatetimeIndex(times).to_pydatetime()
+    for sensor, values in series.items():
+        storage.log_path(sensor).unlink(missing_ok=True)
+        for start in range(0, n_rows, CHUNK_ROWS):
+            chunk = slice(start, start + CHUNK_ROWS)
+            storage.append(sensor, list(zip(values[chunk].tolist(), timestamps[chunk])))
+    return n_rows
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Generate synthetic sensor logs")
+    parser.add_argument("--days", type=float, default=90)
+    parser.add_argument("--output", type=Path, required=True)
+    parser.add_argument("--backend", default="csv")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    n_rows = generate_logs(args.output, args.days, args.backend, args.seed)
+    print(f"Wrote {n_rows} readings per sensor to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
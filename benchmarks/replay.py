@@ -0,0 +1,157 @@
+"""
+Replay simulated or recorded sensor data through the logger and the dashboard at accelerated time.
+
+The logger runs on a scaled clock with the simulator or replay sensor backend and writes to a temporary data
+directory. The dashboard's shared data service ingests the logs, and a headless session renders every update through
+`poll_sensors` with stubbed Streamlit elements. Ingest-to-display latency is measured in real time from each logged
+reading of the dashboard plant until a session has rendered it, alongside the write and display throughput.
+
+```
+python benchmarks/replay.py --speedup 500 --duration 60
+python benchmarks/replay.py --source replay --replay-path data --speedup 100
+```
+"""
+
+import argparse
+import contextlib
+import json
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parents[0] / "src"))
+sys.path.insert(0, str(BENCH_DIR))
+
+import config  # noqa: E402
+from bench_hot_paths import Placeholder  # noqa: E402
+
+
+def replay(source: str, speedup: float, duration: float, n_plants: int = None) -> dict:
+    """
+    Run the logger and a headless dashboard session for `duration` real seconds.
+
+    Args:
+        source (str): The sensor backend, "simulator" or "replay".
+        speedup (float): Simulated seconds per real second.
+        duration (float): Real seconds to run for.
+        n_plants (int, optional): Simulate this many plants instead of the configured ones.
+
+    Returns:
+        dict: The throughput and latency report.
+    """
+    with tempfile.TemporaryDirectory() as tmp:
+        # Point the plant registry at a scratch directory before anything reads the paths
+        config.data_path = Path(tmp) / "data"
+        config.state_path = Path(tmp) / "state"
+        if n_plants is not None:
+            config.plants = {
+                f"plant{i}": {"name": f"Plant {i}", "moisture_pin": i, "temp_humid_pin": 100 + i}
+                for i in range(n_plants)
+            }
+            config.dashboard_plant = "plant0"
+
+        from clock import ScaledClock
+        from plant_log import run_logger
+        from plants import load_plants
+        from sensor_backends import create_sensors
+
+        clock = ScaledClock(speedup)
+        fleet = load_plants()
+        sensors = {plant_id: create_sensors(plant, source, clock) for plant_id, plant in fleet.items()}
+        written = {}
+        counts = {"written": 0, "displayed": 0}
+
+        def on_write(plant_id: str, sensor: str, value: float, timestamp) -> None:
+            counts["written"] += 1
+            if plant_id == config.dashboard_plant:
+                # Logs hold whole seconds, which are unique at the logger's interval
+                written[(sensor, pd.Timestamp(timestamp).floor("s"))] = time.monotonic()
+
+        stop = threading.Event()
+        logger = threading.Thread(target=run_logger, args=(fleet, sensors, clock, stop, on_write), daemon=True)
+        logger.start()
+        dashboard_storage = fleet[config.dashboard_plant].storage()
+        while not all(dashboard_storage.log_path(sensor).exists() for sensor in config.configured_sensors):
+            time.sleep(0.05)
+
+        from data_service import DataService
+        from sensor_calculations import poll_sensors
+        from sensor_store import SensorRingBuffer
+        from window_stats import SensorStats
+
+        service = DataService(config.configured_sensors.keys())
+        service.attach()
+        history, cursors = service.history()
+        sensor_dict = {"all": Placeholder()}
+        for sensor in config.configured_sensors:
+            store = SensorRingBuffer.from_df(history[sensor], sensor, config.chart_window_points)
+            stats = SensorStats()
+            stats.extend(*store.window())
+            sensor_dict[sensor] = [Placeholder(), Placeholder(), store, Placeholder(), stats]
+
+        latencies = []
+        started = time.monotonic()
+        version = service.version
+        while time.monotonic() - started < duration:
+            version = service.wait_for_update(version, 1)
+            updates, cursors = service.updates(cursors)
+            poll_sensors(sensor_dict, config.configured_sensors, updates)
+            displayed_at = time.monotonic()
+            for sensor, new_readings in updates.items():
+                for timestamp in new_readings["timestamp"]:
+                    written_at = written.get((sensor, pd.Timestamp(timestamp).floor("s")))
+                    if written_at is not None:
+                        latencies.append(displayed_at - written_at)
+                        counts["displayed"] += 1
+        elapsed = time.monotonic() - started
+        stop.set()
+        logger.join()
+
+    latencies = np.array(latencies) if latencies else np.array([np.nan])
+    return {
+        "source": source,
+        "speedup": speedup,
+        "plants": len(fleet),
+        "real_seconds": elapsed,
+        "simulated_hours": elapsed * speedup / 3600,
+        "rows_written": counts["written"],
+        "rows_written_per_s": counts["written"] / elapsed,
+        "readings_displayed": counts["displayed"],
+        "readings_displayed_per_s": counts["displayed"] / elapsed,
+        "latency_p50_s": float(np.percentile(latencies, 50)),
+        "latency_p95_s": float(np.percentile(latencies, 95)),
+        "latency_max_s": float(latencies.max()),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay sensor data through the logger and dashboard")
+    parser.add_argument("--source", choices=["simulator", "replay"], default="simulator")
+    parser.add_argument("--replay-path", type=Path, help="Directory of recorded logs for the replay source")
+    parser.add_argument("--speedup", type=float, default=500, help="Simulated seconds per real second")
+    parser.add_argument("--duration", type=float, default=60, help="Real seconds to run for")
+    parser.add_argument("--plants", type=int, help="Simulate this many plants instead of the configured ones")
+    parser.add_argument("--output", type=Path, help="Write the report as JSON to this file")
+    parser.add_argument("--verbose", action="store_true", help="Show the logger and dashboard output")
+    args = parser.parse_args()
+    if args.replay_path is not None:
+        config.replay_path = args.replay_path.resolve()
+
+    with open(os.devnull, "w") as devnull:
+        with contextlib.redirect_stdout(sys.stdout if args.verbose else devnull):
+            report = replay(args.source, args.speedup, args.duration, args.plants)
+    for key, value in report.items():
+        print(f"{key:<26}{value:.3f}" if isinstance(value, float) else f"{key:<26}{value}")
+    if args.output:
+        args.output.write_text(json.dumps(report, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+import threading
+from typing import Callable, Dict, List
+
+from clock import Clock
+from instrumentation import count, timer
+
+
+class SensorChannel:
+    """
+    Samples one physical sensor at a fixed rate on its own thread.
+
+    A single read may yield several sensor values (e.g. the DHT11 returns humidity and temperature together), so
+    `read` returns a dict of sensor name to value. A read that raises or returns None for a value counts as a failure
+    for that sensor.
+
+    Args:
+        name (str): The name of the channel used in logs.
+        read (Callable): Takes no arguments and returns a dict of sensor name to value.
+        sensors (List[str]): The sensor names produced by `read`.
+        rate_hz (float): The target number of reads per second.
+        clock (Clock, optional): The clock the rate is kept by. Defaults to real time.
+    """
+
+    def __init__(self, name: str, read: Callable, sensors: List[str], rate_hz: float, clock: Clock = None) -> None:
+        self.name = name
+        self.read = read
+        self.sensors = sensors
+        self.rate_hz = rate_hz
+        self.clock = Clock() if clock is None else clock
+        self.samples = {sensor: [] for sensor in sensors}
+        self.failures = {sensor: 0 for sensor in sensors}
+        self.lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name=f"acquire-{name}", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def set_rate(self, rate_hz: float) -> None:
+        """Change the target read rate, taking effect after the next read."""
+        self.rate_hz = rate_hz
+
+    def _run(self) -> None:
+        next_read = self.clock.monotonic()
+        while not self._stop.is_set():
+            try:
+                with timer("sensor_read", channel=self.name):
+                    values = self.read()
+            except Exception as e:
+                print(f"{self.name} read failed: {e}")
+                values = {}
+            with self.lock:
+                for sensor in self.sensors:
+                    value = values.get(sensor)
+                    if value is None:
+                        self.failures[sensor] += 1
+                        count("sensor_read_failures", sensor=sensor)
+                    else:
+                        self.samples[sensor].append(value)
+            # Keep a steady rate without drifting when a read is slow, skip missed slots rather than bursting
+            next_read += 1 / self.rate_hz
+            delay = next_read - self.clock.monotonic()
+            if delay < 0:
+                next_read = self.clock.monotonic()
+                delay = 0
+            self._stop.wait(delay / self.clock.speedup)
+
+    def drain(self) -> Dict[str, tuple]:
+        """Return and clear the samples and failure counts collected since the last drain."""
+        with self.lock:
+            drained = {sensor: (self.samples[sensor], self.failures[sensor]) for sensor in self.sensors}
+            self.samples = {sensor: [] for sensor in self.sensors}
+            self.failures = {sensor: 0 for sensor in self.sensors}
+        return drained
+
+
+class AcquisitionScheduler:
+    """
+    Runs sensor channels concurrently and aggregates their samples over fixed time windows.
+
+    Args:
+        channels (List[SensorChannel]): The channels to sample.
+        clock (Clock, optional): The clock the windows are kept by. Defaults to real time.
+    """
+
+    def __init__(self, channels: List[SensorChannel], clock: Clock = None) -> None:
+        self.channels = channels
+        self.clock = Clock() if clock is None else clock
+        self.stats = {}
+        self._window_start = None
+
+    def start(self) -> None:
+        for channel in self.channels:
+            channel.start()
+        self._window_start = self.clock.monotonic()
+
+    def stop(self) -> None:
+        for channel in self.channels:
+            channel.stop()
+
+    def collect(self, window: float) -> Dict[str, list]:
+        """
+        Wait until the current aggregation window ends and return the samples taken during it.
+
+        Args:
+            window (float): The length of the aggregation window in seconds.
+
+        Returns:
+            Dict[str, list]: The samples of each sensor in the window, oldest first.
+        """
+        delay = self._window_start + window - self.clock.monotonic()
+        if delay > 0:
+            self.clock.sleep(delay)
+        window_end = self.clock.monotonic()
+        elapsed = window_end - self._window_start
+        self._window_start = window_end
+
+        readings = {}
+        self.stats = {}
+        for channel in self.channels:
+            for sensor, (samples, failures) in channel.drain().items():
+                readings[sensor] = samples
+                self.stats[sensor] = {
+                    "rate_hz": len(samples) / elapsed,
+                    "target_hz": channel.rate_hz,
+                    "failures": failures,
+                }
+        return readings
+
+    def stats_string(self) -> str:
+        """Return the achieved sample rate and read failures of each sensor in the last window."""
+        return ", ".join(
+            f"{sensor}: {stat['rate_hz']:.2f}/{stat['target_hz']:.2f} Hz, {stat['failures']} failed"
+            for sensor, stat in self.stats.items()
+        )
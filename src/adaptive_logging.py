@@ -0,0 +1,101 @@
+from datetime import datetime
+
+import pandas as pd
+
+from config import burst_duration, heartbeat_interval, log_interval
+
+
+class DeadbandFilter:
+    """
+    Decides which aggregated readings of one sensor are written to its log.
+
+    A reading is written when it moves more than `deadband` from the last written value or `heartbeat` seconds have
+    passed since the last written row. Each row's value therefore holds until the next row, and a gap longer than the
+    heartbeat means the logger was not running. A change of more than `burst_threshold` between consecutive readings,
+    such as a watering, marks the sensor as bursting for `burst_duration` seconds so it can be sampled at full rate.
+
+    Args:
+        deadband (float): The change from the last written value that is worth writing.
+        burst_threshold (float): The change between consecutive readings that starts a burst.
+        heartbeat (float, optional): The longest gap in seconds between written rows. Defaults to
+            `heartbeat_interval`.
+        duration (float, optional): Seconds a burst lasts after the last sharp change. Defaults to `burst_duration`.
+    """
+
+    def __init__(
+        self,
+        deadband: float,
+        burst_threshold: float,
+        heartbeat: float = heartbeat_interval,
+        duration: float = burst_duration,
+    ) -> None:
+        self.deadband = deadband
+        self.burst_threshold = burst_threshold
+        self.heartbeat = heartbeat
+        self.duration = duration
+        self.readings = 0
+        self.written = 0
+        self._last_written = None
+        self._last_written_at = None
+        self._last_value = None
+        self._burst_until = None
+
+    def update(self, value: float, timestamp: datetime) -> bool:
+        """
+        Take the next aggregated reading.
+
+        Args:
+            value (float): The value of the reading.
+            timestamp (datetime): The time of the reading.
+
+        Returns:
+            bool: Whether the reading should be written.
+        """
+        self.readings += 1
+        if self._last_value is not None and abs(value - self._last_value) > self.burst_threshold:
+            self._burst_until = pd.Timestamp(timestamp) + pd.Timedelta(seconds=self.duration)
+        self._last_value = value
+
+        write = (
+            self._last_written is None
+            or abs(value - self._last_written) > self.deadband
+            or (pd.Timestamp(timestamp) - self._last_written_at).total_seconds() >= self.heartbeat
+        )
+        if write:
+            self.written += 1
+            self._last_written = value
+            self._last_written_at = pd.Timestamp(timestamp)
+        return write
+
+    def bursting(self, timestamp: datetime) -> bool:
+        """Return whether a sharp change was seen within the burst duration before `timestamp`."""
+        return self._burst_until is not None and pd.Timestamp(timestamp) < self._burst_until
+
+    def compression_ratio(self) -> float:
+        """Return the number of readings taken per row written."""
+        return self.readings / self.written if self.written else 1.0
+
+
+def step_series(
+    df: pd.DataFrame, sensor: str, interval: float = log_interval, max_hold: float = heartbeat_interval
+) -> pd.DataFrame:
+    """
+    Rebuild a regular series from a change-based log by holding each row's value until the next row.
+
+    Args:
+        df (pd.DataFrame): The logged rows with the sensor and timestamp columns, oldest first.
+        sensor (str): The name of the sensor.
+        interval (float, optional): The spacing of the rebuilt series in seconds. Defaults to `log_interval`.
+        max_hold (float, optional): The longest a value is held in seconds, longer gaps are left out as the logger was
+            not running. Defaults to `heartbeat_interval`.
+
+    Returns:
+        pd.DataFrame: A DataFrame with the sensor and timestamp columns at a regular interval.
+    """
+    if len(df) == 0:
+        return df
+    series = df.set_index("timestamp")[sensor]
+    series = series[~series.index.duplicated(keep="last")]
+    grid = pd.date_range(series.index[0], series.index[-1], freq=pd.Timedelta(seconds=interval))
+    held = series.reindex(grid, method="ffill", tolerance=pd.Timedelta(seconds=max_hold + interval))
+    return pd.DataFrame({sensor: held.values, "timestamp": grid}).dropna().reset_index(drop=True)
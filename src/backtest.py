@@ -0,0 +1,270 @@
+"""
+Backtest of the next-watering predictions on the historical moisture logs.
+
+A plant's moisture history is replayed at a series of simulated times. At each one the watering rule and the forecaster
+of `determine_next_water` see only the readings logged until then, and the predicted watering is compared with the
+next watering that actually followed. Every configuration of the parameter grid is evaluated, with the watering cycles
+of each configuration spread over a process pool. The report gives the distribution of the prediction error and the
+fit time of each configuration, to pick settings that are both cheaper and more accurate.
+
+```
+python backtest.py --plants malfoy --lags 100 250 500 --jump 5 10 --every 6h --output backtest.json
+```
+"""
+
+import argparse
+import itertools
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from adaptive_logging import step_series
+from config import adaptive_logging, backtest_interval, forecast_horizon, forecast_lags
+from forecaster import CycleForecaster
+from plants import Plant, load_plants
+from watering import watering_events
+
+PARAMETERS = ["lags", "horizon", "target", "jump"]
+OUTCOMES = ["forecast", "now", "beyond_horizon", "insufficient"]
+
+# The replayed history of each worker process, shared by its tasks
+_history = {}
+
+
+def load_history(plant: Plant, days: int = None) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Load a plant's moisture history as percentages.
+
+    Args:
+        plant (Plant): The plant.
+        days (int, optional): The days of history to load. Defaults to the whole log.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The moisture percentages and their epoch nanosecond timestamps, oldest first.
+    """
+    start = None if days is None else datetime.now() - timedelta(days=days)
+    df = plant.storage().load("moisture", start=start)
+    df = df.drop_duplicates().sort_values("timestamp", kind="stable")
+    moisture = (df["moisture"].values.astype(float) - plant.sensor_dry) / (plant.sensor_wet - plant.sensor_dry) * 100
+    return moisture, df["timestamp"].values.astype("datetime64[ns]").astype(np.int64)
+
+
+def _init_worker(values: np.ndarray, times: np.ndarray) -> None:
+    _history["values"] = values
+    _history["times"] = times
+    _history["events"] = {}
+
+
+def _events(jump: float) -> np.ndarray:
+    if jump not in _history["events"]:
+        _history["events"][jump] = watering_events(_history["values"], jump)
+    return _history["events"][jump]
+
+
+def replay_cycle(config: dict, evaluations: List[Tuple[int, int]]) -> List[dict]:
+    """
+    Predict the next watering at each simulated time of one actual watering cycle.
+
+    The forecaster is kept across the simulated times, so it is refitted when the watering rule starts a new cycle and
+    otherwise updated with the new readings, as on the dashboard.
+
+    Args:
+        config (dict): The `lags`, `horizon`, `target` and `jump` settings.
+        evaluations (List[Tuple[int, int]]): The index of the newest reading at each simulated time and the epoch
+            nanoseconds of the watering that followed it.
+
+    Returns:
+        List[dict]: One prediction per simulated time.
+    """
+    values, times = _history["values"], _history["times"]
+    events = _events(config["jump"])
+    forecaster = CycleForecaster(config["lags"], config["horizon"])
+    predictions = []
+    for index, actual in evaluations:
+        # The watering rule only sees the readings logged until the simulated time
+        seen = events[events <= index]
+        start = seen[-1] if len(seen) else 0
+        cycle_df = pd.DataFrame(
+            {"moisture": values[start : index + 1], "timestamp": pd.to_datetime(times[start : index + 1])}
+        )
+        if adaptive_logging:
+            cycle_df = step_series(cycle_df, "moisture")
+        prediction = {**config, "time": int(times[index]), "actual": actual, "fit_s": np.nan, "forecast_s": np.nan}
+        if cycle_df["moisture"].values[-1] < config["target"]:
+            prediction.update(outcome="now", predicted=int(times[index]))
+            predictions.append(prediction)
+            continue
+        try:
+            fit_start = time.perf_counter()
+            forecaster.update(cycle_df, pd.Timestamp(times[start]))
+            forecast_start = time.perf_counter()
+            water_time = forecaster.forecast_crossing(config["target"])
+            prediction.update(fit_s=forecast_start - fit_start, forecast_s=time.perf_counter() - forecast_start)
+        except ValueError:
+            prediction.update(outcome="insufficient", predicted=None)
+            predictions.append(prediction)
+            continue
+        if water_time is None:
+            prediction.update(outcome="beyond_horizon", predicted=None)
+        else:
+            prediction.update(outcome="forecast", predicted=int(water_time.value))
+        predictions.append(prediction)
+    return predictions
+
+
+def _replay_task(task: Tuple[dict, List[Tuple[int, int]]]) -> List[dict]:
+    return replay_cycle(*task)
+
+
+def evaluation_points(times: np.ndarray, truth: np.ndarray, every: str) -> Dict[int, List[Tuple[int, int]]]:
+    """
+    Pick the simulated times, grouped by the actual watering that followed them.
+
+    Args:
+        times (np.ndarray): The epoch nanosecond timestamps of the readings.
+        truth (np.ndarray): The reading indices of the actual waterings.
+        every (str): The pandas duration between simulated times.
+
+    Returns:
+        Dict[int, List[Tuple[int, int]]]: The index of the newest reading at each simulated time and the time of the
+        next watering, by the index of that watering. Times after the last watering have nothing to compare with.
+    """
+    if len(truth) < 2:
+        return {}
+    grid = pd.date_range(pd.Timestamp(times[truth[0]]), pd.Timestamp(times[truth[-1]]), freq=every)
+    indices = np.unique(np.searchsorted(times, grid.values.astype(np.int64), side="right") - 1)
+    indices = indices[indices < truth[-1]]
+    following = truth[np.searchsorted(truth, indices, side="right")]
+    cycles = {}
+    for index, watering in zip(indices, following):
+        cycles.setdefault(int(watering), []).append((int(index), int(times[watering])))
+    return cycles
+
+
+def summarise(predictions: pd.DataFrame) -> pd.DataFrame:
+    """
+    Summarise the predictions of each configuration.
+
+    Args:
+        predictions (pd.DataFrame): The predictions from `replay_cycle`.
+
+    Returns:
+        pd.DataFrame: Per configuration, the outcome counts, quantiles of the signed error in hours (predicted minus
+        actual watering) and absolute error of the timed predictions, and the mean and total fit and forecast times.
+    """
+    rows = []
+    quantiles = [0.1, 0.25, 0.5, 0.75, 0.9]
+    for config, group in predictions.groupby(PARAMETERS, sort=False):
+        timed_predictions = group[group["predicted"].notna()]
+        error = (timed_predictions["predicted"] - timed_predictions["actual"]).dt.total_seconds().values / 3600
+        if len(error) == 0:
+            error = np.array([np.nan])
+        outcomes = group["outcome"].value_counts()
+        rows.append(
+            {
+                **dict(zip(PARAMETERS, config)),
+                "predictions": len(group),
+                **{outcome: int(outcomes.get(outcome, 0)) for outcome in OUTCOMES},
+                "mae_h": np.abs(error).mean(),
+                "bias_h": error.mean(),
+                **{f"p{int(q * 100)}_h": value for q, value in zip(quantiles, np.quantile(error, quantiles))},
+                "abs_p90_h": np.quantile(np.abs(error), 0.9),
+                "fit_mean_ms": group["fit_s"].mean() * 1000,
+                "fit_total_s": group["fit_s"].sum(),
+                "forecast_mean_ms": group["forecast_s"].mean() * 1000,
+            }
+        )
+    return pd.DataFrame(rows).sort_values("mae_h", kind="stable").reset_index(drop=True)
+
+
+def backtest(
+    plant: Plant, grid: List[dict], every: str = backtest_interval, workers: int = None, days: int = None
+) -> Tuple[pd.DataFrame, pd.DataFrame]:
+    """
+    Backtest every configuration of a parameter grid on a plant's moisture history.
+
+    The actual waterings are found with the plant's `watering_jump_pct`, each configuration's own watering rule only
+    decides where its forecaster's cycles start.
+
+    Args:
+        plant (Plant): The plant.
+        grid (List[dict]): The configurations, each with `lags`, `horizon`, `target` and `jump`.
+        every (str, optional): The pandas duration between simulated times. Defaults to `backtest_interval`.
+        workers (int, optional): The number of worker processes. Defaults to the number of CPUs.
+        days (int, optional): The days of history to replay. Defaults to the whole log.
+
+    Returns:
+        Tuple[pd.DataFrame, pd.DataFrame]: The summary of each configuration and every prediction.
+    """
+    values, times = load_history(plant, days)
+    truth = watering_events(values, plant.watering_jump_pct)
+    cycles = evaluation_points(times, truth, every)
+    n_times = sum(len(evaluations) for evaluations in cycles.values())
+    print(f"{plant.name}: {len(values)} readings, {len(truth)} waterings, {n_times} simulated times")
+    if not cycles:
+        return pd.DataFrame(), pd.DataFrame()
+
+    # Longest cycles first, so a slow one does not run alone at the end
+    tasks = [(config, evaluations) for config in grid for evaluations in cycles.values()]
+    tasks.sort(key=lambda task: len(task[1]) * task[0]["lags"], reverse=True)
+    workers = os.cpu_count() if workers is None else workers
+    start = time.perf_counter()
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(values, times)) as executor:
+        predictions = pd.DataFrame(list(itertools.chain.from_iterable(executor.map(_replay_task, tasks))))
+    print(f"Replayed {len(tasks)} cycles of {len(grid)} configurations in {time.perf_counter() - start:.1f}s")
+    for column in ["time", "actual", "predicted"]:
+        predictions[column] = pd.to_datetime(predictions[column])
+    predictions = predictions.sort_values(PARAMETERS + ["time"], kind="stable").reset_index(drop=True)
+    return summarise(predictions), predictions
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Backtest the next-watering predictions on the moisture logs")
+    parser.add_argument("--plants", nargs="+", help="Plant ids to backtest, defaults to every configured plant")
+    parser.add_argument("--lags", nargs="+", type=int, default=[forecast_lags], help="AR lags to try")
+    parser.add_argument("--horizon", nargs="+", type=int, default=[forecast_horizon], help="Forecast horizons to try")
+    parser.add_argument("--target", nargs="+", type=float, help="Target moistures to try, defaults to the plant's")
+    parser.add_argument("--jump", nargs="+", type=float, help="Watering rises to try, defaults to the plant's")
+    parser.add_argument("--every", default=backtest_interval, help="Simulated time between predictions, e.g. 6h")
+    parser.add_argument("--days", type=int, help="Days of history to replay, defaults to the whole log")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="Worker processes")
+    parser.add_argument("--output", type=Path, help="Write the summaries and predictions as JSON to this file")
+    args = parser.parse_args()
+
+    report = {}
+    for plant_id, plant in load_plants().items():
+        if args.plants and plant_id not in args.plants:
+            continue
+        grid = [
+            dict(zip(PARAMETERS, values))
+            for values in itertools.product(
+                args.lags,
+                args.horizon,
+                args.target or [plant.target_water_moisture],
+                args.jump or [plant.watering_jump_pct],
+            )
+        ]
+        summary, predictions = backtest(plant, grid, args.every, args.workers, args.days)
+        if summary.empty:
+            print(f"{plant_id}: fewer than two waterings in the log, nothing to compare with")
+            continue
+        print(summary.to_string(index=False, float_format="{:.2f}".format))
+        report[plant_id] = {
+            "summary": summary.to_dict(orient="records"),
+            "predictions": predictions.to_dict(orient="records"),
+        }
+
+    if args.output:
+        args.output.write_text(json.dumps({"created": datetime.now().isoformat(), "plants": report}, default=str))
+        print(f"Wrote results to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
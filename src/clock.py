@@ -0,0 +1,43 @@
+import time
+from datetime import datetime, timedelta
+
+
+class Clock:
+    """Real time, used by the logger on the Pi."""
+
+    speedup = 1
+
+    def now(self) -> datetime:
+        return datetime.now()
+
+    def monotonic(self) -> float:
+        return time.monotonic()
+
+    def sleep(self, seconds: float) -> None:
+        time.sleep(seconds)
+
+
+class ScaledClock(Clock):
+    """
+    Simulated time that runs `speedup` times faster than real time, for replaying the logger off the Pi.
+
+    Durations passed to and returned by the clock are in simulated seconds.
+
+    Args:
+        speedup (float): Simulated seconds per real second.
+        start (datetime, optional): The simulated time when the clock is created. Defaults to now.
+    """
+
+    def __init__(self, speedup: float, start: datetime = None) -> None:
+        self.speedup = speedup
+        self.start = datetime.now() if start is None else start
+        self._t0 = time.monotonic()
+
+    def now(self) -> datetime:
+        return self.start + timedelta(seconds=self.monotonic())
+
+    def monotonic(self) -> float:
+        return (time.monotonic() - self._t0) * self.speedup
+
+    def sleep(self, seconds: float) -> None:
+        time.sleep(seconds / self.speedup)
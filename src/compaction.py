@@ -0,0 +1,239 @@
+"""
+Compaction of the raw sensor logs into time partitions.
+
+Rows older than `compaction_keep_days` are moved from the start of each live log into de-duplicated, time-sorted
+`partitions/{sensor}_{period}` files in the same storage format, one per day or month by `partition_by`, and the live
+log is rewritten without them. `partitions/manifest.json` records the time bounds of each partition, so range loads
+open only the partitions they overlap, and how offsets in a rewritten log map into the new file, so incremental readers
+carry on where they were. With `raw_retention_days` set, partitions older than that are deleted once the day rollups
+cover them, leaving the minute, hour and day rollups as the record of old readings.
+
+The logger compacts in the background with `compaction_enabled`, otherwise stop the logger and run:
+```
+python compaction.py --plants malfoy
+```
+"""
+
+import argparse
+import os
+import shutil
+import threading
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List
+
+import pandas as pd
+
+from clock import Clock
+from config import compaction_interval, compaction_keep_days, configured_sensors, partition_by, raw_retention_days
+from instrumentation import count, timer
+from plants import Plant, load_plants
+from rollups import rollup_bounds
+from storage import PartitionManifest
+
+# Partition file names and pandas periods of each partition granularity
+PARTITION_FORMATS = {"day": "%Y-%m-%d", "month": "%Y-%m"}
+PARTITION_PERIODS = {"day": "D", "month": "M"}
+
+
+def _editable_manifest(backend) -> PartitionManifest:
+    # A private copy, readers in other threads keep using the shared manifest until the edits are saved
+    return PartitionManifest(backend.root).refresh()
+
+
+def rewrite_log(backend, sensor: str, dropped: int) -> None:
+    """
+    Replace a live log with a copy without its first `dropped` bytes, recording the rewrite in the manifest first.
+
+    Must not run while the log is appended to, see `BufferedLogWriter.reopen`.
+
+    Args:
+        backend: The storage backend of the log.
+        sensor (str): The name of the sensor.
+        dropped (int): The bytes at the start of the log already moved into partitions.
+    """
+    log_path = backend.log_path(sensor)
+    header = backend.encode(sensor, [], header=True)
+    tmp_path = log_path.with_suffix(".compact")
+    with open(log_path, "rb") as source, open(tmp_path, "wb") as target:
+        source.seek(dropped)
+        target.write(header)
+        shutil.copyfileobj(source, target)
+        target.flush()
+        os.fsync(target.fileno())
+    manifest = _editable_manifest(backend)
+    old_inode, new_inode = os.stat(log_path).st_ino, os.stat(tmp_path).st_ino
+    # Readers that see the new file must already find how to map their offsets into it
+    manifest.add_rewrite(log_path, old_inode, new_inode, dropped, len(header))
+    manifest.set_head(log_path, new_inode, len(header))
+    manifest.save()
+    os.replace(tmp_path, log_path)
+
+
+def compact_log(
+    backend, sensor: str, cutoff: datetime, granularity: str = partition_by, pause: Callable = None
+) -> int:
+    """
+    Move the rows at the start of a live log that are older than `cutoff` into its partitions.
+
+    Args:
+        backend: The storage backend of the log.
+        sensor (str): The name of the sensor.
+        cutoff (datetime): Rows logged before this are moved.
+        granularity (str, optional): "day" or "month" partitions. Defaults to `partition_by`.
+        pause (Callable, optional): Called as `pause(sensor, fn)` to run `fn` while nothing appends to the log, such
+            as `BufferedLogWriter.reopen`. Defaults to calling `fn` directly.
+
+    Returns:
+        int: The number of rows moved.
+    """
+    log_path = backend.log_path(sensor)
+    if not log_path.exists():
+        return 0
+    manifest = _editable_manifest(backend)
+    inode = os.stat(log_path).st_ino
+    rows = backend.scan(sensor, manifest.head_start(log_path))
+    older = (rows["timestamp"] < pd.Timestamp(cutoff)).values
+    # Only a prefix is moved, so the rows left in the live log stay contiguous
+    n_moved = len(rows) if older.all() else int(older.argmin())
+
+    if n_moved:
+        moved = rows.iloc[:n_moved]
+        manifest.root.mkdir(parents=True, exist_ok=True)
+        with timer("compaction", sensor=sensor):
+            for key, part in moved.groupby(moved["timestamp"].dt.strftime(PARTITION_FORMATS[granularity])):
+                file_path = manifest.root / f"{sensor}_{key}{backend.suffix}"
+                part = part[[sensor, "timestamp"]]
+                if file_path.exists():
+                    part = pd.concat([backend.read_partition(file_path, sensor), part], ignore_index=True)
+                part = part.drop_duplicates().sort_values("timestamp", kind="stable").reset_index(drop=True)
+                backend.write_partition(file_path, sensor, part)
+                until = (pd.Period(key, freq=PARTITION_PERIODS[granularity]) + 1).start_time
+                manifest.set_partition(log_path, key, file_path, part, until)
+            manifest.set_head(log_path, inode, int(moved["end"].iloc[-1]))
+            manifest.save()
+        count("compacted_rows", n_moved, sensor=sensor)
+        print(f"Moved {n_moved} {sensor} rows logged before {cutoff} into {manifest.root}")
+
+    # Also finishes the rewrite of an earlier run that stopped after updating the manifest
+    dropped = manifest.head_start(log_path)
+    if dropped <= len(backend.encode(sensor, [], header=True)):
+        return n_moved
+    if pause is None:
+        rewrite_log(backend, sensor, dropped)
+    else:
+        pause(sensor, lambda: rewrite_log(backend, sensor, dropped))
+    return n_moved
+
+
+def apply_retention(backend, sensor: str, days: float, now: datetime, rollup_root) -> int:
+    """
+    Delete the oldest partitions of a sensor once they are older than `days` and covered by the closed day rollups.
+
+    Args:
+        backend: The storage backend of the log.
+        sensor (str): The name of the sensor.
+        days (float): The days of raw readings to keep.
+        now (datetime): The current time.
+        rollup_root (Path): The directory holding the sensor's rollups.
+
+    Returns:
+        int: The number of partitions deleted.
+    """
+    manifest = _editable_manifest(backend)
+    log_path = backend.log_path(sensor)
+    bounds = rollup_bounds(sensor, rollup_root)
+    cutoff = pd.Timestamp(now) - pd.Timedelta(days=days)
+    expired = []
+    for key, entry in sorted(manifest.entries(log_path).items(), key=lambda item: item[1]["start"]):
+        until = pd.Timestamp(entry["until"])
+        if until > cutoff:
+            break
+        if bounds is None or bounds[0] > pd.Timestamp(entry["start"]) or bounds[1] + pd.Timedelta(days=1) < until:
+            print(f"Keeping {entry['file']}, the {sensor} day rollups do not cover it, rebuild them with rollups.py")
+            break
+        manifest.remove_partition(log_path, key)
+        manifest.data["retained_from"][log_path.name] = entry["until"]
+        expired.append(manifest.root / entry["file"])
+    if not expired:
+        return 0
+    # Unlisted first, so no reader opens a deleted partition
+    manifest.save()
+    for file_path in expired:
+        file_path.unlink(missing_ok=True)
+    print(f"Deleted {len(expired)} {sensor} partitions older than {days} days, their rollups are kept")
+    return len(expired)
+
+
+def compact_plant(plant: Plant, sensors: List[str], now: datetime, pause: Callable = None) -> Dict[str, int]:
+    """
+    Compact the logs of a plant and apply the retention policy.
+
+    Args:
+        plant (Plant): The plant.
+        sensors (List[str]): The names of the sensors to compact.
+        now (datetime): The current time.
+        pause (Callable, optional): Runs the log rewrites while nothing appends to the log, see `compact_log`.
+
+    Returns:
+        Dict[str, int]: The number of rows moved per sensor.
+    """
+    backend = plant.storage()
+    moved = {}
+    for sensor in sensors:
+        moved[sensor] = compact_log(backend, sensor, now - timedelta(days=compaction_keep_days), partition_by, pause)
+        if raw_retention_days is not None:
+            apply_retention(backend, sensor, raw_retention_days, now, plant.rollup_path)
+    return moved
+
+
+class LogCompactor:
+    """
+    Compacts the logs of every plant from a background thread of the logger, on start and every `interval` seconds.
+
+    Args:
+        fleet (Dict[str, Plant]): The plants by id.
+        log_writers (Dict[str, BufferedLogWriter]): The log writer of each plant, paused while its logs are rewritten.
+        clock (Clock, optional): The clock the cutoff and interval follow. Defaults to real time.
+        interval (float, optional): Seconds between compactions. Defaults to `compaction_interval`.
+    """
+
+    def __init__(self, fleet: Dict[str, Plant], log_writers: Dict, clock: Clock = None, interval: float = None) -> None:
+        self.fleet = fleet
+        self.log_writers = log_writers
+        self.clock = Clock() if clock is None else clock
+        self.interval = compaction_interval if interval is None else interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="log-compactor", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def close(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        while True:
+            for plant_id, plant in self.fleet.items():
+                try:
+                    compact_plant(plant, list(configured_sensors), self.clock.now(), self.log_writers[plant_id].reopen)
+                except (OSError, ValueError) as e:
+                    print(f"Compacting the {plant_id} logs failed, retrying next time: {e}")
+            if self._stop.wait(self.interval / self.clock.speedup):
+                return
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Compact the sensor logs into time partitions, stop the logger first")
+    parser.add_argument("--sensors", nargs="+", default=list(configured_sensors))
+    parser.add_argument("--plants", nargs="+", help="Plant ids to compact, defaults to every configured plant")
+    args = parser.parse_args()
+    for plant_id, plant in load_plants().items():
+        if args.plants and plant_id not in args.plants:
+            continue
+        moved = compact_plant(plant, args.sensors, datetime.now())
+        print(f"{plant_id}: " + ", ".join(f"{rows} {sensor} rows compacted" for sensor, rows in moved.items()))
+
+
+if __name__ == "__main__":
+    main()
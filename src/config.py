@@ -9,11 +9,87 @@ configured_sensors = {"moisture": "cyan", "temperature": "red", "humidity": "yel
 data_path = ROOT_DIR / "data"
 # data_path = Path("/Volumes/PiShare/data_store") # Example path for a Raspberry pi server share
 image_path = ROOT_DIR / "images"
+# Storage format of the sensor logs in data_path, "csv" or "binary" (migrate existing logs with convert_logs.py)
+storage_backend = "csv"
+# Minute, hour and day aggregates maintained by the logger for long-range charts and averages
+rollup_path = data_path / "rollups"
+rollup_resolutions = {"minute": 60, "hour": 3600, "day": 86400}
+# Log compaction by the logger every compaction_interval seconds: rows older than compaction_keep_days move out of the
+# live logs into sorted, de-duplicated "day" or "month" partitions under <log directory>/partitions (see compaction.py)
+compaction_enabled = False
+compaction_keep_days = 2
+compaction_interval = 3600
+partition_by = "day"
+# Delete raw partitions older than this many days once the day rollups cover them, None keeps every raw reading
+raw_retention_days = None
+# Local state kept by the dashboard between restarts (e.g. watering detection)
+state_path = ROOT_DIR / "state"
 
 
+# Seconds of samples aggregated into each reading written by the logger
+log_interval = 11
+
+# Adaptive logging: only write readings that leave a deadband around the last written value, plus a heartbeat row
+# every heartbeat_interval seconds, so the logs hold a step-wise series
+adaptive_logging = False
+log_deadband = {"moisture": 5, "temperature": 0.5, "humidity": 1}
+heartbeat_interval = 600
+# Sample at the full rate for burst_duration seconds after consecutive readings differ by more than burst_threshold
+# (e.g. a watering), and at 1 / idle_rate_divisor of it otherwise
+burst_threshold = {"moisture": 30, "temperature": 2, "humidity": 5}
+burst_duration = 600
+idle_rate_divisor = 5
+
+# Logger write buffering: flush after this many readings per sensor or this many seconds, optionally fsync. The
+# logger also flushes at the end of every aggregation window, so dashboards watching the logs see each reading as
+# soon as it is aggregated
+write_flush_rows = 10
+write_flush_interval = log_interval
+write_fsync = False
+
+# Optional push stream of readings from the logger to the dashboard, replacing polling of the log files
+live_stream = False
+stream_host = "localhost"
+stream_port = 8765
+
 # Dashboard update frequency in seconds
 dashboard_update = 10
 
+# Number of recent readings held in memory per sensor for live charts and metrics (~1 week of data)
+chart_window_points = 2500
+# Days of raw readings loaded at startup to fill the in-memory store
+chart_history_days = 7
+# Maximum points sent to the browser per chart series, longer ranges are downsampled
+chart_max_points = 1000
+# Windows of the streaming sensor metrics, an int counts readings and a string is a pandas duration
+metrics_windows = {"Last 10": 10, "Last 50": 50, "Last hour": "1h", "Charted": chart_window_points}
+# Smoothing factor of the exponentially weighted mean shown with the metrics
+metrics_ewm_alpha = 0.1
+
+# Warm-start snapshot of the dashboard's stores, log positions and fitted model, written to each plant's state
+# directory every snapshot_interval seconds and on shutdown. Snapshots older than chart_history_days are ignored
+snapshot_enabled = True
+snapshot_interval = 300
+
+# Refresh the dashboard when the sensor logs change instead of every dashboard_update seconds
+watch_logs = True
+# Use inotify events where available, mtime/size checks every watch_poll_interval seconds cover network shares
+watch_use_inotify = True
+watch_poll_interval = 1
+# Seconds to wait after a change for the rest of the logger's batch, and the longest wait before a forced refresh
+watch_debounce = 0.5
+watch_max_staleness = 60
+
+# Instrumentation of the hot paths, served as Prometheus text on http://metrics_host:<port>/metrics by the logger and
+# the dashboard, disabled instrumentation leaves the functions unwrapped
+metrics_enabled = False
+metrics_host = "localhost"
+metrics_logger_port = 9101
+metrics_dashboard_port = 9102
+# Sample the stacks of every thread each profiler_interval seconds and count the project functions they are in
+profiler_enabled = False
+profiler_interval = 0.01
+
 # Prediction update frequency in loops (e.g. 5 mins per loop, 250 loops ~= 1 day)
 prediction_update = 25
 
@@ -26,16 +102,64 @@ timeout = 60
 hass_username = ""
 hass_password = ""
 mqtt_topic_root = "home/plants/malfoy/"
+# Publish one message per value on <mqtt_topic_root><sensor>, water_next and water_last, or set True for each plant's
+# readings as one retained JSON message on <mqtt_topic_root>state and the predictions on <mqtt_topic_root>watering,
+# which needs the Home Assistant sensors changed to read those topics (see the README)
+mqtt_batch_readings = False
+# Longest wait in seconds between reconnect attempts, messages are kept on disk while the broker is unreachable and the
+# oldest are dropped beyond mqtt_queue_max
+mqtt_max_backoff = 60
+mqtt_queue_path = state_path / "mqtt"
+mqtt_queue_max = 10000
 
 ######################################################################################################
 # Sensor Config
+# Sensors read by the logger: "grove" on the Pi, or "simulator" and "replay" (of the logs in replay_path) elsewhere
+sensor_backend = "grove"
+replay_path = ROOT_DIR / "data"
 moisture_pin = 0
 temp_humid_pin = 12
 
+# Target sample rates, the DHT11 cannot be read more than about once per second
+moisture_sample_hz = 10
+dht_sample_hz = 0.5
+
 sensor_dry = 2000
 sensor_wet = 1400
 
+######################################################################################################
+# Forecasting
+# Readings used as lags by the next-watering AR model (500 readings ~= 2 days)
+forecast_lags = 500
+# Readings forecast ahead (2000 readings ~= 1 week)
+forecast_horizon = 2000
+# Recursive least squares forgetting factor for updates within a watering cycle, 1.0 keeps all readings
+forecast_forgetting = 1.0
+# Simulated time between the predictions replayed by backtest.py
+backtest_interval = "6h"
+
 ######################################################################################################
 # Thresholds
 water_threshold_pct = 10
+# Increase in moisture % between consecutive readings that counts as a watering
+watering_jump_pct = 10
 target_water_moisture = 71
+
+######################################################################################################
+# Plant registry
+# Each plant has its own pins, calibration, thresholds, MQTT topic and storage namespace. `data_dir` is a sub-directory
+# of data_path holding the plant's logs ("" uses data_path itself, the default is the plant id). Keys left out fall
+# back to the single-plant settings above.
+plants = {
+    "malfoy": {"name": "Malfoy", "image": "snake.png", "data_dir": "", "mqtt_topic_root": mqtt_topic_root},
+    # "spike": {"name": "Spike", "image": "succulent.png", "moisture_pin": 2, "temp_humid_pin": 16,
+    #           "sensor_dry": 1950, "sensor_wet": 1350, "target_water_moisture": 40},
+}
+# Plant shown on the dashboard
+dashboard_plant = "malfoy"
+
+# Fleet analysis resamples every plant onto a shared time grid
+fleet_grid = "15min"
+# Lags (96 x 15 min = 1 day) and horizon (672 x 15 min = 1 week) of the batched fleet forecast
+fleet_forecast_lags = 96
+fleet_forecast_horizon = 672
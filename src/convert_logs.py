@@ -0,0 +1,53 @@
+"""
+Convert the sensor logs between storage backends.
+
+Usage:
+```
+python convert_logs.py --source csv --target binary
+python convert_logs.py --source binary --target csv --sensors moisture
+```
+"""
+
+import argparse
+
+from pathlib import Path
+
+from config import configured_sensors
+from plants import load_plants
+from storage import get_storage_backend, storage_backends
+
+
+def convert_logs(source: str, target: str, sensors: list, root: Path) -> None:
+    """
+    Copy every reading of the given sensors from one storage backend to another.
+
+    Args:
+        source (str): The backend to read from.
+        target (str): The backend to write to, its logs must not already exist.
+        sensors (list): The names of the sensors to convert.
+        root (Path): The directory holding the logs.
+    """
+    source_backend = get_storage_backend(source, root)
+    target_backend = get_storage_backend(target, root)
+    for sensor in sensors:
+        target_file = target_backend.log_path(sensor)
+        if target_file.exists():
+            print(f"Skipping {sensor}, {target_file} already exists")
+            continue
+        df = source_backend.load(sensor).sort_values("timestamp", kind="stable")
+        target_backend.append(sensor, list(zip(df[sensor].tolist(), df["timestamp"])))
+        print(f"Converted {len(df)} {sensor} readings to {target_file}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Convert sensor logs between storage backends")
+    parser.add_argument("--source", choices=storage_backends, default="csv")
+    parser.add_argument("--target", choices=storage_backends, default="binary")
+    parser.add_argument("--sensors", nargs="+", default=list(configured_sensors))
+    args = parser.parse_args()
+    for plant in load_plants().values():
+        convert_logs(args.source, args.target, args.sensors, plant.data_path)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,316 @@
+import atexit
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config import (
+    chart_history_days,
+    chart_window_points,
+    dashboard_update,
+    homeassistant_integration,
+    live_stream,
+    metrics_dashboard_port,
+    prediction_update,
+    snapshot_enabled,
+    snapshot_interval,
+    watch_logs,
+)
+from file_watch import LogChangeWatcher
+from instrumentation import count, set_gauge, start_metrics_server
+from log_reader import get_log_reader
+from prediction_worker import PredictionService
+from sensor_calculations import (
+    convert_cap_to_moisture,
+    get_stream_subscriber,
+    load_latest_data,
+    log_storage,
+    plant,
+    read_sensor_updates,
+)
+from sensor_store import SensorRingBuffer
+from snapshot import read_snapshot, write_snapshot
+
+if homeassistant_integration:
+    from mqtt_publisher import get_publisher
+
+
+class DataService:
+    """
+    Owns ingestion, the in-memory history and predictions for every dashboard session in the server process.
+
+    The logs are read and predictions are made once on a background thread however many browser tabs are open, and
+    each session renders from `history()` and `updates()` snapshots. Sessions `attach()` when they start and
+    `detach()` when they end, and ingestion pauses while none are attached.
+
+    With `snapshot_enabled` the stores, log positions, latest prediction and fitted model are saved to a snapshot
+    periodically and on shutdown. A restart restores them and replays only the log rows written since, falling back
+    to loading the logs if the snapshot is missing, stale or corrupt.
+
+    Args:
+        sensors (List[str]): The names of the sensors to ingest.
+    """
+
+    def __init__(self, sensors: List[str]) -> None:
+        self.sensors = list(sensors)
+        self.sessions = 0
+        self.version = 0
+        self._condition = threading.Condition()
+        self._attached = threading.Event()
+        self._seq = {sensor: 0 for sensor in self.sensors}
+        # Predictions run on a background worker so fits never stall ingestion
+        self.predictions = PredictionService()
+        self._prediction_version = 0
+        self._snapshot_path = plant.state_path / "dashboard_snapshot.bin"
+        self._positions = None
+        self._last_snapshot = time.monotonic()
+        self.stores = self._restore_snapshot() if snapshot_enabled else None
+        if self.stores is None:
+            self.stores = {sensor: self._load_history(sensor) for sensor in self.sensors}
+        # Refresh when the logs change rather than on a fixed sleep, the live stream pushes readings instead
+        self._watcher = None
+        if watch_logs and not live_stream:
+            self._watcher = LogChangeWatcher({sensor: log_storage.log_path(sensor) for sensor in self.sensors})
+        self._mqtt = get_publisher("dashboard") if homeassistant_integration else None
+        start_metrics_server(metrics_dashboard_port)
+        if snapshot_enabled:
+            atexit.register(self.save_snapshot)
+        self._thread = threading.Thread(target=self._run, name="data-service", daemon=True)
+        self._thread.start()
+
+    @staticmethod
+    def _load_history(sensor: str) -> SensorRingBuffer:
+        # The first poll then returns exactly the rows logged after the history, as after a snapshot restore
+        last_row = get_log_reader(log_storage.log_path(sensor)).seek_end()
+        # Only recent raw readings are loaded for the live store
+        plot_df = load_latest_data(
+            log_storage.log_path(sensor), start=datetime.now() - timedelta(days=chart_history_days)
+        )
+        if len(plot_df) == 0:
+            # Nothing logged recently, fall back to the most recent readings on record
+            plot_df = load_latest_data(log_storage.log_path(sensor)).tail(chart_window_points)
+        if last_row is not None:
+            # Rows appended while loading are left for the first poll
+            plot_df = plot_df[plot_df["timestamp"] <= pd.Timestamp(last_row[1])].copy()
+        if sensor == "moisture":
+            plot_df[sensor] = convert_cap_to_moisture(plot_df[sensor], plant.sensor_dry, plant.sensor_wet)
+        return SensorRingBuffer.from_df(plot_df, sensor, chart_window_points)
+
+    def attach(self) -> None:
+        """Register a dashboard session, resuming ingestion if it was paused."""
+        with self._condition:
+            self.sessions += 1
+            self._attached.set()
+            set_gauge("sessions_attached", self.sessions)
+        print(f"Session attached, {self.sessions} attached")
+
+    def detach(self) -> None:
+        """Unregister a dashboard session, pausing ingestion when it was the last one."""
+        with self._condition:
+            self.sessions -= 1
+            if self.sessions == 0:
+                self._attached.clear()
+            set_gauge("sessions_attached", self.sessions)
+        print(f"Session detached, {self.sessions} attached")
+
+    def _run(self) -> None:
+        changed_sensors = None
+        polls = 0
+        while True:
+            self._attached.wait()
+            if polls % prediction_update == 0:
+                # Request predictions, coalesced with any still running
+                self.predictions.submit()
+            polls += 1
+
+            updates = read_sensor_updates(self.sensors, changed_sensors)
+            with self._condition:
+                for sensor, new_readings in updates.items():
+                    self.stores[sensor].extend(new_readings)
+                    self._seq[sensor] += len(new_readings)
+                    count("readings_ingested", len(new_readings), sensor=sensor)
+                # Where the stores are up to in the logs, saved with them in the snapshot
+                self._positions = self._log_positions()
+                self.version += 1
+                self._condition.notify_all()
+            self._publish_prediction()
+            if snapshot_enabled and time.monotonic() - self._last_snapshot >= snapshot_interval:
+                self.save_snapshot()
+
+            if self._watcher is not None:
+                changed_sensors = self._watcher.wait_for_changes()
+            elif live_stream:
+                # Ingest pushed readings as soon as they arrive
+                get_stream_subscriber().wait_for_readings(dashboard_update)
+            else:
+                time.sleep(dashboard_update)
+
+    def _log_positions(self) -> Dict[str, list]:
+        if live_stream:
+            # The stream backfills by time, the newest stored reading is where to resume
+            return {}
+        positions = {}
+        for sensor in self.sensors:
+            reader = get_log_reader(log_storage.log_path(sensor))
+            positions[sensor] = [reader.offset, reader.inode]
+        return positions
+
+    def save_snapshot(self) -> None:
+        """Write the stores, log positions, latest prediction and fitted model to the warm-start snapshot."""
+        with self._condition:
+            if self._positions is None:
+                # Nothing has been read from the logs yet, the stores may not line up with any log position
+                return
+            arrays = {}
+            for sensor, store in self.stores.items():
+                times, values = store.window()
+                arrays[f"store_{sensor}_times"] = times.astype(np.int64)
+                arrays[f"store_{sensor}_values"] = values.copy()
+            positions = dict(self._positions)
+        result, model_state = self.predictions.get_state()
+        meta = {
+            "created": datetime.now().isoformat(),
+            "config": self._snapshot_config(),
+            "positions": positions,
+            "prediction": None,
+            "model": None,
+        }
+        if result is not None:
+            meta["prediction"] = {key: None if value is None else str(value) for key, value in result.items()}
+        if model_state is not None:
+            meta["model"] = model_state[0]
+            arrays.update({f"model_{name}": array for name, array in model_state[1].items()})
+        start = time.perf_counter()
+        write_snapshot(self._snapshot_path, meta, arrays)
+        self._last_snapshot = time.monotonic()
+        print(f"Saved dashboard snapshot in {time.perf_counter() - start:.2f}s")
+
+    def _snapshot_config(self) -> dict:
+        # Settings that change what the stored readings mean, a snapshot taken with different ones is stale
+        return {
+            "plant": plant.plant_id,
+            "sensors": self.sensors,
+            "logs": [str(log_storage.log_path(sensor)) for sensor in self.sensors],
+            "capacity": chart_window_points,
+            "sensor_dry": plant.sensor_dry,
+            "sensor_wet": plant.sensor_wet,
+            "live_stream": live_stream,
+        }
+
+    def _restore_snapshot(self) -> Dict[str, SensorRingBuffer]:
+        """Restore the stores from the snapshot and rewind ingestion to where it was taken, or return None."""
+        if not self._snapshot_path.exists():
+            return None
+        try:
+            meta, arrays = read_snapshot(self._snapshot_path)
+            if meta["config"] != self._snapshot_config():
+                raise ValueError("the configuration has changed since it was taken")
+            if datetime.now() - datetime.fromisoformat(meta["created"]) > timedelta(days=chart_history_days):
+                raise ValueError(f"it was taken on {meta['created']}")
+            for sensor, (offset, inode) in meta["positions"].items():
+                if offset is None:
+                    # The log did not exist yet, it is read from the end like on a cold start
+                    continue
+                log_path = log_storage.log_path(sensor)
+                stat = os.stat(log_path)
+                # A log rewritten by compaction is followed by the reader on its first poll
+                followed = offset if stat.st_ino == inode else log_storage.manifest.follow(log_path, inode, offset)
+                if followed is None or stat.st_size < followed:
+                    raise ValueError(f"the {sensor} log was rotated or truncated since it was taken")
+            stores = {}
+            for sensor in self.sensors:
+                df = pd.DataFrame(
+                    {
+                        sensor: arrays[f"store_{sensor}_values"],
+                        "timestamp": arrays[f"store_{sensor}_times"].view("datetime64[ns]"),
+                    }
+                )
+                stores[sensor] = SensorRingBuffer.from_df(df, sensor, chart_window_points)
+        except (OSError, ValueError, KeyError, TypeError) as e:
+            print(f"Not warm-starting from the dashboard snapshot, loading the logs: {e}")
+            return None
+
+        # The first poll then returns only the rows logged after the snapshot
+        for sensor, (offset, inode) in meta["positions"].items():
+            if offset is not None:
+                reader = get_log_reader(log_storage.log_path(sensor))
+                reader.offset, reader.inode = offset, inode
+        if live_stream:
+            get_stream_subscriber(
+                since={sensor: pd.Timestamp(store.last()[0]) for sensor, store in stores.items() if len(store)}
+            )
+
+        result = meta["prediction"]
+        if result is not None:
+            result = {
+                "last_watered": None if result["last_watered"] is None else pd.Timestamp(result["last_watered"]),
+                "next_water": result["next_water"],
+                "computed_at": datetime.fromisoformat(result["computed_at"]),
+            }
+        model_state = None
+        if meta["model"] is not None:
+            model_arrays = {name[len("model_"):]: array for name, array in arrays.items() if name.startswith("model_")}
+            model_state = (meta["model"], model_arrays)
+        self.predictions.set_state(result, model_state)
+        self._positions = meta["positions"]
+        print(f"Warm-started from the dashboard snapshot taken {meta['created']}")
+        return stores
+
+    def _publish_prediction(self) -> None:
+        version, result = self.predictions.latest()
+        if version == self._prediction_version:
+            return
+        self._prediction_version = version
+        print(f"Prediction worker: {self.predictions.metrics()}")
+        if self._mqtt is not None:
+            values = {"water_next": result["next_water"], "water_last": result["last_watered"]}
+            self._mqtt.publish_values(plant.mqtt_topic_root, values, "watering")
+
+    def history(self) -> Tuple[Dict[str, pd.DataFrame], Dict[str, int]]:
+        """
+        Return a copy of the stored readings for a new session to start from.
+
+        Returns:
+            Tuple[Dict[str, pd.DataFrame], Dict[str, int]]: The readings of each sensor and the cursors to pass to
+            `updates()`.
+        """
+        with self._condition:
+            return {sensor: store.to_df() for sensor, store in self.stores.items()}, dict(self._seq)
+
+    def updates(self, cursors: Dict[str, int]) -> Tuple[Dict[str, pd.DataFrame], Dict[str, int]]:
+        """
+        Return the readings ingested since a session's cursors.
+
+        Args:
+            cursors (Dict[str, int]): The cursors returned by the previous `history()` or `updates()` call.
+
+        Returns:
+            Tuple[Dict[str, pd.DataFrame], Dict[str, int]]: The new readings of each sensor, at most a store's worth
+            if the session fell behind, and the advanced cursors.
+        """
+        with self._condition:
+            new_readings = {}
+            for sensor, store in self.stores.items():
+                n_new = min(self._seq[sensor] - cursors[sensor], store.capacity)
+                if n_new > 0:
+                    new_readings[sensor] = store.to_df(n_new)
+            return new_readings, dict(self._seq)
+
+    def wait_for_update(self, version: int, timeout: float) -> int:
+        """
+        Block until ingestion moves past `version` or `timeout` seconds pass.
+
+        Returns:
+            int: The current version.
+        """
+        with self._condition:
+            self._condition.wait_for(lambda: self.version != version, timeout)
+            return self.version
+
+    def metrics(self) -> dict:
+        """Return the prediction worker statistics and the number of attached sessions."""
+        return {**self.predictions.metrics(), "sessions_attached": self.sessions}
@@ -0,0 +1,83 @@
+import numpy as np
+import pandas as pd
+
+
+def lttb(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Select the points of a series to keep with Largest-Triangle-Three-Buckets downsampling.
+
+    Args:
+        x (np.ndarray): The x values (e.g. epoch nanoseconds) in ascending order.
+        y (np.ndarray): The y values.
+        n_out (int): The number of points to keep.
+
+    Returns:
+        np.ndarray: The indices of the selected points, always including the first and last.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 3:
+        return np.arange(n)
+    x = x.astype(float)
+    y = y.astype(float)
+    # The first and last points are kept, the rest are split into n_out - 2 buckets
+    edges = np.linspace(1, n - 1, n_out - 1).astype(int)
+    selected = np.empty(n_out, dtype=int)
+    selected[0] = 0
+    selected[-1] = n - 1
+    prev = 0
+    for i in range(n_out - 2):
+        lo, hi = edges[i], edges[i + 1]
+        # Average of the next bucket, or the last point for the final bucket
+        next_lo, next_hi = hi, edges[i + 2] if i + 2 < len(edges) else n
+        avg_x = x[next_lo:next_hi].mean()
+        avg_y = y[next_lo:next_hi].mean()
+        area = np.abs(
+            (x[prev] - avg_x) * (y[lo:hi] - y[prev]) - (x[prev] - x[lo:hi]) * (avg_y - y[prev])
+        )
+        prev = lo + int(np.argmax(area))
+        selected[i + 1] = prev
+    return selected
+
+
+def minmax_buckets(x: np.ndarray, y: np.ndarray, n_out: int) -> np.ndarray:
+    """
+    Select the minimum and maximum point of each bucket of a series.
+
+    Args:
+        x (np.ndarray): The x values in ascending order.
+        y (np.ndarray): The y values.
+        n_out (int): The maximum number of points to keep.
+
+    Returns:
+        np.ndarray: The indices of the selected points in ascending order.
+    """
+    n = len(x)
+    if n_out >= n or n_out < 2:
+        return np.arange(n)
+    edges = np.linspace(0, n, n_out // 2 + 1).astype(int)
+    selected = []
+    for lo, hi in zip(edges[:-1], edges[1:]):
+        if hi > lo:
+            selected.extend([lo + int(np.argmin(y[lo:hi])), lo + int(np.argmax(y[lo:hi]))])
+    return np.unique(selected)
+
+
+downsamplers = {"lttb": lttb, "minmax": minmax_buckets}
+
+
+def downsample_df(df: pd.DataFrame, sensor: str, max_points: int, method: str = "lttb") -> pd.DataFrame:
+    """
+    Downsample a DataFrame of readings to a bounded number of points.
+
+    Args:
+        df (pd.DataFrame): The readings with the sensor and timestamp columns, oldest first.
+        sensor (str): The name of the sensor.
+        max_points (int): The maximum number of points to keep.
+        method (str, optional): The downsampling method, "lttb" or "minmax". Defaults to "lttb".
+
+    Returns:
+        pd.DataFrame: The selected rows.
+    """
+    x = df["timestamp"].values.astype("datetime64[ns]").astype(np.int64)
+    keep = downsamplers[method](x, df[sensor].values, max_points)
+    return df.iloc[keep].reset_index(drop=True)
@@ -0,0 +1,126 @@
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Dict, Set
+
+from config import watch_debounce, watch_max_staleness, watch_poll_interval, watch_use_inotify
+
+try:
+    from watchdog.events import FileSystemEventHandler
+    from watchdog.observers import Observer
+except ImportError:
+    Observer = None
+    FileSystemEventHandler = object
+
+
+class _LogEventHandler(FileSystemEventHandler):
+    def __init__(self, watcher: "LogChangeWatcher") -> None:
+        self.watcher = watcher
+
+    def on_any_event(self, event) -> None:
+        for path in (getattr(event, "src_path", None), getattr(event, "dest_path", None)):
+            if path is not None:
+                self.watcher.notify(Path(path))
+
+
+class LogChangeWatcher:
+    """
+    Reports which sensor logs have changed so the dashboard only re-reads those.
+
+    Changes are detected with inotify (through watchdog) where available. Network shares often do not deliver inotify
+    events, so the mtime and size of each log are also checked every `poll_interval` seconds. After the first change
+    the watcher waits `debounce` seconds to collect the other logs written in the same batch, and it returns every
+    sensor once `max_staleness` seconds pass without a change so a missed event cannot freeze the dashboard.
+
+    Args:
+        log_paths (Dict[str, Path]): The log file of each sensor.
+        debounce (float, optional): Seconds to wait for further changes. Defaults to `watch_debounce`.
+        max_staleness (float, optional): Longest wait in seconds before all sensors are refreshed. Defaults to
+            `watch_max_staleness`.
+        poll_interval (float, optional): Seconds between stat checks. Defaults to `watch_poll_interval`.
+        use_inotify (bool, optional): Use inotify events when watchdog is installed. Defaults to `watch_use_inotify`.
+    """
+
+    def __init__(
+        self,
+        log_paths: Dict[str, Path],
+        debounce: float = watch_debounce,
+        max_staleness: float = watch_max_staleness,
+        poll_interval: float = watch_poll_interval,
+        use_inotify: bool = watch_use_inotify,
+    ) -> None:
+        self.log_paths = {sensor: Path(path) for sensor, path in log_paths.items()}
+        self._sensors_by_path = {str(path.resolve()): sensor for sensor, path in self.log_paths.items()}
+        self.debounce = debounce
+        self.max_staleness = max_staleness
+        self.poll_interval = poll_interval
+        self._changed = set()
+        self._lock = threading.Lock()
+        self._event = threading.Event()
+        self._stats = {sensor: self._stat(path) for sensor, path in self.log_paths.items()}
+        self._last_refresh = time.monotonic()
+        self._observer = None
+        if use_inotify and Observer is not None:
+            self._observer = Observer()
+            handler = _LogEventHandler(self)
+            for directory in {path.resolve().parent for path in self.log_paths.values()}:
+                self._observer.schedule(handler, str(directory), recursive=False)
+            self._observer.start()
+        print(f"Watching sensor logs with {'inotify and ' if self._observer else ''}stat checks")
+
+    @staticmethod
+    def _stat(path: Path) -> tuple:
+        try:
+            stat = os.stat(path)
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size, stat.st_ino
+
+    def notify(self, path: Path) -> None:
+        """Mark the sensor whose log is at `path` as changed."""
+        sensor = self._sensors_by_path.get(str(path.resolve()))
+        if sensor is not None:
+            with self._lock:
+                self._changed.add(sensor)
+            self._event.set()
+
+    def _check_stats(self) -> None:
+        for sensor, path in self.log_paths.items():
+            stat = self._stat(path)
+            if stat != self._stats[sensor]:
+                self._stats[sensor] = stat
+                with self._lock:
+                    self._changed.add(sensor)
+                self._event.set()
+
+    def wait_for_changes(self) -> Set[str]:
+        """
+        Block until at least one sensor log changes or the staleness limit is reached.
+
+        Returns:
+            Set[str]: The sensors whose logs changed, or every sensor when the staleness limit was reached.
+        """
+        deadline = self._last_refresh + self.max_staleness
+        while True:
+            self._check_stats()
+            remaining = deadline - time.monotonic()
+            if self._event.is_set() or remaining <= 0:
+                break
+            self._event.wait(min(self.poll_interval, remaining))
+
+        if self._event.is_set():
+            # Let the rest of the logger's batch land before reading
+            time.sleep(self.debounce)
+            self._check_stats()
+        with self._lock:
+            changed = self._changed or set(self.log_paths)
+            self._changed = set()
+            self._event.clear()
+        self._last_refresh = time.monotonic()
+        return changed
+
+    def stop(self) -> None:
+        if self._observer is not None:
+            self._observer.stop()
+            self._observer.join()
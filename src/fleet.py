@@ -0,0 +1,178 @@
+"""
+Batched watering analysis across every plant in the registry.
+
+Each plant's moisture log is resampled onto a shared `fleet_grid` time grid, giving a plants x time matrix that the
+calibration, watering detection and AR forecasting below process as whole-array NumPy operations, so analysing the fleet
+costs a handful of array passes rather than one Python loop per plant.
+
+Print the fleet's watering report with:
+```
+python fleet.py --days 14
+```
+"""
+
+import argparse
+from datetime import datetime, timedelta
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config import fleet_forecast_horizon, fleet_forecast_lags, fleet_grid
+from plants import Plant, load_plants
+
+
+def load_fleet_matrix(
+    plants: List[Plant], sensor: str, start: datetime, end: datetime
+) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Resample a sensor of every plant onto a shared time grid.
+
+    Args:
+        plants (List[Plant]): The plants to load, one row each.
+        sensor (str): The name of the sensor.
+        start (datetime): The start of the grid.
+        end (datetime): The end of the grid.
+
+    Returns:
+        Tuple[np.ndarray, np.ndarray]: The grid times and a [plants, times] matrix of bucket means, forward filled and
+        NaN before a plant's first reading.
+    """
+    grid = pd.date_range(pd.Timestamp(start).floor(fleet_grid), end, freq=fleet_grid)
+    matrix = np.full((len(plants), len(grid)), np.nan)
+    for i, plant in enumerate(plants):
+        backend = plant.storage()
+        if not backend.log_path(sensor).exists():
+            continue
+        df = backend.load(sensor, start=grid[0], end=end)
+        if df.empty:
+            continue
+        means = df.set_index("timestamp")[sensor].astype(float).resample(fleet_grid).mean()
+        matrix[i] = means.reindex(grid).ffill().values
+    return grid.values, matrix
+
+
+def detect_waterings(moisture: np.ndarray, jump_pct: np.ndarray) -> np.ndarray:
+    """
+    Find the last watering of every plant.
+
+    Args:
+        moisture (np.ndarray): A [plants, times] moisture matrix in percent.
+        jump_pct (np.ndarray): The rise between grid steps that counts as a watering, per plant.
+
+    Returns:
+        np.ndarray: The grid index where each plant's current cycle starts, 0 if no watering was seen.
+    """
+    rises = np.diff(moisture, axis=1) > jump_pct[:, None]
+    n_steps = rises.shape[1]
+    # argmax on the reversed rows finds the newest rise, rows without one fall back to the start of the grid
+    last_rise = n_steps - 1 - np.argmax(rises[:, ::-1], axis=1)
+    return np.where(rises.any(axis=1), last_rise + 1, 0)
+
+
+def fit_ar(moisture: np.ndarray, cycle_start: np.ndarray, lags: int) -> np.ndarray:
+    """
+    Fit an AR model per plant on the readings of its current cycle with one batched least-squares solve.
+
+    Args:
+        moisture (np.ndarray): A [plants, times] moisture matrix.
+        cycle_start (np.ndarray): The grid index where each plant's current cycle starts.
+        lags (int): The number of lagged readings used by the model.
+
+    Returns:
+        np.ndarray: The [plants, lags + 1] intercept and lag coefficients, NaN for plants with too short a cycle.
+    """
+    n_times = moisture.shape[1]
+    # Rows are [y(t), y(t-1), ..., y(t-lags)] for every t with a full set of lags
+    windows = np.lib.stride_tricks.sliding_window_view(moisture, lags + 1, axis=1)[:, :, ::-1]
+    targets = windows[:, :, 0]
+    design = np.concatenate([np.ones(targets.shape + (1,)), windows[:, :, 1:]], axis=2)
+    # Only rows whose oldest lag lies inside the current cycle take part in the fit
+    first_time = np.arange(n_times - lags)
+    weights = (first_time[None, :] >= cycle_start[:, None]) & ~np.isnan(windows).any(axis=2)
+    design = np.where(weights[:, :, None], design, 0)
+    targets = np.where(weights, targets, 0)
+
+    gram = np.einsum("pni,pnj->pij", design, design)
+    moment = np.einsum("pni,pn->pi", design, targets)
+    params = np.einsum("pij,pj->pi", np.linalg.pinv(gram), moment)
+    params[weights.sum(axis=1) <= lags + 1] = np.nan
+    return params
+
+
+def forecast_ar(moisture: np.ndarray, params: np.ndarray, steps: int) -> np.ndarray:
+    """
+    Roll the AR models of every plant forward together.
+
+    Args:
+        moisture (np.ndarray): A [plants, times] moisture matrix, the newest readings seed the forecast.
+        params (np.ndarray): The [plants, lags + 1] coefficients from `fit_ar`.
+        steps (int): The number of grid steps to forecast.
+
+    Returns:
+        np.ndarray: The [plants, steps] forecast.
+    """
+    lags = params.shape[1] - 1
+    history = moisture[:, ::-1][:, :lags].copy()
+    forecast = np.empty((len(moisture), steps))
+    for step in range(steps):
+        forecast[:, step] = params[:, 0] + np.einsum("pi,pi->p", params[:, 1:], history)
+        history = np.roll(history, 1, axis=1)
+        history[:, 0] = forecast[:, step]
+    return forecast
+
+
+def fleet_watering_report(days: int = 14, lags: int = fleet_forecast_lags, horizon: int = fleet_forecast_horizon):
+    """
+    Analyse the moisture of every plant in the registry.
+
+    Args:
+        days (int, optional): The days of history to analyse. Defaults to 14.
+        lags (int, optional): The AR lags in grid steps. Defaults to `fleet_forecast_lags`.
+        horizon (int, optional): The grid steps to forecast ahead. Defaults to `fleet_forecast_horizon`.
+
+    Returns:
+        pd.DataFrame: The current moisture, last watering and predicted next watering of each plant.
+    """
+    plants = list(load_plants().values())
+    end = pd.Timestamp(datetime.now())
+    times, raw = load_fleet_matrix(plants, "moisture", end - timedelta(days=days), end)
+
+    def settings(key: str) -> np.ndarray:
+        return np.array([getattr(plant, key) for plant in plants], dtype=float)
+
+    # Broadcast each plant's calibration across its row
+    dry, wet = settings("sensor_dry")[:, None], settings("sensor_wet")[:, None]
+    moisture = (raw - dry) / (wet - dry) * 100
+
+    cycle_start = detect_waterings(moisture, settings("watering_jump_pct"))
+    target = settings("target_water_moisture")
+    next_water = np.full(len(plants), np.datetime64("NaT"), dtype="datetime64[ns]")
+    if moisture.shape[1] > lags + 1:
+        forecast = forecast_ar(moisture, fit_ar(moisture, cycle_start, lags), horizon)
+        below = forecast < target[:, None]
+        crosses = below.any(axis=1)
+        step = np.timedelta64(pd.Timedelta(fleet_grid))
+        next_water[crosses] = times[-1] + (np.argmax(below, axis=1)[crosses] + 1) * step
+
+    current = moisture[:, -1]
+    next_water[current < target] = times[-1]
+    return pd.DataFrame(
+        {
+            "plant": [plant.name for plant in plants],
+            "moisture": current,
+            "last_watered": np.where(cycle_start > 0, times[cycle_start], np.datetime64("NaT")),
+            "next_water": next_water,
+        }
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Print the watering report of every plant")
+    parser.add_argument("--days", type=int, default=14, help="Days of history to analyse")
+    args = parser.parse_args()
+    print(fleet_watering_report(args.days).to_string(index=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,162 @@
+from datetime import datetime
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config import forecast_forgetting, forecast_horizon, forecast_lags
+from instrumentation import timed
+
+
+class CycleForecaster:
+    """
+    Autoregressive moisture forecaster cached for the current watering cycle.
+
+    The AR model is fitted once when a new watering cycle starts, readings that arrive later in the same cycle update
+    the coefficients with recursive least squares so each prediction round only pays for the new readings.
+
+    Args:
+        lags (int): The number of lagged readings used by the model.
+        horizon (int): The number of readings to forecast ahead.
+        forgetting (float): The RLS forgetting factor, 1.0 weights all readings in the cycle equally.
+    """
+
+    def __init__(
+        self, lags: int = forecast_lags, horizon: int = forecast_horizon, forgetting: float = forecast_forgetting
+    ) -> None:
+        self.lags = lags
+        self.horizon = horizon
+        self.forgetting = forgetting
+        self.cycle_start = None
+        self.params = None
+        self._P = None
+        self._values = np.empty(0)
+        self._times = np.empty(0, dtype="datetime64[ns]")
+
+    def _design(self, values: np.ndarray) -> np.ndarray:
+        """Build the [1, y(t-1), ..., y(t-lags)] regressor rows for every reading after the first `lags`."""
+        lagged = np.lib.stride_tricks.sliding_window_view(values, self.lags)[:-1, ::-1]
+        return np.hstack([np.ones((len(lagged), 1)), lagged])
+
+    @timed("forecast_fit")
+    def refit(self, cycle_df: pd.DataFrame, cycle_start: datetime) -> None:
+        """
+        Fit the model from scratch on the readings of a watering cycle.
+
+        Args:
+            cycle_df (pd.DataFrame): The moisture readings of the cycle.
+            cycle_start (datetime): The watering time that started the cycle.
+
+        Raises:
+            ValueError: If the cycle does not have enough readings for the number of lags.
+        """
+        # statsmodels takes seconds to import on a Pi, so it loads with the first fit on the prediction worker
+        from statsmodels.tsa.ar_model import AutoReg
+
+        self.cycle_start = cycle_start
+        self.params = None
+        self._values = cycle_df["moisture"].values.astype(float)
+        self._times = cycle_df["timestamp"].values
+        model_fit = AutoReg(self._values, lags=self.lags, old_names=False).fit()
+        design = self._design(self._values)
+        self._P = np.linalg.pinv(design.T @ design)
+        self.params = np.asarray(model_fit.params)
+
+    def get_state(self) -> Tuple[dict, Dict[str, np.ndarray]]:
+        """
+        Return the fitted model for the warm-start snapshot.
+
+        Returns:
+            Tuple[dict, Dict[str, np.ndarray]]: The cycle start and the model arrays, or None if nothing is fitted.
+        """
+        if self.params is None:
+            return None
+        meta = {"lags": self.lags, "cycle_start": None if self.cycle_start is None else str(self.cycle_start)}
+        arrays = {
+            "params": self.params,
+            "P": self._P,
+            "values": self._values,
+            "times": self._times.astype("datetime64[ns]").astype(np.int64),
+        }
+        return meta, arrays
+
+    def set_state(self, meta: dict, arrays: Dict[str, np.ndarray]) -> None:
+        """Restore a model returned by `get_state`, ignoring it if the number of lags has changed."""
+        if meta["lags"] != self.lags:
+            return
+        self.cycle_start = None if meta["cycle_start"] is None else pd.Timestamp(meta["cycle_start"])
+        self.params = arrays["params"]
+        self._P = arrays["P"]
+        self._values = arrays["values"]
+        self._times = arrays["times"].view("datetime64[ns]")
+
+    def _rls_update(self, x: np.ndarray, y: float) -> None:
+        Px = self._P @ x
+        gain = Px / (self.forgetting + x @ Px)
+        self.params = self.params + gain * (y - x @ self.params)
+        self._P = (self._P - np.outer(gain, Px)) / self.forgetting
+
+    @timed("forecast_update")
+    def update(self, cycle_df: pd.DataFrame, cycle_start: datetime) -> None:
+        """
+        Bring the model up to date with the current watering cycle.
+
+        A new `cycle_start` triggers a full refit, otherwise only the readings not yet seen are applied with recursive
+        least squares.
+
+        Args:
+            cycle_df (pd.DataFrame): The moisture readings of the current cycle.
+            cycle_start (datetime): The watering time that started the cycle.
+
+        Raises:
+            ValueError: If the cycle does not have enough readings for the number of lags.
+        """
+        n_seen = len(self._values)
+        if self.params is None or cycle_start != self.cycle_start or len(cycle_df) < n_seen:
+            self.refit(cycle_df, cycle_start)
+            return
+        values = cycle_df["moisture"].values.astype(float)
+        design = self._design(values[n_seen - self.lags:])
+        for x, y in zip(design, values[n_seen:]):
+            self._rls_update(x, y)
+        self._values = values
+        self._times = cycle_df["timestamp"].values
+
+    def forecast(self, steps: int = None) -> np.ndarray:
+        """
+        Forecast the readings following the end of the cycle.
+
+        Args:
+            steps (int, optional): The number of readings to forecast. Defaults to the configured horizon.
+
+        Returns:
+            np.ndarray: The forecast readings.
+        """
+        steps = self.horizon if steps is None else steps
+        # Coefficients ordered oldest lag first so they line up with a forward slice of the history
+        coefs = self.params[:0:-1]
+        history = np.empty(self.lags + steps)
+        history[: self.lags] = self._values[-self.lags:]
+        for step in range(steps):
+            history[self.lags + step] = self.params[0] + coefs @ history[step : step + self.lags]
+        return history[self.lags:]
+
+    def sample_interval(self) -> pd.Timedelta:
+        """Return the median interval between the readings of the cycle."""
+        return pd.Timedelta(np.median(np.diff(self._times).astype(np.int64)))
+
+    @timed("forecast")
+    def forecast_crossing(self, threshold: float) -> pd.Timestamp:
+        """
+        Forecast when the moisture will first drop below a threshold.
+
+        Args:
+            threshold (float): The moisture percentage to test against.
+
+        Returns:
+            pd.Timestamp: The forecast crossing time, or None if it does not occur within the horizon.
+        """
+        below = np.flatnonzero(self.forecast() < threshold)
+        if len(below) == 0:
+            return None
+        return pd.Timestamp(self._times[-1]) + (int(below[0]) + 1) * self.sample_interval()
@@ -0,0 +1,209 @@
+"""
+Timers, counters and gauges around the hot paths, served as Prometheus text.
+
+With `metrics_enabled` off, `timed` returns functions unwrapped, `timer` returns a shared no-op context manager and
+`count` and `set_gauge` return straight away, so instrumented code costs next to nothing. With it on, the logger and
+the dashboard each serve their metrics on `/metrics` of their own port, and `profiler_enabled` adds a sampling
+profiler that counts which project functions the threads are in.
+"""
+
+import contextlib
+import functools
+import sys
+import threading
+import time
+from collections import defaultdict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from config import metrics_enabled, metrics_host, profiler_enabled, profiler_interval
+
+PREFIX = "plant_watch_"
+SRC_DIR = str(Path(__file__).resolve().parent)
+
+_lock = threading.Lock()
+_timers = defaultdict(lambda: [0, 0.0, 0.0])
+_counters = defaultdict(float)
+_gauges = {}
+_NULL_TIMER = contextlib.nullcontext()
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return name, tuple(sorted(labels.items()))
+
+
+def _observe(key: tuple, seconds: float) -> None:
+    with _lock:
+        stats = _timers[key]
+        stats[0] += 1
+        stats[1] += seconds
+        stats[2] = max(stats[2], seconds)
+
+
+class _Timer:
+    __slots__ = ("key", "start")
+
+    def __init__(self, key: tuple) -> None:
+        self.key = key
+
+    def __enter__(self) -> "_Timer":
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc) -> None:
+        _observe(self.key, time.perf_counter() - self.start)
+
+
+def timer(name: str, **labels):
+    """Return a context manager that times its block as `name`."""
+    if not metrics_enabled:
+        return _NULL_TIMER
+    return _Timer(_key(name, labels))
+
+
+def timed(name: str, **labels):
+    """Decorate a function to time each call as `name`."""
+
+    def decorator(fn):
+        if not metrics_enabled:
+            return fn
+        key = _key(name, labels)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                _observe(key, time.perf_counter() - start)
+
+        return wrapper
+
+    return decorator
+
+
+def count(name: str, value: float = 1, **labels) -> None:
+    """Add `value` to the counter `name`."""
+    if not metrics_enabled:
+        return
+    with _lock:
+        _counters[_key(name, labels)] += value
+
+
+def set_gauge(name: str, value: float, **labels) -> None:
+    """Set the gauge `name` to `value`."""
+    if not metrics_enabled:
+        return
+    with _lock:
+        _gauges[_key(name, labels)] = value
+
+
+def _format_labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"') for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+
+def render() -> str:
+    """Return every metric in the Prometheus text exposition format."""
+    with _lock:
+        timers = {key: list(stats) for key, stats in _timers.items()}
+        counters = dict(_counters)
+        gauges = dict(_gauges)
+
+    lines = []
+    typed = set()
+
+    def add(name: str, kind: str, labels: tuple, value: float) -> None:
+        if name not in typed:
+            lines.append(f"# TYPE {name} {kind}")
+            typed.add(name)
+        lines.append(f"{name}{_format_labels(labels)} {value}")
+
+    for (name, labels), (n_calls, total, _) in sorted(timers.items()):
+        # A summary without quantiles, its samples are the _count and _sum series
+        if f"{PREFIX}{name}_seconds" not in typed:
+            lines.append(f"# TYPE {PREFIX}{name}_seconds summary")
+            typed.add(f"{PREFIX}{name}_seconds")
+        lines.append(f"{PREFIX}{name}_seconds_count{_format_labels(labels)} {n_calls}")
+        lines.append(f"{PREFIX}{name}_seconds_sum{_format_labels(labels)} {total}")
+    for (name, labels), (_, _, longest) in sorted(timers.items()):
+        add(f"{PREFIX}{name}_seconds_max", "gauge", labels, longest)
+    for (name, labels), value in sorted(counters.items()):
+        add(f"{PREFIX}{name}_total", "counter", labels, value)
+    for (name, labels), value in sorted(gauges.items()):
+        add(f"{PREFIX}{name}", "gauge", labels, value)
+    return "\n".join(lines) + "\n"
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = render().encode()
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format: str, *args) -> None:
+        pass
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of every thread and counts the innermost project function each one is in.
+
+    Time spent inside libraries such as pandas or statsmodels is attributed to the project function that called them.
+    The counts are served as the `profile_samples` counter.
+
+    Args:
+        interval (float, optional): Seconds between samples. Defaults to `profiler_interval`.
+    """
+
+    def __init__(self, interval: float = profiler_interval) -> None:
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                while frame is not None and not frame.f_code.co_filename.startswith(SRC_DIR):
+                    frame = frame.f_back
+                if frame is not None:
+                    function = f"{Path(frame.f_code.co_filename).stem}.{frame.f_code.co_name}"
+                    count("profile_samples", function=function)
+
+
+def start_metrics_server(port: int, host: str = metrics_host) -> ThreadingHTTPServer:
+    """
+    Serve the metrics on `/metrics` from a background thread, and start the profiler if enabled.
+
+    Args:
+        port (int): The port to listen on.
+        host (str, optional): The address to listen on. Defaults to `metrics_host`.
+
+    Returns:
+        ThreadingHTTPServer: The server, or None if instrumentation is disabled.
+    """
+    if not metrics_enabled:
+        return None
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    threading.Thread(target=server.serve_forever, name="metrics-server", daemon=True).start()
+    if profiler_enabled:
+        SamplingProfiler().start()
+    print(f"Serving metrics on http://{host}:{port}/metrics")
+    return server
@@ -0,0 +1,391 @@
+"""
+Push-based stream of logged readings from the logger to the dashboard.
+
+The logger runs a `StreamPublisher`, a small TCP server that sends each aggregated reading to every connected
+subscriber as a line of JSON. The dashboard runs a `StreamSubscriber` that reconnects automatically and on every
+connection asks for the readings it missed, which the publisher backfills from the stored logs and its recent history.
+Both ends run in-process on localhost, so the publisher doubles as the stand-in broker for testing the dashboard.
+
+Check a round trip through a publisher restart, with backfill of the readings logged while disconnected, with:
+```
+python live_stream.py
+```
+"""
+
+import argparse
+import json
+import queue
+import socket
+import tempfile
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+import pandas as pd
+
+from config import stream_host, stream_port
+
+
+class _StreamClient:
+    """
+    A subscriber connection with its own outbound queue, written by a sender thread so a slow subscriber never blocks
+    the publisher.
+
+    Args:
+        conn (socket.socket): The subscriber connection.
+        queue_size (int): The readings queued before the subscriber counts as unable to keep up.
+    """
+
+    def __init__(self, conn: socket.socket, queue_size: int) -> None:
+        self.conn = conn
+        self.closed = False
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._backfill = []
+        self._thread = threading.Thread(target=self._send, name="stream-sender", daemon=True)
+
+    def start(self, backfill: List[bytes]) -> None:
+        """Send the backfill, then the readings queued since the client joined."""
+        self._backfill = backfill
+        self._thread.start()
+
+    def put(self, message: bytes) -> bool:
+        """Queue a reading, closing the connection if the queue is full. Returns False once the client is closed."""
+        if self.closed:
+            return False
+        try:
+            self._queue.put_nowait(message)
+        except queue.Full:
+            print("Stream subscriber cannot keep up, disconnecting it")
+            self.close()
+            return False
+        return True
+
+    def close(self) -> None:
+        self.closed = True
+        try:
+            self.conn.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self.conn.close()
+        try:
+            self._queue.put_nowait(None)
+        except queue.Full:
+            pass
+
+    def _send(self) -> None:
+        try:
+            for message in self._backfill:
+                self.conn.sendall(message)
+            self._backfill = []
+            while not self.closed:
+                message = self._queue.get()
+                if message is None:
+                    break
+                self.conn.sendall(message)
+        except OSError as e:
+            if not self.closed:
+                print(f"Stream subscriber dropped: {e}")
+        self.close()
+
+
+class StreamPublisher:
+    """
+    TCP server that publishes readings to subscribers.
+
+    A subscriber opens a connection and sends one JSON line `{"since": {<sensor>: <iso timestamp>}}`. Readings of each
+    sensor logged after its `since` are backfilled from the storage backend and the publisher's recent history, or only
+    the latest reading of sensors without one, before live readings follow. Each subscriber has its own queue and
+    sender thread, so `publish` only queues the reading.
+
+    Args:
+        sensors (List[str]): The names of the published sensors.
+        backend: The storage backend used for backfill, or None to backfill from recent history only.
+        host (str, optional): The address to listen on. Defaults to `stream_host`.
+        port (int, optional): The port to listen on, 0 picks a free port. Defaults to `stream_port`.
+        history (int, optional): The number of recent readings kept for backfill. Defaults to 1000.
+        queue_size (int, optional): The readings queued per subscriber before it is dropped. Defaults to 10000.
+    """
+
+    def __init__(
+        self,
+        sensors: List[str],
+        backend=None,
+        host: str = stream_host,
+        port: int = stream_port,
+        history: int = 1000,
+        queue_size: int = 10000,
+    ) -> None:
+        self.sensors = sensors
+        self.backend = backend
+        self.queue_size = queue_size
+        self._server = socket.create_server((host, port))
+        self.address = self._server.getsockname()
+        self._recent = deque(maxlen=history)
+        self._clients = []
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._accept, name="stream-publisher", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+        print(f"Streaming readings on {self.address[0]}:{self.address[1]}")
+
+    def close(self) -> None:
+        try:
+            # Wakes the accept thread, which otherwise keeps the port bound
+            self._server.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass
+        self._server.close()
+        with self._lock:
+            for client in self._clients:
+                client.close()
+            self._clients = []
+
+    def _accept(self) -> None:
+        while True:
+            try:
+                client, _ = self._server.accept()
+            except OSError:
+                return
+            threading.Thread(target=self._handshake, args=(client,), daemon=True).start()
+
+    def _handshake(self, conn: socket.socket) -> None:
+        client = None
+        try:
+            conn.settimeout(5)
+            request = json.loads(conn.makefile("r").readline() or "{}")
+            since = {sensor: pd.Timestamp(ts) for sensor, ts in (request.get("since") or {}).items()}
+            # Join before the backfill so live readings published meanwhile queue up behind it, the subscriber drops
+            # the ones the backfill also holds
+            with self._lock:
+                client = _StreamClient(conn, self.queue_size)
+                self._clients.append(client)
+                recent = list(self._recent)
+            client.start(self._backfill(since, recent))
+        except (OSError, ValueError) as e:
+            print(f"Stream subscriber handshake failed: {e}")
+            if client is None:
+                conn.close()
+            else:
+                client.close()
+
+    def _backfill(self, since: Dict[str, pd.Timestamp], recent: list) -> List[bytes]:
+        messages = []
+        for sensor in self.sensors:
+            sensor_recent = [(ts, message) for name, ts, message in recent if name == sensor]
+            start = since.get(sensor)
+            if start is None:
+                messages.extend(message for _, message in sensor_recent[-1:])
+                continue
+            stored_until = start
+            if self.backend is not None:
+                df = self.backend.load(sensor, start=start)
+                df = df[df["timestamp"] > start]
+                messages.extend(encode_reading(sensor, value, ts) for value, ts in zip(df[sensor], df["timestamp"]))
+                if len(df):
+                    stored_until = max(stored_until, df["timestamp"].iloc[-1])
+            messages.extend(message for ts, message in sensor_recent if ts > stored_until)
+        return messages
+
+    def publish(self, sensor: str, value: float, timestamp: datetime) -> None:
+        """
+        Queue a reading for every subscriber, dropping subscribers that cannot keep up.
+
+        Args:
+            sensor (str): The name of the sensor.
+            value (float): The value of the reading.
+            timestamp (datetime): The time of the reading.
+        """
+        message = encode_reading(sensor, value, timestamp)
+        with self._lock:
+            self._recent.append((sensor, pd.Timestamp(timestamp), message))
+            self._clients = [client for client in self._clients if client.put(message)]
+
+
+def encode_reading(sensor: str, value: float, timestamp: datetime) -> bytes:
+    return (
+        json.dumps({"sensor": sensor, "value": float(value), "timestamp": pd.Timestamp(timestamp).isoformat()}) + "\n"
+    ).encode()
+
+
+class StreamSubscriber:
+    """
+    Receives readings from a `StreamPublisher` on a background thread, reconnecting with backoff.
+
+    After a disconnect the subscriber asks for everything since the newest reading it has received of each sensor, so no
+    readings are lost while the logger restarts, and readings it already has are dropped.
+
+    Args:
+        host (str, optional): The publisher address. Defaults to `stream_host`.
+        port (int, optional): The publisher port. Defaults to `stream_port`.
+        max_backoff (float, optional): The longest wait in seconds between reconnect attempts. Defaults to 30.
+        since (Dict[str, pd.Timestamp], optional): Backfill the readings of each sensor after this time on the first
+            connection, e.g. the newest readings restored from a snapshot. Sensors without one only get their latest
+            reading. Defaults to none.
+    """
+
+    def __init__(
+        self,
+        host: str = stream_host,
+        port: int = stream_port,
+        max_backoff: float = 30,
+        since: Dict[str, pd.Timestamp] = None,
+    ) -> None:
+        self.host = host
+        self.port = port
+        self.max_backoff = max_backoff
+        self.connected = False
+        self._since = dict(since or {})
+        self._queue = queue.Queue()
+        self._pending = {}
+        self._arrived = threading.Event()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stream-subscriber", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        backoff = 1
+        while not self._stop.is_set():
+            try:
+                with socket.create_connection((self.host, self.port), timeout=5) as conn:
+                    since = {sensor: ts.isoformat() for sensor, ts in self._since.items()}
+                    conn.sendall((json.dumps({"since": since}) + "\n").encode())
+                    conn.settimeout(None)
+                    self.connected = True
+                    backoff = 1
+                    for line in conn.makefile("r"):
+                        reading = json.loads(line)
+                        reading["timestamp"] = pd.Timestamp(reading["timestamp"])
+                        last = self._since.get(reading["sensor"])
+                        if last is not None and reading["timestamp"] <= last:
+                            # Already received, live readings can overlap the backfill
+                            continue
+                        self._since[reading["sensor"]] = reading["timestamp"]
+                        self._queue.put(reading)
+                        self._arrived.set()
+                        if self._stop.is_set():
+                            return
+            except (OSError, ValueError) as e:
+                print(f"Stream connection to {self.host}:{self.port} lost ({e}), retrying in {backoff}s")
+            self.connected = False
+            self._stop.wait(backoff)
+            backoff = min(backoff * 2, self.max_backoff)
+
+    def wait_for_readings(self, timeout: float = None) -> bool:
+        """
+        Block until a reading arrives that `read_new` has not returned yet, or the timeout passes.
+
+        Args:
+            timeout (float, optional): The longest wait in seconds. Defaults to waiting indefinitely.
+
+        Returns:
+            bool: True if readings arrived.
+        """
+        arrived = self._arrived.wait(timeout)
+        # Readings arriving from here on set it again, the ones before are already queued for `read_new`
+        self._arrived.clear()
+        return arrived
+
+    def read_new(self, sensor: str) -> pd.DataFrame:
+        """
+        Return the readings of a sensor received since the last call.
+
+        Args:
+            sensor (str): The name of the sensor.
+
+        Returns:
+            pd.DataFrame: A DataFrame with the sensor and timestamp columns, empty if nothing was received.
+        """
+        while True:
+            try:
+                reading = self._queue.get_nowait()
+            except queue.Empty:
+                break
+            self._pending.setdefault(reading["sensor"], []).append((reading["value"], reading["timestamp"]))
+        return pd.DataFrame(self._pending.pop(sensor, []), columns=[sensor, "timestamp"])
+
+
+def round_trip_check(timeout: float = 30) -> None:
+    """
+    Stream readings through a publisher that restarts, and check the subscriber receives each of them exactly once.
+
+    Readings of every sensor share timestamps, and while the publisher is down one sensor's reading at the newest
+    timestamp the subscriber already has for another sensor is logged, so the reconnect must backfill it.
+
+    Args:
+        timeout (float, optional): Seconds to wait for the readings to arrive. Defaults to 30.
+
+    Raises:
+        AssertionError: If a reading is missing or received twice.
+    """
+    from storage import get_storage_backend
+
+    sensors = ["moisture", "temperature"]
+    times = pd.date_range("2024-01-01", periods=6, freq="1min")
+    expected = [(sensor, float(i), ts) for i, ts in enumerate(times) for sensor in sensors]
+    with tempfile.TemporaryDirectory() as tmp:
+        backend = get_storage_backend("csv", Path(tmp))
+        publisher = StreamPublisher(sensors, backend, host="localhost", port=0)
+        publisher.start()
+        port = publisher.address[1]
+        subscriber = StreamSubscriber(host="localhost", port=port, max_backoff=1)
+        subscriber.start()
+        received = []
+
+        def receive(n_readings: int) -> None:
+            deadline = time.monotonic() + timeout
+            while len(received) < n_readings and time.monotonic() < deadline:
+                for sensor in sensors:
+                    df = subscriber.read_new(sensor)
+                    received.extend((sensor, value, ts) for value, ts in zip(df[sensor], df["timestamp"]))
+                time.sleep(0.05)
+
+        def log(sensor: str, value: float, ts: pd.Timestamp, publish: bool = True) -> None:
+            backend.append(sensor, [(value, ts)])
+            if publish:
+                publisher.publish(sensor, value, ts)
+
+        while not subscriber.connected:
+            time.sleep(0.05)
+        for sensor, value, ts in expected[:5]:
+            log(sensor, value, ts)
+        receive(5)
+
+        # The logger restarts, logging another sensor at the newest timestamp the subscriber has while it is down
+        publisher.close()
+        for sensor, value, ts in expected[5:7]:
+            log(sensor, value, ts, publish=False)
+        publisher = StreamPublisher(sensors, backend, host="localhost", port=port)
+        publisher.start()
+        while not subscriber.connected or not publisher._clients:
+            time.sleep(0.05)
+        for sensor, value, ts in expected[7:]:
+            log(sensor, value, ts)
+        receive(len(expected))
+        subscriber.stop()
+        publisher.close()
+
+    key = lambda reading: (reading[2], reading[0])
+    missing = sorted(set(expected) - set(received), key=key)
+    assert not missing, f"Readings lost: {missing}"
+    assert len(received) == len(expected), f"Readings received twice: {len(received) - len(expected)}"
+    print(f"Round trip ok, {len(received)} readings received once each across a publisher restart")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Check a publisher and subscriber round trip across a reconnect")
+    parser.add_argument("--timeout", type=float, default=30, help="Seconds to wait for the readings")
+    args = parser.parse_args()
+    round_trip_check(args.timeout)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,220 @@
+import os
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from storage import RECORD_DTYPE, get_manifest
+
+# Bytes to step back per read when seeking backwards from the end of a log
+TAIL_BLOCK_SIZE = 4096
+
+
+class IncrementalLogReader:
+    """
+    Incremental reader for an append-only `{sensor}_log.csv` file.
+
+    Remembers the byte offset of the last complete row so each call only reads rows appended since the previous
+    call. A half-written trailing line is left for the next call. A log rewritten by compaction is followed to the
+    same row of the new file, while a truncated or otherwise replaced file is re-read from its first row that is not
+    in a partition, setting `reset` so callers can discard anything derived from the old file.
+
+    Args:
+        file_path (Path): The path to the sensor log.
+    """
+
+    def __init__(self, file_path: Path) -> None:
+        self.file_path = Path(file_path)
+        self.sensor = self.file_path.stem.replace("_log", "")
+        self.offset = None
+        self.inode = None
+        self.reset = False
+        self.last_row = None
+
+    def _check_rotation(self) -> bool:
+        """Reset the offset if the file has been truncated or replaced since the last read."""
+        try:
+            stat = os.stat(self.file_path)
+        except FileNotFoundError:
+            return False
+        # An offset without an inode was seeded before the log existed, see `seek_end`
+        bound = self.offset is not None and self.inode is not None
+        if bound and (stat.st_ino != self.inode or stat.st_size < self.offset):
+            manifest = get_manifest(self.file_path.parent)
+            followed = None
+            if stat.st_ino != self.inode and self.inode is not None:
+                followed = manifest.follow(self.file_path, self.inode, self.offset)
+            if followed is not None:
+                self.offset = followed
+            else:
+                print(f"{self.file_path.name} was truncated or rotated, re-reading from the start")
+                self.offset = manifest.head_start(self.file_path)
+                self.reset = True
+        self.inode = stat.st_ino
+        return True
+
+    def _head_start(self) -> int:
+        """Return the offset of the first row of the log that has not been moved into a partition."""
+        return get_manifest(self.file_path.parent).head_start(self.file_path)
+
+    def _seek_tail(self, f, n_rows: int) -> int:
+        """Return the offset of the start of the last `n_rows` complete rows without reading the whole file."""
+        end = f.seek(0, os.SEEK_END)
+        pos = end
+        buffer = b""
+        while pos > 0:
+            step = min(TAIL_BLOCK_SIZE, pos)
+            pos -= step
+            f.seek(pos)
+            buffer = f.read(step) + buffer
+            # Ignore a trailing partial row and require one extra newline to bound the first complete row
+            complete = buffer[: buffer.rfind(b"\n") + 1]
+            if complete.count(b"\n") > n_rows:
+                break
+        complete = buffer[: buffer.rfind(b"\n") + 1]
+        lines = complete.splitlines(keepends=True)
+        tail_bytes = sum(len(line) for line in lines[-n_rows:])
+        return pos + len(complete) - tail_bytes
+
+    def _complete(self, chunk: bytes) -> bytes:
+        """Trim a chunk to its complete rows, leaving a half-written trailing line for the next call."""
+        return chunk[: chunk.rfind(b"\n") + 1]
+
+    def _parse(self, chunk: bytes) -> List[Tuple[float, str]]:
+        rows = []
+        for line in chunk.decode("utf-8", errors="replace").splitlines():
+            fields = line.split(",")
+            if len(fields) < 2:
+                continue
+            try:
+                value = float(fields[0])
+            except ValueError:
+                # Header row or a corrupt line
+                continue
+            rows.append((value, fields[1].strip()))
+        return rows
+
+    def read_rows(self, tail: int = None) -> List[Tuple[float, str]]:
+        """
+        Read the complete rows appended since the last call.
+
+        Args:
+            tail (int, optional): On the first call only, start from the last `tail` rows instead of the whole file.
+
+        Returns:
+            List[Tuple[float, str]]: The new (value, timestamp) rows, empty if nothing was appended.
+        """
+        self.reset = False
+        if not self._check_rotation():
+            return []
+        with open(self.file_path, "rb") as f:
+            if self.offset is None:
+                head_start = self._head_start()
+                self.offset = max(self._seek_tail(f, tail), head_start) if tail else head_start
+            f.seek(self.offset)
+            chunk = f.read()
+        complete = self._complete(chunk)
+        self.offset += len(complete)
+        rows = self._parse(complete)
+        if rows:
+            self.last_row = rows[-1]
+        return rows
+
+    def seek_end(self) -> Tuple[float, str]:
+        """
+        Skip to the end of the complete rows, so the next read returns only the rows appended from now on.
+
+        Returns:
+            Tuple[float, str]: The last complete (value, timestamp) row, or None if the log is empty or missing.
+        """
+        self.reset = False
+        try:
+            inode = os.stat(self.file_path).st_ino
+        except FileNotFoundError:
+            # Read the log from its first row once it is created
+            self.offset, self.inode = 0, None
+            return None
+        with open(self.file_path, "rb") as f:
+            start = self._seek_tail(f, 1)
+            f.seek(start)
+            complete = self._complete(f.read())
+        self.offset, self.inode = start + len(complete), inode
+        rows = self._parse(complete)
+        return rows[-1] if rows else None
+
+    def read_new(self, tail: int = None) -> pd.DataFrame:
+        """
+        Read the rows appended since the last call as a DataFrame.
+
+        Args:
+            tail (int, optional): On the first call only, start from the last `tail` rows instead of the whole file.
+
+        Returns:
+            pd.DataFrame: A DataFrame with the sensor and timestamp columns, empty if nothing was appended.
+        """
+        return rows_to_df(self.read_rows(tail), self.sensor)
+
+
+class BinaryLogReader(IncrementalLogReader):
+    """
+    Incremental reader for an append-only binary `{sensor}_log.bin` file of fixed-size records.
+
+    Rows are returned as (value, epoch nanoseconds) tuples. A torn trailing record is left for the next call.
+
+    Args:
+        file_path (Path): The path to the sensor log.
+    """
+
+    def _seek_tail(self, f, n_rows: int) -> int:
+        n_records = f.seek(0, os.SEEK_END) // RECORD_DTYPE.itemsize
+        return max(n_records - n_rows, 0) * RECORD_DTYPE.itemsize
+
+    def _complete(self, chunk: bytes) -> bytes:
+        return chunk[: len(chunk) - len(chunk) % RECORD_DTYPE.itemsize]
+
+    def _parse(self, chunk: bytes) -> List[Tuple[float, int]]:
+        records = np.frombuffer(chunk, dtype=RECORD_DTYPE)
+        return list(zip(records["value"].tolist(), records["timestamp"].tolist()))
+
+
+def open_log_reader(file_path: Path) -> IncrementalLogReader:
+    """
+    Create an incremental reader matching the storage format of a log file.
+
+    Args:
+        file_path (Path): The path to the sensor log.
+
+    Returns:
+        IncrementalLogReader: A reader for CSV logs, or a BinaryLogReader for `.bin` logs.
+    """
+    if Path(file_path).suffix == ".bin":
+        return BinaryLogReader(file_path)
+    return IncrementalLogReader(file_path)
+
+
+def rows_to_df(rows: List[Tuple[float, str]], sensor: str) -> pd.DataFrame:
+    """Convert (value, timestamp) rows into the DataFrame layout used by the dashboard."""
+    df = pd.DataFrame(rows, columns=[sensor, "timestamp"])
+    df["timestamp"] = pd.to_datetime(df["timestamp"])
+    return df
+
+
+_readers = {}
+
+
+def get_log_reader(file_path: Path, consumer: str = "poll") -> IncrementalLogReader:
+    """
+    Return the shared reader for a log file, creating it on first use.
+
+    Args:
+        file_path (Path): The path to the sensor log.
+        consumer (str, optional): Name of the consumer; each consumer keeps its own offset. Defaults to "poll".
+
+    Returns:
+        IncrementalLogReader: The reader for the file and consumer.
+    """
+    key = (str(file_path), consumer)
+    if key not in _readers:
+        _readers[key] = open_log_reader(file_path)
+    return _readers[key]
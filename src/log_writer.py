@@ -0,0 +1,126 @@
+import os
+import threading
+from datetime import datetime
+from typing import Callable, List
+
+from clock import Clock
+from config import write_flush_interval, write_flush_rows, write_fsync
+from instrumentation import count, timer
+
+
+def write_all(f, data: bytes) -> None:
+    """Write every byte of `data` to an unbuffered file, which may accept only part of it per call."""
+    view = memoryview(data)
+    while view:
+        view = view[f.write(view) :]
+
+
+class BufferedLogWriter:
+    """
+    Buffers logged readings in memory and writes them to the sensor logs in batches.
+
+    File handles stay open between flushes. Rows are flushed once any sensor has `flush_rows` buffered or
+    `flush_interval` seconds have passed since the last flush, checked on each write and by `flush_if_due`. The
+    logger also flushes at the end of every aggregation window. Each sensor's buffered rows are encoded up front and
+    written in one go, repeating the unbuffered write until every byte is out, so a crash can only leave a torn tail,
+    which is trimmed on the next start. Writes
+    are serialised with `reopen`, which lets log compaction replace a log from another thread.
+
+    Args:
+        backend: The storage backend of the sensor logs.
+        sensors (List[str]): The names of the sensors to write.
+        flush_rows (int, optional): Buffered rows per sensor that trigger a flush. Defaults to `write_flush_rows`.
+        flush_interval (float, optional): Seconds between time-based flushes. Defaults to `write_flush_interval`.
+        fsync (bool, optional): Sync the logs to disk after each flush. Defaults to `write_fsync`.
+        clock (Clock, optional): The clock `flush_interval` is measured on. Defaults to real time.
+    """
+
+    def __init__(
+        self,
+        backend,
+        sensors: List[str],
+        flush_rows: int = write_flush_rows,
+        flush_interval: float = write_flush_interval,
+        fsync: bool = write_fsync,
+        clock: Clock = None,
+    ) -> None:
+        self.backend = backend
+        self.flush_rows = flush_rows
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.clock = Clock() if clock is None else clock
+        self._buffers = {sensor: [] for sensor in sensors}
+        self._files = {}
+        self._last_flush = self.clock.monotonic()
+        self._lock = threading.RLock()
+        for sensor in sensors:
+            self._open(sensor)
+
+    def _open(self, sensor: str) -> None:
+        file_path = self.backend.log_path(sensor)
+        trimmed = self.backend.trim_torn_tail(sensor)
+        if trimmed:
+            print(f"Trimmed {trimmed} bytes of a torn write from the end of {file_path.name}")
+        new_file = not file_path.exists() or file_path.stat().st_size == 0
+        self._files[sensor] = open(file_path, "ab", buffering=0)
+        if new_file:
+            write_all(self._files[sensor], self.backend.encode(sensor, [], header=True))
+
+    def write(self, sensor: str, value: float, timestamp: datetime) -> None:
+        """
+        Buffer a reading and flush if the size or time policy is met.
+
+        Args:
+            sensor (str): The name of the sensor.
+            value (float): The value of the reading.
+            timestamp (datetime): The time of the reading.
+        """
+        with self._lock:
+            self._buffers[sensor].append((value, timestamp))
+            if len(self._buffers[sensor]) >= self.flush_rows:
+                self.flush()
+            else:
+                self.flush_if_due()
+
+    def flush_if_due(self) -> None:
+        """Flush the buffered readings if `flush_interval` seconds have passed since the last flush."""
+        with self._lock:
+            if self.clock.monotonic() - self._last_flush >= self.flush_interval:
+                self.flush()
+
+    def flush(self) -> None:
+        """Write every buffered reading to its log."""
+        with self._lock:
+            for sensor, rows in self._buffers.items():
+                if not rows:
+                    continue
+                f = self._files[sensor]
+                with timer("log_write", sensor=sensor):
+                    write_all(f, self.backend.encode(sensor, rows))
+                    if self.fsync:
+                        os.fsync(f.fileno())
+                count("log_rows_written", len(rows), sensor=sensor)
+                self._buffers[sensor] = []
+            self._last_flush = self.clock.monotonic()
+
+    def reopen(self, sensor: str, replace: Callable) -> None:
+        """
+        Flush and close a sensor log, call `replace` while nothing is written to it and open the log again.
+
+        Args:
+            sensor (str): The name of the sensor.
+            replace (Callable): Replaces the log file, e.g. with a compacted copy.
+        """
+        with self._lock:
+            self.flush()
+            self._files[sensor].close()
+            try:
+                replace()
+            finally:
+                self._open(sensor)
+
+    def close(self) -> None:
+        """Flush the buffered readings and close the logs."""
+        self.flush()
+        for f in self._files.values():
+            f.close()
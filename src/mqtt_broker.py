@@ -0,0 +1,198 @@
+"""
+Minimal MQTT 3.1.1 broker for testing the MQTT publisher off the network.
+
+It accepts any client, acknowledges QoS 1 and 2 publishes, keeps retained messages and forwards publishes to matching
+subscriptions at QoS 0. Every received message is recorded in `messages`. Closing the broker drops every connection,
+and a new broker on the same port brings it back, which is enough to exercise reconnects and the offline queue.
+
+```
+python mqtt_broker.py --port 1883
+```
+"""
+
+import argparse
+import socket
+import struct
+import threading
+import time
+from typing import List, Tuple
+
+CONNECT, CONNACK, PUBLISH, PUBACK, PUBREC, PUBREL, PUBCOMP = 1, 2, 3, 4, 5, 6, 7
+SUBSCRIBE, SUBACK, UNSUBSCRIBE, UNSUBACK, PINGREQ, PINGRESP, DISCONNECT = 8, 9, 10, 11, 12, 13, 14
+
+
+def topic_matches(pattern: str, topic: str) -> bool:
+    """Return whether a topic matches a subscription filter with `+` and `#` wildcards."""
+    pattern_levels, topic_levels = pattern.split("/"), topic.split("/")
+    for i, level in enumerate(pattern_levels):
+        if level == "#":
+            return True
+        if i >= len(topic_levels) or level not in ("+", topic_levels[i]):
+            return False
+    return len(pattern_levels) == len(topic_levels)
+
+
+def _packet(packet_type: int, body: bytes = b"", flags: int = 0) -> bytes:
+    length, remaining = b"", len(body)
+    while True:
+        byte, remaining = remaining % 128, remaining // 128
+        length += bytes([byte | (0x80 if remaining else 0)])
+        if not remaining:
+            return bytes([packet_type << 4 | flags]) + length + body
+
+
+def _string(data: bytes, offset: int) -> Tuple[str, int]:
+    (length,) = struct.unpack_from("!H", data, offset)
+    return data[offset + 2 : offset + 2 + length].decode(), offset + 2 + length
+
+
+class StandInBroker:
+    """
+    In-process MQTT broker serving on a background thread.
+
+    Args:
+        host (str, optional): The address to listen on. Defaults to "localhost".
+        port (int, optional): The port to listen on, 0 picks a free port. Defaults to 0.
+    """
+
+    def __init__(self, host: str = "localhost", port: int = 0) -> None:
+        self._server = socket.create_server((host, port))
+        self.address = self._server.getsockname()
+        self.messages = []
+        self.retained = {}
+        self._subscriptions = {}
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._accept, name="mqtt-broker", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def close(self) -> None:
+        """Stop listening and drop every connection, as a broker outage would."""
+        for sock in [self._server] + list(self._subscriptions):
+            try:
+                # Shut down first to wake the threads blocked on the socket
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass
+            sock.close()
+        with self._lock:
+            self._subscriptions = {}
+
+    def received(self, topic: str = "#") -> List[Tuple[str, bytes]]:
+        """Return the topic and payload of every received message matching a topic filter."""
+        with self._lock:
+            return [(t, payload) for t, payload, _ in self.messages if topic_matches(topic, t)]
+
+    def _accept(self) -> None:
+        while True:
+            try:
+                conn, _ = self._server.accept()
+            except OSError:
+                return
+            with self._lock:
+                self._subscriptions[conn] = []
+            threading.Thread(target=self._serve, args=(conn,), daemon=True).start()
+
+    def _read_packet(self, stream) -> Tuple[int, int, bytes]:
+        header = stream.read(1)
+        if not header:
+            raise ConnectionError("Client disconnected")
+        length, multiplier = 0, 1
+        while True:
+            byte = stream.read(1)[0]
+            length += (byte & 0x7F) * multiplier
+            multiplier *= 128
+            if not byte & 0x80:
+                break
+        return header[0] >> 4, header[0] & 0x0F, stream.read(length)
+
+    def _serve(self, conn: socket.socket) -> None:
+        stream = conn.makefile("rb")
+        try:
+            while True:
+                packet_type, flags, body = self._read_packet(stream)
+                if packet_type == CONNECT:
+                    conn.sendall(_packet(CONNACK, b"\x00\x00"))
+                elif packet_type == PUBLISH:
+                    self._on_publish(conn, flags, body)
+                elif packet_type == PUBREL:
+                    conn.sendall(_packet(PUBCOMP, body[:2]))
+                elif packet_type == SUBSCRIBE:
+                    self._on_subscribe(conn, body)
+                elif packet_type == UNSUBSCRIBE:
+                    conn.sendall(_packet(UNSUBACK, body[:2]))
+                elif packet_type == PINGREQ:
+                    conn.sendall(_packet(PINGRESP))
+                elif packet_type == DISCONNECT:
+                    break
+        except (OSError, ConnectionError, IndexError):
+            pass
+        finally:
+            with self._lock:
+                self._subscriptions.pop(conn, None)
+            conn.close()
+
+    def _on_publish(self, conn: socket.socket, flags: int, body: bytes) -> None:
+        qos, retain = (flags >> 1) & 0x03, flags & 0x01
+        topic, offset = _string(body, 0)
+        packet_id = body[offset : offset + 2]
+        payload = body[offset + 2 :] if qos else body[offset:]
+        if qos == 1:
+            conn.sendall(_packet(PUBACK, packet_id))
+        elif qos == 2:
+            conn.sendall(_packet(PUBREC, packet_id))
+        forward = _packet(PUBLISH, struct.pack("!H", len(topic)) + topic.encode() + payload)
+        with self._lock:
+            self.messages.append((topic, payload, bool(retain)))
+            if retain:
+                self.retained[topic] = payload
+            subscribers = [
+                other
+                for other, patterns in self._subscriptions.items()
+                if any(topic_matches(pattern, topic) for pattern in patterns)
+            ]
+        for other in subscribers:
+            try:
+                other.sendall(forward)
+            except OSError:
+                pass
+
+    def _on_subscribe(self, conn: socket.socket, body: bytes) -> None:
+        packet_id, offset, patterns = body[:2], 2, []
+        while offset < len(body):
+            pattern, offset = _string(body, offset)
+            patterns.append(pattern)
+            offset += 1
+        with self._lock:
+            self._subscriptions.setdefault(conn, []).extend(patterns)
+            retained = [(topic, payload) for topic, payload in self.retained.items()]
+        conn.sendall(_packet(SUBACK, packet_id + bytes(len(patterns))))
+        for topic, payload in retained:
+            if any(topic_matches(pattern, topic) for pattern in patterns):
+                conn.sendall(_packet(PUBLISH, struct.pack("!H", len(topic)) + topic.encode() + payload, flags=1))
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run a stand-in MQTT broker that prints what it receives")
+    parser.add_argument("--host", default="localhost")
+    parser.add_argument("--port", type=int, default=1883)
+    args = parser.parse_args()
+
+    broker = StandInBroker(args.host, args.port)
+    broker.start()
+    print(f"Stand-in MQTT broker listening on {broker.address[0]}:{broker.address[1]}")
+    seen = 0
+    try:
+        while True:
+            time.sleep(1)
+            new = broker.messages[seen:]
+            seen += len(new)
+            for topic, payload, retain in new:
+                print(f"{topic}{' (retained)' if retain else ''}: {payload.decode(errors='replace')}")
+    except KeyboardInterrupt:
+        broker.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+"""
+Shared MQTT publisher for the Home Assistant integration.
+
+Each process holds one connection, from `get_publisher()`, which the paho network thread reconnects with exponential
+backoff. Publishing only puts the message on an in-memory queue, a sender thread hands it to paho at QoS 1 while
+connected and otherwise appends it to a bounded queue on disk, which is drained in order once the broker is back and
+survives a restart. Test against `mqtt_broker.StandInBroker` by passing its address.
+
+Requires paho-mqtt:
+```
+pip install paho-mqtt
+```
+"""
+
+import json
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List
+
+import pandas as pd
+
+from config import (
+    clientname,
+    hass_password,
+    hass_username,
+    hostname,
+    mqtt_batch_readings,
+    mqtt_max_backoff,
+    mqtt_queue_max,
+    mqtt_queue_path,
+    port,
+    timeout,
+)
+from instrumentation import count, set_gauge
+
+try:
+    import paho.mqtt.client as mqtt
+except ImportError:
+    mqtt = None
+
+_publishers = {}
+_publishers_lock = threading.Lock()
+# Wakes the sender to drain the disk queue after a reconnect
+_DRAIN = object()
+
+
+class DiskQueue:
+    """
+    Bounded FIFO of messages mirrored to a JSON lines file.
+
+    Messages are appended to the file as they are queued and the file is rewritten after a drain, or when dropped
+    messages leave it twice as long as the queue. Beyond `max_messages` the oldest messages are dropped.
+
+    Args:
+        path (Path): The file holding the queue.
+        max_messages (int): The most messages kept.
+    """
+
+    def __init__(self, path: Path, max_messages: int) -> None:
+        self.path = Path(path)
+        self.max_messages = max_messages
+        self.dropped = 0
+        self._messages = deque(maxlen=max_messages)
+        self._lines = 0
+        if self.path.exists():
+            with open(self.path) as f:
+                for line in f:
+                    self._lines += 1
+                    try:
+                        self._messages.append(json.loads(line))
+                    except ValueError:
+                        # Torn last line of an interrupted append
+                        continue
+
+    def __len__(self) -> int:
+        return len(self._messages)
+
+    def push(self, messages: List[dict]) -> None:
+        self.dropped += max(len(self._messages) + len(messages) - self.max_messages, 0)
+        self._messages.extend(messages)
+        if self._lines + len(messages) > 2 * self.max_messages:
+            self.sync()
+            return
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        with open(self.path, "a") as f:
+            f.writelines(json.dumps(message) + "\n" for message in messages)
+        self._lines += len(messages)
+
+    def peek(self) -> dict:
+        return self._messages[0] if self._messages else None
+
+    def pop(self) -> dict:
+        return self._messages.popleft()
+
+    def sync(self) -> None:
+        """Rewrite the file with the messages still queued."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            f.writelines(json.dumps(message) + "\n" for message in self._messages)
+        tmp_path.replace(self.path)
+        self._lines = len(self._messages)
+
+
+class MqttPublisher:
+    """
+    Publishes to an MQTT broker from a background thread, queueing messages on disk while it is unreachable.
+
+    Args:
+        name (str): Names the client id, `<clientname>-<name>`, and the disk queue, so processes do not share either.
+        host (str, optional): The broker address. Defaults to `hostname`.
+        port (int, optional): The broker port. Defaults to `port`.
+        username (str, optional): Defaults to `hass_username`.
+        password (str, optional): Defaults to `hass_password`.
+        queue_dir (Path, optional): The directory of the disk queue. Defaults to `mqtt_queue_path`.
+        max_queued (int, optional): The most messages kept on disk. Defaults to `mqtt_queue_max`.
+        max_backoff (float, optional): The longest wait in seconds between reconnect attempts. Defaults to
+            `mqtt_max_backoff`.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        host: str = hostname,
+        port: int = port,
+        username: str = hass_username,
+        password: str = hass_password,
+        queue_dir: Path = mqtt_queue_path,
+        max_queued: int = mqtt_queue_max,
+        max_backoff: float = mqtt_max_backoff,
+    ) -> None:
+        if mqtt is None:
+            raise ImportError("The Home Assistant integration needs paho-mqtt installed")
+        self.name = name
+        self._outbox = queue.Queue()
+        self._offline = DiskQueue(Path(queue_dir) / f"{name}.jsonl", max_queued)
+        self._connected = threading.Event()
+        self._last_sent = None
+        self._client = mqtt.Client(f"{clientname}-{name}")
+        if username:
+            self._client.username_pw_set(username, password)
+        self._client.on_connect = self._on_connect
+        self._client.on_disconnect = self._on_disconnect
+        self._client.reconnect_delay_set(1, max_backoff)
+        # Connect from the network thread, which keeps retrying so a missing broker never blocks the caller
+        self._client.connect_async(host, port, timeout)
+        self._client.loop_start()
+        self._thread = threading.Thread(target=self._run, name=f"mqtt-{name}", daemon=True)
+        self._thread.start()
+
+    @property
+    def connected(self) -> bool:
+        return self._connected.is_set()
+
+    def _on_connect(self, client, userdata, flags, rc) -> None:
+        if rc != 0:
+            print(f"MQTT connection refused: {mqtt.connack_string(rc)}")
+            return
+        print(f"MQTT connected, {len(self._offline)} queued messages to send")
+        self._connected.set()
+        set_gauge("mqtt_connected", 1, client=self.name)
+        self._outbox.put(_DRAIN)
+
+    def _on_disconnect(self, client, userdata, rc) -> None:
+        self._connected.clear()
+        set_gauge("mqtt_connected", 0, client=self.name)
+        if rc != 0:
+            print("MQTT connection lost, queueing messages until it is back")
+
+    def publish(self, topic: str, payload: dict, retain: bool = False) -> None:
+        """
+        Queue a JSON message for publishing without blocking.
+
+        Args:
+            topic (str): The topic to publish on.
+            payload (dict): The message, sent as JSON.
+            retain (bool, optional): Ask the broker to keep the message for new subscribers. Defaults to False.
+        """
+        self._outbox.put({"topic": topic, "payload": json.dumps(payload), "retain": retain})
+
+    def publish_values(self, topic_root: str, values: Dict[str, object], state_topic: str, timestamp=None) -> None:
+        """
+        Publish a set of values, as one retained message or one message per value depending on `mqtt_batch_readings`.
+
+        Args:
+            topic_root (str): The topic root of the plant.
+            values (Dict[str, object]): The values by name.
+            state_topic (str): The subtopic of the batched message.
+            timestamp (datetime, optional): Added to the batched message when given.
+        """
+        if mqtt_batch_readings:
+            payload = {key: str(value) for key, value in values.items()}
+            if timestamp is not None:
+                payload["timestamp"] = pd.Timestamp(timestamp).isoformat()
+            self.publish(topic_root + state_topic, payload, retain=True)
+            return
+        for key, value in values.items():
+            self.publish(topic_root + key, {key: str(value)})
+
+    def publish_readings(self, plant, readings: Dict[str, float], timestamp: datetime) -> None:
+        """Publish the aggregated readings of a plant, see `publish_values`."""
+        self.publish_values(plant.mqtt_topic_root, readings, "state", timestamp)
+
+    def close(self, timeout: float = 5) -> None:
+        """Stop publishing, keeping unsent messages in the disk queue for the next start."""
+        deadline = time.monotonic() + timeout
+        self._outbox.put(None)
+        self._thread.join(timeout)
+        # Let paho finish sending what it was handed before disconnecting
+        while self._last_sent is not None and not self._last_sent.is_published() and self.connected:
+            if time.monotonic() > deadline:
+                break
+            time.sleep(0.05)
+        self._client.disconnect()
+        self._client.loop_stop()
+
+    def _run(self) -> None:
+        while True:
+            messages = [self._outbox.get()]
+            while True:
+                try:
+                    messages.append(self._outbox.get_nowait())
+                except queue.Empty:
+                    break
+            closing = None in messages
+            messages = [message for message in messages if message is not None and message is not _DRAIN]
+            # Older queued messages go first so the broker sees them in order
+            if len(self._offline) and self.connected:
+                self._drain()
+            if len(self._offline) or not self.connected:
+                self._queue_offline(messages)
+            else:
+                for i, message in enumerate(messages):
+                    if not self._send(message):
+                        self._queue_offline(messages[i:])
+                        break
+            if closing:
+                return
+
+    def _send(self, message: dict) -> bool:
+        info = self._client.publish(message["topic"], message["payload"], qos=1, retain=message["retain"])
+        if info.rc != mqtt.MQTT_ERR_SUCCESS:
+            return False
+        self._last_sent = info
+        count("mqtt_messages", outcome="sent", client=self.name)
+        return True
+
+    def _drain(self) -> None:
+        sent = 0
+        while len(self._offline) and self.connected and self._send(self._offline.peek()):
+            self._offline.pop()
+            sent += 1
+        if sent:
+            self._offline.sync()
+            print(f"Sent {sent} queued MQTT messages, {len(self._offline)} left")
+        set_gauge("mqtt_queue_depth", len(self._offline), client=self.name)
+
+    def _queue_offline(self, messages: List[dict]) -> None:
+        if not messages:
+            return
+        dropped = self._offline.dropped
+        self._offline.push(messages)
+        count("mqtt_messages", len(messages), outcome="queued", client=self.name)
+        if self._offline.dropped > dropped:
+            count("mqtt_messages", self._offline.dropped - dropped, outcome="dropped", client=self.name)
+            print(f"MQTT disk queue full, dropped the {self._offline.dropped - dropped} oldest messages")
+        set_gauge("mqtt_queue_depth", len(self._offline), client=self.name)
+
+
+def get_publisher(name: str) -> MqttPublisher:
+    """
+    Return the publisher of this process, connecting on first use.
+
+    Args:
+        name (str): Names the client, e.g. "logger" or "dashboard".
+
+    Returns:
+        MqttPublisher: The shared publisher.
+    """
+    with _publishers_lock:
+        if name not in _publishers:
+            _publishers[name] = MqttPublisher(name)
+        return _publishers[name]
@@ -1,132 +1,201 @@
 """
+Sensor logger, reads every plant's sensors and writes the aggregated readings to the logs.
 
-Requires install:
-```
-git clone https://github.com/adafruit/Adafruit_Python_DHT.git
-cd  Adafruit_Python_DHT`
-sudo python3 setup.py install
-```
+The sensors come from the backend set by `sensor_backend` in the config, see `sensor_backends.py` for the Grove
+hardware requirements.
 """
 
-import csv
-from datetime import datetime
-
-import Adafruit_DHT
-import numpy as np
-from grove.adc import ADC
-
-from config import data_path, configured_sensors, moisture_pin, temp_humid_pin, homeassistant_integration
+import statistics
+import threading
+from typing import Callable, Dict
+
+from acquisition import AcquisitionScheduler, SensorChannel
+from adaptive_logging import DeadbandFilter
+from clock import Clock
+from config import (
+    adaptive_logging,
+    burst_threshold,
+    compaction_enabled,
+    configured_sensors,
+    dashboard_plant,
+    dht_sample_hz,
+    homeassistant_integration,
+    idle_rate_divisor,
+    live_stream,
+    log_deadband,
+    log_interval,
+    metrics_logger_port,
+    moisture_sample_hz,
+)
+from instrumentation import set_gauge, start_metrics_server
+from log_writer import BufferedLogWriter
+from plants import Plant, get_plant, load_plants
+from rollups import RollupWriter
+from sensor_backends import create_sensors
+
+if live_stream:
+    from live_stream import StreamPublisher
+
+if compaction_enabled:
+    from compaction import LogCompactor
 
 if homeassistant_integration:
-    import json
-    import paho.mqtt.client as mqtt
-    from config import clientname, hostname, port, timeout, hass_username, hass_password, mqtt_topic_root
-
-class GroveMoistureSensor:
-    """
-    Grove Moisture Sensor class
-    Args:
-        pin(int): number of analog pin/channel the sensor connected.
-    """
+    from mqtt_publisher import get_publisher
 
-    def __init__(self, channel) -> None:
-        self.channel = channel
-        self.adc = ADC()
 
-    @property
-    def moisture(self) -> float:
-        """
-        Get the moisture strength value/voltage
-        Returns:
-            (int): voltage, in mV
-        """
-        value = self.adc.read_voltage(self.channel)
-        return value
-
-
-class GroveHumidityTemperatureSensor:
+def run_logger(
+    fleet: Dict[str, Plant],
+    sensors: Dict[str, tuple],
+    clock: Clock = None,
+    stop: threading.Event = None,
+    on_write: Callable = None,
+) -> None:
     """
-    Grove Humidity and Temperature (DHT11) Sensor class
+    Sample, aggregate and log the sensors of every plant until stopped.
+
     Args:
-        pin(int): number of analog pin/channel the sensor connected.
+        fleet (Dict[str, Plant]): The plants to log by id.
+        sensors (Dict[str, tuple]): The moisture sensor and temperature and humidity sensor of each plant.
+        clock (Clock, optional): The clock sampling and timestamps follow. Defaults to real time.
+        stop (threading.Event, optional): Stops the logger after the current window once set. Defaults to running
+            until interrupted.
+        on_write (Callable, optional): Called with the plant id, sensor, value and timestamp of each logged reading.
     """
-    def __init__(self, channel) -> None:
-        self.channel = channel
-        self.dht = Adafruit_DHT
-        self.sensor = Adafruit_DHT.DHT11
-
-    def temperature(self) -> float:
-        _, temperature = self.dht.read_retry(self.sensor, self.channel)
-        return temperature
-
-    def humidity(self) -> float:
-        humidity, _ = self.dht.read_retry(self.sensor, self.channel)
-        return humidity
-
-
-def main() -> None:
-    moisture_sensor = GroveMoistureSensor(moisture_pin)
-    temp_hum_sensor = GroveHumidityTemperatureSensor(temp_humid_pin)
-
-    print(f"{datetime.now()} - Starting sensors: {', '.join(configured_sensors.keys())}")
-    print(moisture_sensor.moisture, temp_hum_sensor.temperature(), temp_hum_sensor.humidity())
+    clock = Clock() if clock is None else clock
+    stop = threading.Event() if stop is None else stop
+    start_metrics_server(metrics_logger_port)
+    moisture_sensors = {plant_id: moisture for plant_id, (moisture, _) in sensors.items()}
+    temp_hum_sensors = {plant_id: temp_hum for plant_id, (_, temp_hum) in sensors.items()}
+
+    log_writers = {}
+    rollups = {}
+    for plant_id, plant in fleet.items():
+        log_storage = plant.storage()
+        log_writers[plant_id] = BufferedLogWriter(log_storage, list(configured_sensors), clock=clock)
+        rollups[plant_id] = {
+            sensor: RollupWriter(sensor, log_storage, plant.rollup_path) for sensor in configured_sensors
+        }
+
+    if live_stream:
+        # Serve the dashboard plant's readings as they are aggregated, backfilling from the stored logs on connect
+        publisher = StreamPublisher(list(configured_sensors), get_plant().storage(), host="0.0.0.0")
+        publisher.start()
+
+    if compaction_enabled:
+        # Rewrites each log with its writer paused, so no reading is lost to the swap
+        compactor = LogCompactor(fleet, log_writers, clock)
+        compactor.start()
+
+    print(f"{clock.now()} - Starting sensors: {', '.join(configured_sensors.keys())} for {', '.join(fleet)}")
+    for plant_id in fleet:
+        print(plant_id, moisture_sensors[plant_id].moisture, temp_hum_sensors[plant_id].read())
     
     if homeassistant_integration:
-        client = mqtt.Client(clientname)
-        client.username_pw_set(hass_username, hass_password)
-        client.connect(hostname, port, timeout)
-
-        client.loop_start()
-    
-    while True:
-        moisture_ar = []
-        temperature_ar = []
-        humid_ar = []
-        sensor_interval = 50
-
-        # Loop takes around 11 seconds per set of readings
-        for _ in range(0, sensor_interval):
-            m = moisture_sensor.moisture
-            t = temp_hum_sensor.temperature()
-            h = temp_hum_sensor.humidity()
-            
-            # print(f"{m}, {t}, {h}")
-            # m = np.random.randint(2000)
-            # if 0 <= m and m < 1400:
-            #     result = "Wet"
-            # elif 1400 <= m and m < 1900:
-            #     result = "Moist"
-            # else:
-            #     result = "Dry"
-
-            moisture_ar.append(m)
-            temperature_ar.append(t)
-            humid_ar.append(h)
-
-        now = datetime.now()
-        
-        sensor_readings = []
-        sensor_readings.append(moisture_ar)
-        sensor_readings.append(temperature_ar)
-        sensor_readings.append(humid_ar)
-
-        print("\nCalculating averages:")
-        for idx in range(0, len(configured_sensors)):
-            sensor_avg = np.median(sensor_readings[idx])
-            sensor_name = list(configured_sensors.keys())[idx]
-            print(f"{sensor_name.capitalize()} average reading: {sensor_avg}")
-
-            if homeassistant_integration:
-                data = {f"{sensor_name}": str(sensor_avg)}
-                client.publish(mqtt_topic_root + sensor_name, json.dumps(data))
-                print(f"Published {data} to {mqtt_topic_root + sensor_name} on MQTT")
-                
-            with open(data_path / f"{sensor_name}_log.csv", "a", newline="") as csvfile:
-                sensor_writer = csv.writer(
-                    csvfile, delimiter=",", quotechar="|", quoting=csv.QUOTE_MINIMAL
+        mqtt_publisher = get_publisher("logger")
+
+    # One pass over the fast ADC reads every plant's moisture, each slow DHT11 is sampled on its own thread
+    channels = [
+        SensorChannel(
+            "adc",
+            lambda: {f"{plant_id}/moisture": sensor.moisture for plant_id, sensor in moisture_sensors.items()},
+            [f"{plant_id}/moisture" for plant_id in fleet],
+            moisture_sample_hz,
+            clock,
+        )
+    ]
+    for plant_id, sensor in temp_hum_sensors.items():
+        channels.append(
+            SensorChannel(
+                f"{plant_id}/dht11",
+                lambda sensor=sensor, plant_id=plant_id: {
+                    f"{plant_id}/{name}": value for name, value in sensor.read().items()
+                },
+                [f"{plant_id}/temperature", f"{plant_id}/humidity"],
+                dht_sample_hz,
+                clock,
+            )
+        )
+    scheduler = AcquisitionScheduler(channels, clock)
+
+    # Change-based logging, each channel idles at a reduced rate until one of its sensors changes sharply
+    filters = {}
+    full_rates = {channel.name: channel.rate_hz for channel in channels}
+    if adaptive_logging:
+        for plant_id in fleet:
+            for sensor_name in configured_sensors:
+                filters[f"{plant_id}/{sensor_name}"] = DeadbandFilter(
+                    log_deadband[sensor_name], burst_threshold[sensor_name]
+                )
+        for channel in channels:
+            channel.set_rate(full_rates[channel.name] / idle_rate_divisor)
+    scheduler.start()
+
+    try:
+        while not stop.is_set():
+            # Aggregate the samples taken over a fixed time window
+            sensor_readings = scheduler.collect(log_interval)
+            now = clock.now()
+            print(f"\nSample rates: {scheduler.stats_string()}")
+            for sensor, stat in scheduler.stats.items():
+                set_gauge("sample_rate_hz", stat["rate_hz"], sensor=sensor)
+
+            print("\nCalculating averages:")
+            for plant_id, plant in fleet.items():
+                plant_readings = {}
+                for sensor_name in configured_sensors:
+                    samples = sensor_readings[f"{plant_id}/{sensor_name}"]
+                    if len(samples) == 0:
+                        print(f"No {plant_id} {sensor_name} readings in the last {log_interval}s, skipping")
+                        continue
+                    sensor_avg = statistics.median(samples)
+                    print(f"{plant.name} {sensor_name} average reading: {sensor_avg}")
+                    plant_readings[sensor_name] = sensor_avg
+
+                    key = f"{plant_id}/{sensor_name}"
+                    if key in filters and not filters[key].update(sensor_avg, now):
+                        # Within the deadband of the last written row, which stands for this reading
+                        continue
+                    log_writers[plant_id].write(sensor_name, sensor_avg, now)
+                    if live_stream and plant_id == dashboard_plant:
+                        publisher.publish(sensor_name, sensor_avg, now)
+                    rollups[plant_id][sensor_name].add(sensor_avg, now)
+                    if on_write is not None:
+                        on_write(plant_id, sensor_name, sensor_avg, now)
+
+                if homeassistant_integration and plant_readings:
+                    # Queued for the publisher thread, so a slow or missing broker never holds up acquisition
+                    mqtt_publisher.publish_readings(plant, plant_readings, now)
+
+            # Each window's readings reach the logs before the next window, so watching dashboards stay current
+            for log_writer in log_writers.values():
+                log_writer.flush()
+
+            if adaptive_logging:
+                for channel in channels:
+                    bursting = any(filters[sensor].bursting(now) for sensor in channel.sensors)
+                    rate = full_rates[channel.name]
+                    channel.set_rate(rate if bursting else rate / idle_rate_divisor)
+                print(
+                    "Compression: "
+                    + ", ".join(f"{key}: {f.compression_ratio():.1f}x" for key, f in filters.items())
                 )
-                sensor_writer.writerow(
-                    [sensor_avg, now.strftime("%Y-%m-%d %H:%M:%S")])
+    finally:
+        # Keep buffered readings on shutdown
+        scheduler.stop()
+        if compaction_enabled:
+            compactor.close()
+        for log_writer in log_writers.values():
+            log_writer.close()
+        if live_stream:
+            publisher.close()
+        if homeassistant_integration:
+            mqtt_publisher.close()
+
+
+def main() -> None:
+    fleet = load_plants()
+    sensors = {plant_id: create_sensors(plant) for plant_id, plant in fleet.items()}
+    run_logger(fleet, sensors)
 
 
 if __name__ == "__main__":
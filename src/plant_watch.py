@@ -1,18 +1,11 @@
-import time
 from datetime import datetime
 
-from config import configured_sensors, dashboard_update, prediction_update, homeassistant_integration
-from sensor_calculations import (
-    determine_last_watered,
-    determine_next_water,
-    poll_sensors,
-)
-from streamlit_components import streamlit_init_layout
+import streamlit as st
 
-if homeassistant_integration:
-    import json
-    import paho.mqtt.client as mqtt
-    from config import clientname, hostname, port, timeout, hass_username, hass_password, mqtt_topic_root
+from config import configured_sensors, watch_max_staleness
+from data_service import DataService
+from sensor_calculations import poll_sensors
+from streamlit_components import streamlit_init_layout
 
 
 def create_hero_string(available_sensors: list, new_vals: list, sensor_time: datetime) -> str:
@@ -23,62 +16,50 @@ def create_hero_string(available_sensors: list, new_vals: list, sensor_time: dat
             "".join(
                 [
                     f"<h6>{sensor_list[idx].capitalize()}:</h6>",
-                    f"{new_vals[idx]:.2f}",
+                    "-" if new_vals[idx] is None else f"{new_vals[idx]:.2f}",
                     "<h6></h6>",
                 ]
             )
         )
-    str_ar.append(f"<p>{str(sensor_time).split('T')[-1][:8]}</p>")
+    if sensor_time is not None:
+        str_ar.append(f"<p>{str(sensor_time).split('T')[-1][:8]}</p>")
     return "".join(str_ar)
 
 
-def create_info_string(last_watered: datetime, next_water: datetime) -> str:
+def create_info_string(last_watered: datetime, next_water: datetime, computed_at: datetime, metrics: dict) -> str:
     s1 = f"<h6 style='margin-left: 1em'>Last watered: {last_watered}</h6>"
     s2 = f"<h6 style='margin-left: 1em'>Water next: {next_water}</h6>"
-    return "".join([s1, s2])
+    s3 = (
+        f"<p style='margin-left: 1.5em'>Predicted at {computed_at.strftime('%H:%M:%S')} "
+        f"(took {metrics['last_latency_s']:.1f}s, {metrics['queue_depth']} queued, "
+        f"{metrics['sessions_attached']} sessions attached)</p>"
+    )
+    return "".join([s1, s2, s3])
 
 
-def monitor_plants(curr_time: datetime) -> None:
-    if homeassistant_integration:
-        client = mqtt.Client(clientname)
-        client.username_pw_set(hass_username, hass_password)
-        client.connect(hostname, port, timeout)
+@st.experimental_singleton
+def get_data_service() -> DataService:
+    """Return the data service shared by every session in this server process, starting it on first use."""
+    return DataService(configured_sensors.keys())
 
-        client.loop_start()
 
+def monitor_plants(curr_time: datetime) -> None:
     print(f"\nCurrent Time is {curr_time}")
     # Define the sensors and current time
     available_sensors = configured_sensors.keys()
-    # Initialise from saved data
-    sensor_dict, hero, info = streamlit_init_layout(available_sensors, curr_time)
-    # Initialise variables
-    last_watered = None
-
-    # Recieve new data
-    while True:
-        # Run predictions
-        last_watered = determine_last_watered(last_watered)
-        next_water, last_watered = determine_next_water(last_watered)
-
-        if homeassistant_integration:
-            data = {f"water_next": str(next_water)}
-            client.publish(mqtt_topic_root + "water_next", json.dumps(data))
-            print(f"Published {data} to {mqtt_topic_root + 'water_next'} on MQTT")
-    
-            data = {f"water_last": str(last_watered)}
-            client.publish(mqtt_topic_root + "water_last", json.dumps(data))
-            print(f"Published {data} to {mqtt_topic_root + 'water_last'} on MQTT")
-
-        # Add information readouts
-        info_string = create_info_string(last_watered, next_water)
-        info.markdown(info_string, unsafe_allow_html=True)
-
-        # Update sensors
-        for _ in range(0, prediction_update):
-            # time_now = datetime.now()
-            updated_sensor_dict, new_vals, sensor_time = poll_sensors(
-                sensor_dict, available_sensors
-            )
+    service = get_data_service()
+    service.attach()
+    try:
+        # Initialise from the readings held by the service
+        history, cursors = service.history()
+        sensor_dict, hero, info = streamlit_init_layout(available_sensors, curr_time, history)
+        version = service.version
+        rendered = None
+
+        # Recieve new data
+        while True:
+            updates, cursors = service.updates(cursors)
+            updated_sensor_dict, new_vals, sensor_time = poll_sensors(sensor_dict, available_sensors, updates)
             # Update the 'hero' sensor readouts
             hero_string = create_hero_string(available_sensors, new_vals, sensor_time)
             hero.markdown(
@@ -86,7 +67,21 @@ def monitor_plants(curr_time: datetime) -> None:
                 unsafe_allow_html=True,
             )
 
-            time.sleep(dashboard_update)
+            # Render the latest finished prediction
+            prediction_version, result = service.predictions.latest()
+            metrics = service.metrics()
+            if result is not None and rendered != (prediction_version, metrics["sessions_attached"]):
+                rendered = (prediction_version, metrics["sessions_attached"])
+                # Add information readouts
+                info_string = create_info_string(
+                    result["last_watered"], result["next_water"], result["computed_at"], metrics
+                )
+                info.markdown(info_string, unsafe_allow_html=True)
+
+            version = service.wait_for_update(version, watch_max_staleness)
+    finally:
+        # Streamlit stops a closed or rerun session by raising inside the next st call
+        service.detach()
 
 
 def main() -> None:
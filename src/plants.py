@@ -0,0 +1,59 @@
+from typing import Dict
+
+import config
+from config import data_path, dashboard_plant, plants, state_path
+from storage import get_storage_backend
+
+
+class Plant:
+    """
+    A monitored plant and its sensor settings.
+
+    Args:
+        plant_id (str): The registry key of the plant, also the default storage namespace.
+        settings (dict): The registry entry, any setting left out falls back to the single-plant value in the config.
+    """
+
+    defaults = [
+        "moisture_pin",
+        "temp_humid_pin",
+        "sensor_dry",
+        "sensor_wet",
+        "target_water_moisture",
+        "water_threshold_pct",
+        "watering_jump_pct",
+    ]
+
+    def __init__(self, plant_id: str, settings: dict) -> None:
+        self.plant_id = plant_id
+        self.name = settings.get("name", plant_id.capitalize())
+        self.image = settings.get("image", "snake.png")
+        for key in self.defaults:
+            setattr(self, key, settings.get(key, getattr(config, key)))
+        self.mqtt_topic_root = settings.get("mqtt_topic_root", f"home/plants/{plant_id}/")
+        self.data_path = data_path / settings.get("data_dir", plant_id)
+        self.rollup_path = self.data_path / "rollups"
+        self.state_path = state_path / plant_id
+
+    def __repr__(self) -> str:
+        return f"Plant({self.plant_id!r})"
+
+    def storage(self):
+        """Return the storage backend holding this plant's sensor logs."""
+        self.data_path.mkdir(parents=True, exist_ok=True)
+        return get_storage_backend(root=self.data_path)
+
+
+def load_plants() -> Dict[str, Plant]:
+    """
+    Build the plant registry from the config.
+
+    Returns:
+        Dict[str, Plant]: Every configured plant by id, in config order.
+    """
+    return {plant_id: Plant(plant_id, settings) for plant_id, settings in plants.items()}
+
+
+def get_plant(plant_id: str = dashboard_plant) -> Plant:
+    """Return a plant from the registry, by default the one shown on the dashboard."""
+    return Plant(plant_id, plants[plant_id])
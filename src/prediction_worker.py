@@ -0,0 +1,127 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+from instrumentation import count, set_gauge
+from sensor_calculations import determine_last_watered, determine_next_water, get_forecaster
+
+
+class PredictionService:
+    """
+    Runs watering predictions on a background worker thread.
+
+    Requests made while a prediction is running are coalesced into a single follow-up job, so the caller never waits
+    on a fit and the queue never holds more than one pending job. The dashboard renders `latest()` whenever it changes.
+    A thread rather than a process is used because the watering detector and forecaster keep their state in memory.
+    """
+
+    def __init__(self) -> None:
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="prediction")
+        self._lock = threading.Lock()
+        self._in_flight = False
+        self._pending = False
+        self._last_watered = None
+        self._result = None
+        self._model_state = None
+        self._version = 0
+        self.jobs_completed = 0
+        self.jobs_coalesced = 0
+        self.last_latency = None
+
+    def submit(self) -> None:
+        """Request a prediction, coalescing with any request that has not started yet."""
+        with self._lock:
+            if self._in_flight:
+                if self._pending:
+                    self.jobs_coalesced += 1
+                    count("predictions_coalesced")
+                self._pending = True
+                return
+            self._in_flight = True
+        self._executor.submit(self._run)
+
+    def _run(self) -> None:
+        while True:
+            start = time.perf_counter()
+            try:
+                last_watered = determine_last_watered(self._last_watered)
+                next_water, last_watered = determine_next_water(last_watered)
+                result = {
+                    "last_watered": last_watered,
+                    "next_water": next_water,
+                    "computed_at": datetime.now(),
+                }
+            except Exception as e:
+                print(f"Prediction failed: {e}")
+                result = None
+            # Copied between jobs so a snapshot never sees a model halfway through an update
+            model_state = get_forecaster().get_state()
+            latency = time.perf_counter() - start
+
+            set_gauge("prediction_latency_seconds", latency)
+            count("predictions", outcome="failed" if result is None else "completed")
+            with self._lock:
+                self.last_latency = latency
+                self.jobs_completed += 1
+                self._model_state = model_state
+                if result is not None:
+                    self._last_watered = result["last_watered"]
+                    self._result = result
+                    self._version += 1
+                if not self._pending:
+                    self._in_flight = False
+                    return
+                self._pending = False
+
+    def latest(self) -> tuple:
+        """
+        Return the most recent finished prediction.
+
+        Returns:
+            tuple: A version number that increases with each new result, and the result dict with `last_watered`,
+            `next_water` and `computed_at`, or None if no prediction has finished yet.
+        """
+        with self._lock:
+            return self._version, self._result
+
+    def get_state(self) -> tuple:
+        """
+        Return the latest result and fitted model for the warm-start snapshot.
+
+        Returns:
+            tuple: The result dict, or None if no prediction has finished, and the forecaster state from
+            `CycleForecaster.get_state`, or None if no model is fitted.
+        """
+        with self._lock:
+            return self._result, self._model_state
+
+    def set_state(self, result: dict, model_state: tuple) -> None:
+        """
+        Restore a result and fitted model saved by `get_state`, before the first prediction.
+
+        Args:
+            result (dict): The result to show until the next prediction finishes, or None.
+            model_state (tuple): The forecaster metadata and arrays, or None.
+        """
+        if model_state is not None:
+            get_forecaster().set_state(*model_state)
+        with self._lock:
+            self._model_state = model_state
+            if result is not None:
+                self._last_watered = result["last_watered"]
+                self._result = result
+                self._version += 1
+
+    def metrics(self) -> dict:
+        """Return the worker latency and queue statistics."""
+        with self._lock:
+            return {
+                "last_latency_s": self.last_latency,
+                "queue_depth": int(self._in_flight) + int(self._pending),
+                "jobs_completed": self.jobs_completed,
+                "jobs_coalesced": self.jobs_coalesced,
+            }
+
+    def shutdown(self) -> None:
+        self._executor.shutdown(wait=False)
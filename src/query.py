@@ -0,0 +1,42 @@
+from datetime import datetime
+
+import pandas as pd
+
+from downsample import downsample_df
+from rollups import load_rollup, rollup_bounds, select_resolution
+from sensor_calculations import convert_cap_to_moisture, log_storage, plant
+
+
+def query_series(
+    sensor: str, start: datetime = None, end: datetime = None, max_points: int = 1000, method: str = "lttb"
+) -> pd.DataFrame:
+    """
+    Load a time range of a sensor log downsampled to a bounded number of points.
+
+    Ranges too long to chart from raw readings are served from the coarsest-needed rollup resolution, otherwise the
+    range is located through the storage backend's time index so only the rows in the range are read. Moisture
+    readings are converted to percentages.
+
+    Args:
+        sensor (str): The name of the sensor.
+        start (datetime, optional): The earliest reading to include. Defaults to the start of the log.
+        end (datetime, optional): The latest reading to include. Defaults to the end of the log.
+        max_points (int, optional): The maximum number of points to return. Defaults to 1000.
+        method (str, optional): The downsampling method, "lttb" or "minmax". Defaults to "lttb".
+
+    Returns:
+        pd.DataFrame: A DataFrame with the sensor and timestamp columns.
+    """
+    bounds = rollup_bounds(sensor, root=plant.rollup_path)
+    resolution = None
+    if bounds is not None:
+        span_start = bounds[0] if start is None else start
+        span_end = datetime.now() if end is None else end
+        resolution = select_resolution(span_start, span_end, max_points)
+    if resolution is not None:
+        df = load_rollup(sensor, resolution, start, end, root=plant.rollup_path)[[sensor, "timestamp"]]
+    else:
+        df = log_storage.load(sensor, start, end)
+    if sensor == "moisture":
+        df[sensor] = convert_cap_to_moisture(df[sensor], plant.sensor_dry, plant.sensor_wet)
+    return downsample_df(df, sensor, max_points, method)
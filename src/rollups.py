@@ -0,0 +1,254 @@
+"""
+Pre-aggregated rollups of the sensor logs at minute, hour and day resolution.
+
+The logger keeps one open bucket per resolution and appends it to `{sensor}_{resolution}.rollup` once a reading falls
+into the next bucket. Each rollup record holds the count, sum, min, max and last value of its bucket, so long-range
+charts and averages read a few records per day instead of every raw reading.
+
+Rebuild the rollups from the raw logs with:
+```
+python rollups.py --sensors moisture temperature humidity --plants malfoy
+```
+"""
+
+import argparse
+import os
+from datetime import datetime
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from config import configured_sensors, log_interval, rollup_path, rollup_resolutions
+from plants import load_plants
+
+ROLLUP_DTYPE = np.dtype(
+    [("bucket", "<i8"), ("count", "<i4"), ("sum", "<f8"), ("min", "<f4"), ("max", "<f4"), ("last", "<f4")]
+)
+
+
+def rollup_file(sensor: str, resolution: str, root: Path = rollup_path) -> Path:
+    return Path(root) / f"{sensor}_{resolution}.rollup"
+
+
+def _read_records(file_path: Path) -> np.ndarray:
+    """Memory-map the complete records of a rollup file."""
+    n_records = file_path.stat().st_size // ROLLUP_DTYPE.itemsize if file_path.exists() else 0
+    if n_records == 0:
+        return np.empty(0, dtype=ROLLUP_DTYPE)
+    return np.memmap(file_path, dtype=ROLLUP_DTYPE, mode="r", shape=(n_records,))
+
+
+class RollupWriter:
+    """
+    Incrementally maintains the rollups of one sensor as readings are logged.
+
+    On creation the open buckets are rebuilt from the raw readings logged after the last closed bucket of each
+    resolution, so restarting the logger neither loses nor double counts readings.
+
+    Args:
+        sensor (str): The name of the sensor.
+        backend: The storage backend holding the raw sensor log.
+        root (Path, optional): The directory holding the rollups. Defaults to `rollup_path`.
+    """
+
+    def __init__(self, sensor: str, backend, root: Path = rollup_path) -> None:
+        self.sensor = sensor
+        self.root = Path(root)
+        self.root.mkdir(parents=True, exist_ok=True)
+        self._open = {resolution: None for resolution in rollup_resolutions}
+        self._catch_up(backend)
+
+    def _catch_up(self, backend) -> None:
+        closed_until = {}
+        for resolution, seconds in rollup_resolutions.items():
+            records = _read_records(rollup_file(self.sensor, resolution, self.root))
+            closed_until[resolution] = records["bucket"][-1] + seconds * 10**9 if len(records) else None
+        if not backend.log_path(self.sensor).exists():
+            return
+        known = [until for until in closed_until.values() if until is not None]
+        start = pd.Timestamp(min(known)) if len(known) == len(closed_until) else None
+        df = backend.load(self.sensor, start=start)
+        times = df["timestamp"].values.astype("datetime64[ns]").astype(np.int64)
+        for resolution in rollup_resolutions:
+            keep = slice(None) if closed_until[resolution] is None else times >= closed_until[resolution]
+            for value, ts in zip(df[self.sensor].values[keep], times[keep]):
+                self._add(resolution, float(value), int(ts))
+
+    def _add(self, resolution: str, value: float, ts: int) -> None:
+        width = rollup_resolutions[resolution] * 10**9
+        bucket = ts - ts % width
+        current = self._open[resolution]
+        if current is not None and bucket != current["bucket"]:
+            with open(rollup_file(self.sensor, resolution, self.root), "ab") as f:
+                f.write(current.tobytes())
+            current = None
+        if current is None:
+            current = np.zeros(1, dtype=ROLLUP_DTYPE)[0]
+            current["bucket"] = bucket
+            current["min"] = value
+            current["max"] = value
+            self._open[resolution] = current
+        current["count"] += 1
+        current["sum"] += value
+        current["min"] = min(current["min"], value)
+        current["max"] = max(current["max"], value)
+        current["last"] = value
+
+    def add(self, value: float, timestamp: datetime) -> None:
+        """
+        Fold a logged reading into every resolution.
+
+        Args:
+            value (float): The value of the reading.
+            timestamp (datetime): The time of the reading.
+        """
+        ts = pd.Timestamp(timestamp).value
+        for resolution in rollup_resolutions:
+            self._add(resolution, value, ts)
+
+
+def rebuild_rollups(sensor: str, backend, root: Path = rollup_path) -> None:
+    """
+    Rebuild every resolution of a sensor's rollups from its raw log.
+
+    Args:
+        sensor (str): The name of the sensor.
+        backend: The storage backend holding the raw sensor log.
+        root (Path, optional): The directory holding the rollups. Defaults to `rollup_path`.
+    """
+    Path(root).mkdir(parents=True, exist_ok=True)
+    df = backend.load(sensor).sort_values("timestamp", kind="stable")
+    times = df["timestamp"].values.astype("datetime64[ns]").astype(np.int64)
+    # Raw readings before this were deleted by the retention policy, only their rollups are left
+    retained_from = backend.manifest.retained_from(backend.log_path(sensor))
+    for resolution, seconds in rollup_resolutions.items():
+        width = seconds * 10**9
+        grouped = df.groupby(times - times % width)[sensor]
+        summary = grouped.agg(["count", "sum", "min", "max", "last"])
+        # The newest bucket may still be open, the logger rebuilds it from the raw log on start
+        summary = summary.iloc[:-1]
+        records = np.empty(len(summary), dtype=ROLLUP_DTYPE)
+        records["bucket"] = summary.index.values
+        for column in ["count", "sum", "min", "max", "last"]:
+            records[column] = summary[column].values
+        file_path = rollup_file(sensor, resolution, root)
+        if retained_from is not None:
+            kept = _read_records(file_path)
+            kept = np.array(kept[kept["bucket"] < retained_from])
+            records = np.concatenate([kept, records[records["bucket"] >= retained_from]])
+        tmp_file = file_path.with_suffix(".tmp")
+        with open(tmp_file, "wb") as f:
+            f.write(records.tobytes())
+        os.replace(tmp_file, file_path)
+        print(f"Rebuilt {len(records)} {resolution} rollups for {sensor}")
+
+
+def load_rollup(
+    sensor: str, resolution: str, start: datetime = None, end: datetime = None, root: Path = rollup_path
+) -> pd.DataFrame:
+    """
+    Load the closed rollup buckets of a sensor in a time range.
+
+    Args:
+        sensor (str): The name of the sensor.
+        resolution (str): One of the configured `rollup_resolutions`.
+        start (datetime, optional): The earliest bucket to include. Defaults to the first bucket.
+        end (datetime, optional): The latest bucket to include. Defaults to the last bucket.
+        root (Path, optional): The directory holding the rollups. Defaults to `rollup_path`.
+
+    Returns:
+        pd.DataFrame: A DataFrame with the bucket start as `timestamp`, the bucket mean as the sensor column and the
+        `count`, `sum`, `min`, `max` and `last` aggregates.
+    """
+    records = _read_records(rollup_file(sensor, resolution, root))
+    buckets = records["bucket"]
+    lo = 0 if start is None else np.searchsorted(buckets, pd.Timestamp(start).value, side="left")
+    hi = len(records) if end is None else np.searchsorted(buckets, pd.Timestamp(end).value, side="right")
+    records = np.array(records[lo:hi])
+    df = pd.DataFrame(
+        {
+            "timestamp": pd.to_datetime(records["bucket"]),
+            sensor: records["sum"] / np.maximum(records["count"], 1),
+        }
+    )
+    for column in ["count", "sum", "min", "max", "last"]:
+        df[column] = records[column]
+    return df
+
+
+def rollup_bounds(sensor: str, root: Path = rollup_path) -> tuple:
+    """Return the first and last day bucket of a sensor's rollups, or None if there are none."""
+    records = _read_records(rollup_file(sensor, "day", root))
+    if len(records) == 0:
+        return None
+    return pd.Timestamp(records["bucket"][0]), pd.Timestamp(records["bucket"][-1])
+
+
+def select_resolution(start: datetime, end: datetime, max_points: int) -> str:
+    """
+    Pick the finest data that covers a time range in at most `max_points` points.
+
+    Args:
+        start (datetime): The start of the range.
+        end (datetime): The end of the range.
+        max_points (int): The maximum number of points wanted.
+
+    Returns:
+        str: The rollup resolution to use, or None if raw readings fit.
+    """
+    span = (pd.Timestamp(end) - pd.Timestamp(start)).total_seconds()
+    if span / log_interval <= max_points:
+        return None
+    for resolution, seconds in sorted(rollup_resolutions.items(), key=lambda item: item[1]):
+        if span / seconds <= max_points:
+            return resolution
+    return max(rollup_resolutions, key=rollup_resolutions.get)
+
+
+# Running totals of the closed rollups by file, so the all-time mean only reads the records closed since the last call
+_mean_totals = {}
+
+
+def rollup_mean(sensor: str, resolution: str = "day", root: Path = rollup_path) -> float:
+    """
+    Return the mean of every reading covered by a sensor's closed rollups, or None if there are none.
+
+    The count and sum are cached and extended with the buckets closed since the previous call, a rollup file that was
+    rebuilt is summed again.
+    """
+    file_path = rollup_file(sensor, resolution, root)
+    try:
+        stat = file_path.stat()
+    except FileNotFoundError:
+        _mean_totals.pop(str(file_path), None)
+        return None
+    n_records = stat.st_size // ROLLUP_DTYPE.itemsize
+    totals = _mean_totals.get(str(file_path))
+    if totals is None or totals["inode"] != stat.st_ino or totals["records"] > n_records:
+        totals = {"inode": stat.st_ino, "records": 0, "count": 0, "sum": 0.0}
+    if n_records > totals["records"]:
+        closed = _read_records(file_path)[totals["records"] : n_records]
+        totals.update(
+            records=n_records,
+            count=totals["count"] + int(closed["count"].sum()),
+            sum=totals["sum"] + float(closed["sum"].sum()),
+        )
+    _mean_totals[str(file_path)] = totals
+    return totals["sum"] / totals["count"] if totals["count"] else None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Rebuild the sensor rollups from the raw logs")
+    parser.add_argument("--sensors", nargs="+", default=list(configured_sensors))
+    parser.add_argument("--plants", nargs="+", help="Plant ids to rebuild, defaults to every configured plant")
+    args = parser.parse_args()
+    for plant_id, plant in load_plants().items():
+        if args.plants and plant_id not in args.plants:
+            continue
+        for sensor in args.sensors:
+            rebuild_rollups(sensor, plant.storage(), plant.rollup_path)
+
+
+if __name__ == "__main__":
+    main()
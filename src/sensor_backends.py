@@ -0,0 +1,218 @@
+"""
+Sensor backends read by the logger.
+
+Every backend provides a moisture sensor with a `moisture` property returning the ADC voltage in mV, and a
+temperature and humidity sensor whose `read()` returns a dict of both, with None for a failed read. `grove` reads the
+sensors attached to the Pi, `simulator` models them in software and `replay` plays back recorded logs, so the logger
+can run and be load-tested on any machine. Pick one with `sensor_backend` in the config.
+
+Requires install for the grove backend:
+```
+git clone https://github.com/adafruit/Adafruit_Python_DHT.git
+cd  Adafruit_Python_DHT`
+sudo python3 setup.py install
+```
+"""
+
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+from clock import Clock
+from config import replay_path, sensor_backend
+from storage import get_storage_backend
+
+try:
+    import Adafruit_DHT
+    from grove.adc import ADC
+except ImportError:
+    Adafruit_DHT = None
+    ADC = None
+
+
+class GroveMoistureSensor:
+    """
+    Grove Moisture Sensor class
+    Args:
+        pin(int): number of analog pin/channel the sensor connected.
+    """
+
+    def __init__(self, channel) -> None:
+        if ADC is None:
+            raise ImportError("The grove sensor backend needs grove.py installed, use the simulator off the Pi")
+        self.channel = channel
+        self.adc = ADC()
+
+    @property
+    def moisture(self) -> float:
+        """
+        Get the moisture strength value/voltage
+        Returns:
+            (int): voltage, in mV
+        """
+        value = self.adc.read_voltage(self.channel)
+        return value
+
+
+class GroveHumidityTemperatureSensor:
+    """
+    Grove Humidity and Temperature (DHT11) Sensor class
+    Args:
+        pin(int): number of analog pin/channel the sensor connected.
+    """
+    def __init__(self, channel) -> None:
+        if Adafruit_DHT is None:
+            raise ImportError("The grove sensor backend needs Adafruit_DHT installed, use the simulator off the Pi")
+        self.channel = channel
+        self.dht = Adafruit_DHT
+        self.sensor = Adafruit_DHT.DHT11
+
+    def read(self) -> dict:
+        """
+        Take a single DHT11 reading of both humidity and temperature.
+
+        Returns:
+            dict: The humidity and temperature, either is None if the read failed.
+        """
+        humidity, temperature = self.dht.read(self.sensor, self.channel)
+        return {"humidity": humidity, "temperature": temperature}
+
+
+class SimulatedMoistureSensor:
+    """
+    Capacitive moisture sensor in a pot that dries out and is watered once it gets dry.
+
+    The moisture decays exponentially towards `floor_pct` with time constant `drying_days`. When it falls below the
+    plant's `water_threshold_pct` the plant is watered back up to 88-96%. Readings carry Gaussian ADC noise.
+
+    Args:
+        plant: The plant whose calibration and watering threshold are simulated.
+        clock (Clock): The clock the drying follows.
+        drying_days (float, optional): The drying time constant in days. Defaults to 4.
+        floor_pct (float, optional): The moisture the pot dries out towards. Defaults to 5.
+        noise_mv (float, optional): The standard deviation of the ADC noise in mV. Defaults to 4.
+        seed (int, optional): The random seed. Defaults to None.
+    """
+
+    def __init__(
+        self,
+        plant,
+        clock: Clock,
+        drying_days: float = 4,
+        floor_pct: float = 5,
+        noise_mv: float = 4,
+        seed: int = None,
+    ) -> None:
+        self.plant = plant
+        self.clock = clock
+        self.drying_days = drying_days
+        self.floor_pct = floor_pct
+        self.noise_mv = noise_mv
+        self._rng = np.random.default_rng(seed)
+        self._watered_at = clock.now()
+        self._watered_pct = self._rng.uniform(88, 96)
+
+    def moisture_pct(self) -> float:
+        """Return the simulated moisture percentage now, watering the plant if it has dried out."""
+        now = self.clock.now()
+        days = (now - self._watered_at).total_seconds() / 86400
+        pct = self.floor_pct + (self._watered_pct - self.floor_pct) * np.exp(-days / self.drying_days)
+        if pct < self.plant.water_threshold_pct:
+            self._watered_at = now
+            self._watered_pct = pct = self._rng.uniform(88, 96)
+        return pct
+
+    @property
+    def moisture(self) -> float:
+        dry, wet = self.plant.sensor_dry, self.plant.sensor_wet
+        return dry + self.moisture_pct() / 100 * (wet - dry) + self._rng.normal(0, self.noise_mv)
+
+
+class SimulatedDHT11:
+    """
+    DHT11 temperature and humidity sensor with read latency and failed reads.
+
+    Temperature and humidity follow a daily cycle and are rounded to whole numbers like the DHT11's.
+
+    Args:
+        clock (Clock): The clock the daily cycle and read latency follow.
+        latency (float, optional): Seconds each read takes. Defaults to 0.25.
+        failure_rate (float, optional): The fraction of reads that fail and return None. Defaults to 0.2.
+        seed (int, optional): The random seed. Defaults to None.
+    """
+
+    def __init__(self, clock: Clock, latency: float = 0.25, failure_rate: float = 0.2, seed: int = None) -> None:
+        self.clock = clock
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self._rng = np.random.default_rng(seed)
+
+    def read(self) -> dict:
+        self.clock.sleep(self.latency)
+        if self._rng.random() < self.failure_rate:
+            return {"humidity": None, "temperature": None}
+        now = self.clock.now()
+        daily = np.sin(2 * np.pi * (now.hour + now.minute / 60 - 9) / 24)
+        temperature = round(21 + 3 * daily + self._rng.normal(0, 0.5))
+        humidity = round(55 - 6 * daily + self._rng.normal(0, 2))
+        return {"humidity": humidity, "temperature": temperature}
+
+
+class ReplaySensor:
+    """
+    Plays back recorded sensor logs, shifted so the first reading lands when the clock starts.
+
+    Each read returns the last recorded value at or before the current time of the clock, and the recording loops once
+    it runs out.
+
+    Args:
+        storage: The storage backend holding the recorded logs.
+        clock (Clock): The clock the recording is played back on.
+    """
+
+    def __init__(self, storage, clock: Clock) -> None:
+        self.clock = clock
+        self._start = pd.Timestamp(clock.now())
+        self._series = {}
+        for sensor in ["moisture", "temperature", "humidity"]:
+            df = storage.load(sensor)
+            times = df["timestamp"].values.astype("datetime64[ns]").astype(np.int64)
+            self._series[sensor] = (times - times[0], df[sensor].values.astype(float))
+
+    def _value(self, sensor: str) -> float:
+        offsets, values = self._series[sensor]
+        elapsed = pd.Timestamp(self.clock.now()).value - self._start.value
+        if offsets[-1] > 0:
+            elapsed %= offsets[-1]
+        return values[max(np.searchsorted(offsets, elapsed, side="right") - 1, 0)]
+
+    @property
+    def moisture(self) -> float:
+        return self._value("moisture")
+
+    def read(self) -> dict:
+        return {"humidity": self._value("humidity"), "temperature": self._value("temperature")}
+
+
+def create_sensors(plant, backend: str = sensor_backend, clock: Clock = None) -> Tuple[object, object]:
+    """
+    Create the sensors of a plant.
+
+    Args:
+        plant: The plant whose pins and calibration are used.
+        backend (str, optional): "grove", "simulator" or "replay". Defaults to `sensor_backend`.
+        clock (Clock, optional): The clock simulated and replayed sensors follow. Defaults to real time.
+
+    Returns:
+        Tuple[object, object]: The moisture sensor and the temperature and humidity sensor.
+    """
+    clock = Clock() if clock is None else clock
+    if backend == "grove":
+        return GroveMoistureSensor(plant.moisture_pin), GroveHumidityTemperatureSensor(plant.temp_humid_pin)
+    if backend == "simulator":
+        return SimulatedMoistureSensor(plant, clock), SimulatedDHT11(clock)
+    if backend == "replay":
+        replay = ReplaySensor(get_storage_backend(root=replay_path), clock)
+        return replay, replay
+    raise ValueError(f"Unknown sensor backend {backend!r}, expected grove, simulator or replay")
@@ -1,29 +1,32 @@
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Tuple
+from typing import Dict, Tuple
 
-import numpy as np
 import pandas as pd
-import plotly.express as px
-from scipy.interpolate.interpolate import interp1d
-from statsmodels.tsa.ar_model import AutoReg
 
-from config import (
-    configured_sensors,
-    data_path,
-    sensor_dry,
-    sensor_wet,
-    target_water_moisture,
-)
+from adaptive_logging import step_series
+from config import adaptive_logging, live_stream
+from forecaster import CycleForecaster
+from instrumentation import timed
+from live_stream import StreamSubscriber
+from log_reader import get_log_reader
+from plants import get_plant
+from rollups import load_rollup, rollup_mean
+from storage import get_storage_backend
+from watering import WateringDetector
+from window_stats import SensorStats
 
+# The plant shown on the dashboard and the storage backend holding its sensor logs
+plant = get_plant()
+log_storage = plant.storage()
 
-def update_data(sensor_str: str, sensor_val: float, current_time: datetime, sensor_dict: dict) -> pd.DataFrame:
+
+def update_data(sensor_str: str, readings: pd.DataFrame, sensor_dict: dict) -> pd.DataFrame:
     """Add new data from sensor to the streamlit charts.
 
     Args:
         sensor_str (str): The name of the sensor.
-        sensor_val (float): The value of the sensor reading.
-        current_time (datetime): The current time.
+        readings (pd.DataFrame): The new readings with the sensor and timestamp columns, oldest first.
         sensor_dict (dict): A dictionary of sensor data.
 
     Returns:
@@ -31,16 +34,13 @@ def update_data(sensor_str: str, sensor_val: float, current_time: datetime, sens
     """
     add_df = pd.DataFrame.from_dict(
         {
-            sensor_str: [sensor_val],
-            "timestamp": pd.to_datetime(current_time).strftime(
-                "%Y-%m-%dT%H:%M:%S"
-            ),
+            sensor_str: readings[sensor_str].values,
+            # Charts show whole seconds
+            "timestamp": pd.to_datetime(readings["timestamp"]).dt.floor("s").values,
         }
     )
-    print(current_time)
     # Explicitly casting data column to float breaks chart updating
     # add_df[sensor_str] = add_df[sensor_str].astype(float)
-    add_df["timestamp"] = pd.to_datetime(add_df["timestamp"])
 
     # In-place update the sensor's altair dataframe and chart
     sensor_dict[sensor_str][0].add_rows(add_df)  # Index 0 - Streamlit df
@@ -48,92 +48,127 @@ def update_data(sensor_str: str, sensor_val: float, current_time: datetime, sens
     return add_df
 
 
-def add_scatter(sensor_dict: dict, sensor: str, added_rows: pd.DataFrame, fig: px.line) -> px.line:
-    """Add a scatter plot to the plotly graph objects.
+@timed("load_latest_data")
+def load_latest_data(
+    file_path: Path, start: datetime = None, end: datetime = None, resolution: str = None
+) -> pd.DataFrame:
+    """Load data from the file used to store historical readings.
 
     Args:
-        sensor_dict (dict): A dictionary of sensor data.
-        sensor (str): The name of the sensor.
-        added_rows (pd.DataFrame): A DataFrame containing the new data.
-        fig (px.line): A plotly graph object.
+        file_path (Path): The path to the file.
+        start (datetime, optional): The earliest reading to load. Defaults to the start of the file.
+        end (datetime, optional): The latest reading to load. Defaults to the end of the file.
+        resolution (str, optional): Load bucket means from this rollup resolution instead of raw readings.
 
     Returns:
-        px.line: The updated plotly graph object.
+        pd.DataFrame: A DataFrame containing the data.
     """
-    # TODO: Should probably be a call to a classes df object
-    latest_df = sensor_dict[sensor][2].append(added_rows, ignore_index=True)
-    # Add a scatter to the plotly graph objects
-    fig.add_scatter(
-        x=latest_df["timestamp"],
-        y=latest_df[sensor],
-        name=sensor,
-        marker={"color": configured_sensors[sensor]},
-    )
-    return fig
+    if resolution is not None:
+        sensor = file_path.stem.replace("_log", "")
+        return load_rollup(sensor, resolution, start, end, root=file_path.parent / "rollups")
+    return get_log_backend(file_path).load(file_path.stem.replace("_log", ""), start, end)
 
 
-def load_latest_data(file_path: Path) -> pd.DataFrame:
-    """Load data from the file used to store historical readings.
+# Storage backends by format and log directory, kept so the CSV time index is extended rather than rebuilt per load
+_log_backends = {}
+
+
+def get_log_backend(file_path: Path):
+    """
+    Return the shared storage backend of a sensor log, the dashboard plant's own for its logs.
 
     Args:
-        file_path (Path): The path to the file.
+        file_path (Path): The path to the log.
 
     Returns:
-        pd.DataFrame: A DataFrame containing the data.
+        CsvLogBackend | BinaryLogBackend: The storage backend of the log's directory.
     """
-    df = pd.read_csv(file_path).drop_duplicates().reset_index(drop=True)
+    file_path = Path(file_path)
+    if file_path.suffix == log_storage.suffix and file_path.parent.resolve() == log_storage.root.resolve():
+        return log_storage
+    name = "binary" if file_path.suffix == ".bin" else "csv"
+    key = (name, str(file_path.parent.resolve()))
+    if key not in _log_backends:
+        _log_backends[key] = get_storage_backend(name, file_path.parent)
+    return _log_backends[key]
 
-    # Explicitly casting data column to float breaks chart updating
-    # df[df.columns[0]] = df[df.columns[0]].astype(float)
-
-    # Cast datetime to Timestamp format
-    df["timestamp"] = pd.to_datetime(df["timestamp"])
-    return df
 
+@timed("load_latest_reading")
+def load_latest_reading(sensor: str) -> pd.DataFrame:
+    """Load the readings appended to the sensor log since the last call.
 
-def load_latest_reading(sensor: str) -> float:
-    """Load the latest reading from the sensor.
+    The data service seeds the reader at the end of the history it loaded, so the first call returns exactly the
+    rows logged since. Without that, the first call seeks back from the end of the file and returns only the last
+    reading, so the cost of a call does not depend on the length of the log. With `live_stream` enabled the readings
+    pushed by the logger are returned instead of reading the log.
 
     Args:
         sensor (str): The name of the sensor.
 
     Returns:
-        float: The value of the latest reading.
+        pd.DataFrame: A DataFrame containing the new readings, empty if nothing has been logged since the last call.
     """
-    sensor_file = data_path / f"{sensor}_log.csv"
-    last_val = pd.read_csv(sensor_file).tail(1)
-    last_val["timestamp"] = pd.to_datetime(last_val["timestamp"])
-    return last_val
+    if live_stream:
+        return get_stream_subscriber().read_new(sensor)
+    reader = get_log_reader(log_storage.log_path(sensor))
+    return reader.read_new(tail=1)
 
 
-def calc_metrics(sensor_df: pd.DataFrame) -> str:
-    """Calculate the average values for the last 10, 50, and all readings.
+_stream_subscriber = {}
+
+
+def get_stream_subscriber(since: Dict[str, pd.Timestamp] = None) -> StreamSubscriber:
+    """
+    Return the shared subscriber to the logger's live stream, connecting on first use.
 
     Args:
-        sensor_df (pd.DataFrame): A DataFrame containing the sensor readings.
+        since (Dict[str, pd.Timestamp], optional): On first use, backfill the readings of each sensor logged after
+            its time.
 
     Returns:
-        str: A string containing the average values.
+        StreamSubscriber: The subscriber, which reconnects in the background if the logger restarts.
     """
-    last_10 = sensor_df.iloc[-10:].mean(numeric_only=True).values[0]
-    last_50 = sensor_df.iloc[-50:].mean(numeric_only=True).values[0]
-    all = sensor_df.mean(numeric_only=True).values[0]
-    output_df = pd.DataFrame.from_dict(
-        {"Last 10 avg.": [last_10], "Last 50 avg.": [last_50], "Charted avg.": [all]}
-    )
-    return output_df.to_string(index=False)
+    if "live" not in _stream_subscriber:
+        _stream_subscriber["live"] = StreamSubscriber(since=since)
+        _stream_subscriber["live"].start()
+    return _stream_subscriber["live"]
+
+
+@timed("calc_metrics")
+def calc_metrics(stats: SensorStats, sensor: str = None) -> str:
+    """Format the streaming window metrics of a sensor.
 
+    Args:
+        stats (SensorStats): The streaming metrics of the charted sensor readings.
+        sensor (str, optional): The name of the sensor, adds the all-time average from its day rollups.
 
-# def convert_cap_to_moisture(reading: float, dry_val: int = sensor_dry, wet_val: int = sensor_wet) -> float:
-#     return interp1d([dry_val, wet_val], [0, 100], fill_value="extrapolate")(reading)
-def convert_cap_to_moisture(reading: float, dry_val: int = sensor_dry, wet_val: int = sensor_wet) -> float:
+    Returns:
+        str: A table of the mean, min, max and median of each window and the averages.
+    """
+    lines = [f"{'':<12}{'mean':>8}{'min':>8}{'max':>8}{'median':>8}"]
+    for label, window in stats.summary().items():
+        lines.append(
+            f"{label:<12}{window['mean']:>8.2f}{window['min']:>8.2f}{window['max']:>8.2f}{window['median']:>8.2f}"
+        )
+    lines.append(f"{'EWM':<12}{stats.ewm:>8.2f}")
+    all_time = None if sensor is None else rollup_mean(sensor, root=plant.rollup_path)
+    if all_time is not None:
+        # Rollups hold raw readings, the conversion is linear so it applies to the mean
+        all_time = convert_cap_to_moisture(all_time) if sensor == "moisture" else all_time
+        lines.append(f"{'All-time':<12}{all_time:>8.2f}")
+    return "\n".join(lines)
+
+
+def convert_cap_to_moisture(
+    reading: float, dry_val: int = plant.sensor_dry, wet_val: int = plant.sensor_wet
+) -> float:
     """
     Convert a capacitance reading to a moisture percentage.
 
     Args:
         reading (float): The capacitance reading.
-        dry_val (int, optional): The capacitance value corresponding to a dry sensor. Defaults to `sensor_dry`.
-        wet_val (int, optional): The capacitance value corresponding to a wet sensor. Defaults to `sensor_wet`.
+        dry_val (int, optional): The capacitance value corresponding to a dry sensor. Defaults to the dashboard plant's.
+        wet_val (int, optional): The capacitance value corresponding to a wet sensor. Defaults to the dashboard plant's.
 
     Returns:
         float: The moisture percentage.
@@ -145,63 +180,91 @@ def convert_cap_to_moisture(reading: float, dry_val: int = sensor_dry, wet_val:
     return moisture_percentage
 
 
-def poll_sensors(sensor_dict: dict, available_sensors: dict) -> dict:
+@timed("read_sensor_updates")
+def read_sensor_updates(available_sensors: list, changed_sensors: set = None) -> dict:
     """
-    Poll the sensors and update the sensor_dict.
+    Read the readings logged since the last call, with moisture converted to a percentage.
+
+    Args:
+        available_sensors (list): The names of the sensors to read.
+        changed_sensors (set, optional): Only read the logs of these sensors. Defaults to reading every sensor.
+
+    Returns:
+        dict: The new readings of each sensor that was read.
+    """
+    updates = {}
+    for sensor in available_sensors:
+        if sensor not in ("moisture", "temperature", "humidity"):
+            print(f"{sensor} not configured with polling logic")
+            continue
+        if changed_sensors is not None and sensor not in changed_sensors:
+            continue
+        new_readings = load_latest_reading(sensor)
+        if sensor == "moisture":
+            new_readings[sensor] = convert_cap_to_moisture(new_readings[sensor])
+        updates[sensor] = new_readings
+    return updates
+
+
+@timed("poll_sensors")
+def poll_sensors(sensor_dict: dict, available_sensors: dict, updates: dict) -> dict:
+    """
+    Render new sensor readings and update the sensor_dict.
 
     Args:
         sensor_dict (dict): A dictionary of sensor data.
         available_sensors (dict): A dictionary of available sensors.
+        updates (dict): The new readings of each sensor, sensors without any keep their latest values.
 
     Returns:
-        dict: The updated sensor_dict.
+        dict: The updated sensor_dict, the value shown for each sensor, None for sensors without any readings yet, and
+        the time of the newest reading, None if there are none.
     """
     # For each of the sensors read the value
-    fig = px.line()
+    chart_rows = []
     new_vals = []
+    sensor_time = None
     for sensor in available_sensors:
+        new_readings = updates.get(sensor, [])
+        if len(new_readings) == 0:
+            # Nothing logged since the last poll, keep showing the latest charted value if there is one
+            last = sensor_dict[sensor][2].last()
+            new_vals.append(None if last is None else last[1])
+            if last is not None:
+                sensor_time = last[0]
+            continue
         print(f"Updating {sensor}")
 
-        if sensor == "moisture":
-            last_reading = load_latest_reading(sensor)
-            sensor_val = convert_cap_to_moisture(last_reading[sensor].values[0]).flatten()[0]
-        elif sensor == "temperature":
-            last_reading = load_latest_reading(sensor)
-            sensor_val = last_reading[sensor].values[0]
-        elif sensor == "humidity":
-            last_reading = load_latest_reading(sensor)
-            sensor_val = last_reading[sensor].values[0]
-        else:
-            print(f"{sensor} not configured with polling logic")
-            continue
+        # Only the newest reading is shown as the current value, every new reading is stored and charted
+        last_reading = new_readings.tail(1)
+        sensor_val = last_reading[sensor].values[0]
 
         try:
             sensor_time = last_reading["timestamp"].values[0]
         except ValueError as e:
             print(e)
             print(last_reading["timestamp"].values[0])
-            sensor_time = sensor_dict[sensor][2].iloc[-1]["timestamp"]
+            last = sensor_dict[sensor][2].last()
+            sensor_time = None if last is None else last[0]
 
         new_vals.append(sensor_val)
         # Add new readings to visualisations
-        added_rows = update_data(sensor, sensor_val, sensor_time, sensor_dict)
-        # Add new readings to dataframe
-        sensor_dict[sensor][2] = sensor_dict[sensor][2].append(
-            added_rows, ignore_index=True
-        )
-        # Limit sensor dict to ~1 week of data
-        sensor_dict[sensor][2] = sensor_dict[sensor][2].iloc[-2500:]
+        added_rows = update_data(sensor, new_readings, sensor_dict)
+        # Add new readings to the fixed-capacity store (~1 week of data)
+        sensor_dict[sensor][2].extend(added_rows)
 
-        # Plot data to scatter
-        fig = add_scatter(sensor_dict, sensor, added_rows, fig)
+        # Only the new readings are sent to the combined chart
+        chart_rows.append(added_rows.rename(columns={sensor: "value"}).assign(sensor=sensor))
 
         # Add calculated metrics from latest data
-        sensor_dict[sensor][3].text(calc_metrics(sensor_dict[sensor][2]))
+        sensor_dict[sensor][4].extend(added_rows["timestamp"].values, added_rows[sensor].values.astype(float))
+        sensor_dict[sensor][3].text(calc_metrics(sensor_dict[sensor][4], sensor))
         # Write to file
         # plot_df.to_csv(data_path / f'{sensor}.csv')
 
-    # Plot all sensors on a plotly graph
-    sensor_dict["all"].plotly_chart(fig)
+    # Extend the combined chart of all sensors
+    if chart_rows:
+        sensor_dict["all"].extend(pd.concat(chart_rows, ignore_index=True)[["timestamp", "sensor", "value"]])
 
     return sensor_dict, new_vals, sensor_time
 
@@ -223,37 +286,60 @@ def calc_chart_limits(current_day: datetime) -> list:
     )
 
 
+_watering_detector = {}
+
+
+def get_watering_detector() -> WateringDetector:
+    """
+    Return the shared watering detector for the moisture log, creating it on first use.
+
+    Returns:
+        WateringDetector: The detector, restored from its saved state when available.
+    """
+    if "moisture" not in _watering_detector:
+        _watering_detector["moisture"] = WateringDetector(
+            log_storage.log_path("moisture"),
+            plant.state_path / "watering_state.json",
+            convert_cap_to_moisture,
+            plant.watering_jump_pct,
+        )
+    return _watering_detector["moisture"]
+
+
+_forecaster = {}
+
+
+def get_forecaster() -> CycleForecaster:
+    """
+    Return the shared next-watering forecaster, creating it on first use.
+
+    Returns:
+        CycleForecaster: The forecaster cached for the current watering cycle.
+    """
+    if "moisture" not in _forecaster:
+        _forecaster["moisture"] = CycleForecaster()
+    return _forecaster["moisture"]
+
+
+@timed("calc_cycle")
 def calc_cycle(last_watered: datetime) -> Tuple[pd.DataFrame, datetime]:
     """
     Calculate the watering cycle for the given date.
 
+    The shared watering detector only consumes moisture readings logged since its last update, so repeated calls do
+    not rescan the history.
+
     Args:
-        last_watered (datetime): The last time the plant was watered.
+        last_watered (datetime): The last time the plant was watered, used if the detector has not seen a watering.
 
     Returns:
-        Tuple[pd.DataFrame, datetime]: A tuple of a DataFrame containing the watering cycle and the last watering date.
+        Tuple[pd.DataFrame, datetime]: A tuple of a DataFrame containing the watering cycle and the last watering time.
     """
-    moisture_df = load_latest_data(data_path / "moisture_log.csv")
-    moisture_df["moisture"] = convert_cap_to_moisture(
-        moisture_df["moisture"], sensor_dry, sensor_wet
-    )
-    # Only check rows after the last event
-    if last_watered is not None:
-        cycle_df = moisture_df[moisture_df["timestamp"] > last_watered].copy(deep=True)
-        return cycle_df, last_watered
-    else:
-        # Last watering event is unknown we need to check the historical record to filter
-        calc_df = moisture_df.copy(deep=True)
-        calc_df["diff"] = calc_df["moisture"] - calc_df.shift(1)["moisture"]
-        # Return last event if it has occured
-        watered_df = calc_df[calc_df["diff"] > 10]
-        # If no watering events return the full historical data
-        if len(watered_df) == 0:
-            return moisture_df, None
-        # Return the dateframe after the last identified watering
-        watered_date = watered_df["timestamp"].iloc[-1].strftime("%Y-%m-%d")
-        cycle_df = calc_df[calc_df["timestamp"] > watered_date].copy(deep=True)
-        return cycle_df, watered_date
+    detector = get_watering_detector()
+    detector.update()
+    if detector.last_watered is not None:
+        last_watered = detector.last_watered
+    return detector.cycle_df(), last_watered
 
 
 def determine_last_watered(last_watered: datetime) -> datetime:
@@ -266,16 +352,11 @@ def determine_last_watered(last_watered: datetime) -> datetime:
     Returns:
         datetime: The last time the plant was watered.
     """
-    cycle_df, last_watered = calc_cycle(last_watered)
-    # Calculate difference
-    cycle_df["diff"] = cycle_df["moisture"] - cycle_df.shift(1)["moisture"]
-    # Return last event if it has occured
-    watered_df = cycle_df[cycle_df["diff"] > 10]["timestamp"]
-    if len(watered_df) == 0:
-        return last_watered
-    return watered_df.iloc[-1].strftime("%Y-%m-%d")
+    _, last_watered = calc_cycle(last_watered)
+    return last_watered
 
 
+@timed("determine_next_water")
 def determine_next_water(last_watered: datetime) -> Tuple[str, datetime]:
     """
     Predict the next time the plant needs to be watered.
@@ -289,26 +370,22 @@ def determine_next_water(last_watered: datetime) -> Tuple[str, datetime]:
     print("\n\nPredicting next watering\n\n")
     # Filter the df from the last point it was watered
     cycle_df, last_watered = calc_cycle(last_watered)
-    cycle_df["diff"] = cycle_df["moisture"] - cycle_df.shift(1)["moisture"]
+    if adaptive_logging:
+        # Change-based logs are irregular, the forecaster expects evenly spaced readings
+        cycle_df = step_series(cycle_df, "moisture")
     X = cycle_df["moisture"].values
     # If the current reading is below the target moisture
-    if X[-1] < target_water_moisture:
+    if X[-1] < plant.target_water_moisture:
         return "Now!", last_watered
-    # Possibly implement different windows of training based on watering cycles
     try:
-        # Lag with 2 days of data
-        model = AutoReg(X, lags=500, old_names=False)
-        model_fit = model.fit()
-        # Predict 1 week in advanced and return index of values below threshold
-        water_idx = np.argmax(model_fit.forecast(steps=2000) < target_water_moisture)
-        if water_idx == 0:
+        # Refit only when a watering starts a new cycle, otherwise update with the new readings
+        forecaster = get_forecaster()
+        forecaster.update(cycle_df, last_watered)
+        water_time = forecaster.forecast_crossing(plant.target_water_moisture)
+        if water_time is None:
             return "Not in the next week", last_watered
         else:
-            # TODO: Estimate average time between readings for the last day and use that as the multiplier
-            return (
-                f"On {(datetime.now() + timedelta(minutes=5*int(water_idx))).strftime('%Y-%m-%d')}",
-                last_watered,
-            )
+            return f"On {water_time.strftime('%Y-%m-%d')}", last_watered
     except ValueError as e:
         print(e)
         return "Insufficient time since watering", last_watered
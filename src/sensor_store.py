@@ -0,0 +1,120 @@
+from datetime import datetime
+from typing import Tuple
+
+import numpy as np
+import pandas as pd
+
+
+class SensorRingBuffer:
+    """
+    Fixed-capacity store of the most recent readings for one sensor.
+
+    Timestamps are held as int64 epoch nanoseconds and values as float32. Every reading is written twice, at `i` and
+    `i + capacity`, so the most recent `n` readings are always a contiguous slice and windows can be returned as
+    views without copying.
+
+    Args:
+        sensor (str): The name of the sensor.
+        capacity (int): The maximum number of readings to keep.
+    """
+
+    def __init__(self, sensor: str, capacity: int) -> None:
+        self.sensor = sensor
+        self.capacity = capacity
+        self._times = np.zeros(2 * capacity, dtype=np.int64)
+        self._values = np.zeros(2 * capacity, dtype=np.float32)
+        self._head = 0
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def append(self, timestamp: datetime, value: float) -> None:
+        """
+        Add a reading, overwriting the oldest one once the store is full.
+
+        Args:
+            timestamp (datetime): The time of the reading.
+            value (float): The value of the reading.
+        """
+        ts = pd.Timestamp(timestamp).value
+        self._times[self._head] = ts
+        self._times[self._head + self.capacity] = ts
+        self._values[self._head] = value
+        self._values[self._head + self.capacity] = value
+        self._head = (self._head + 1) % self.capacity
+        self._size = min(self._size + 1, self.capacity)
+
+    def extend(self, df: pd.DataFrame) -> None:
+        """
+        Add the readings in a DataFrame with the sensor and timestamp columns.
+
+        Args:
+            df (pd.DataFrame): The readings to add, oldest first.
+        """
+        times = pd.to_datetime(df["timestamp"]).values.astype("datetime64[ns]").astype(np.int64)
+        values = df[self.sensor].values.astype(np.float32)
+        for ts, value in zip(times[-self.capacity:], values[-self.capacity:]):
+            self._times[self._head] = self._times[self._head + self.capacity] = ts
+            self._values[self._head] = self._values[self._head + self.capacity] = value
+            self._head = (self._head + 1) % self.capacity
+        self._size = min(self._size + len(times), self.capacity)
+
+    def _window(self, n: int = None) -> slice:
+        n = self._size if n is None else min(n, self._size)
+        end = self._head + self.capacity
+        return slice(end - n, end)
+
+    def window(self, n: int = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Return views of the most recent readings.
+
+        Args:
+            n (int, optional): The number of readings to return. Defaults to all stored readings.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Views of the datetime64 timestamps and float32 values, oldest first.
+        """
+        window = self._window(n)
+        return self._times[window].view("datetime64[ns]"), self._values[window]
+
+    def values(self, n: int = None) -> np.ndarray:
+        """Return a view of the most recent `n` values, oldest first."""
+        return self._values[self._window(n)]
+
+    def last(self) -> Tuple[np.datetime64, float]:
+        """Return the timestamp and value of the most recent reading, or None if the store is empty."""
+        if self._size == 0:
+            return None
+        idx = self._head + self.capacity - 1
+        return self._times[idx:idx + 1].view("datetime64[ns]")[0], float(self._values[idx])
+
+    def to_df(self, n: int = None) -> pd.DataFrame:
+        """
+        Build a DataFrame of the most recent readings in the dashboard layout.
+
+        Args:
+            n (int, optional): The number of readings to include. Defaults to all stored readings.
+
+        Returns:
+            pd.DataFrame: A DataFrame with the sensor and timestamp columns.
+        """
+        times, values = self.window(n)
+        return pd.DataFrame({self.sensor: values.copy(), "timestamp": times.copy()})
+
+    @classmethod
+    def from_df(cls, df: pd.DataFrame, sensor: str, capacity: int) -> "SensorRingBuffer":
+        """
+        Create a store holding the most recent readings of a DataFrame.
+
+        Args:
+            df (pd.DataFrame): The readings with the sensor and timestamp columns.
+            sensor (str): The name of the sensor.
+            capacity (int): The maximum number of readings to keep.
+
+        Returns:
+            SensorRingBuffer: The populated store.
+        """
+        store = cls(sensor, capacity)
+        store.extend(df)
+        return store
@@ -0,0 +1,79 @@
+"""
+Versioned, checksummed snapshot files for warm-starting the dashboard.
+
+A snapshot is a JSON header line followed by an `.npz` payload of named arrays plus a JSON `meta` entry. The header
+holds the snapshot version and the SHA-256 of the payload, so a snapshot written by another version or damaged on
+disk is rejected instead of half-restored.
+"""
+
+import hashlib
+import io
+import json
+import os
+from pathlib import Path
+from typing import Dict, Tuple
+
+import numpy as np
+
+# Bump when the layout of the snapshot contents changes, older snapshots are then ignored
+SNAPSHOT_VERSION = 1
+SNAPSHOT_FORMAT = "plant-watch-snapshot"
+
+
+def write_snapshot(path: Path, meta: dict, arrays: Dict[str, np.ndarray]) -> None:
+    """
+    Atomically write a snapshot.
+
+    Args:
+        path (Path): The snapshot file.
+        meta (dict): JSON-serialisable metadata.
+        arrays (Dict[str, np.ndarray]): Named arrays, which must not hold Python objects.
+    """
+    buffer = io.BytesIO()
+    np.savez(buffer, meta=np.frombuffer(json.dumps(meta).encode(), dtype=np.uint8), **arrays)
+    payload = buffer.getvalue()
+    header = {
+        "format": SNAPSHOT_FORMAT,
+        "version": SNAPSHOT_VERSION,
+        "sha256": hashlib.sha256(payload).hexdigest(),
+        "size": len(payload),
+    }
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(json.dumps(header).encode() + b"\n")
+        f.write(payload)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
+
+def read_snapshot(path: Path) -> Tuple[dict, Dict[str, np.ndarray]]:
+    """
+    Read and verify a snapshot.
+
+    Args:
+        path (Path): The snapshot file.
+
+    Returns:
+        Tuple[dict, Dict[str, np.ndarray]]: The metadata and the named arrays.
+
+    Raises:
+        FileNotFoundError: If there is no snapshot.
+        ValueError: If the snapshot is from another version, truncated or fails its checksum.
+    """
+    with open(path, "rb") as f:
+        try:
+            header = json.loads(f.readline())
+        except ValueError:
+            raise ValueError("unreadable snapshot header")
+        payload = f.read()
+    if header.get("format") != SNAPSHOT_FORMAT or header.get("version") != SNAPSHOT_VERSION:
+        raise ValueError(f"snapshot version {header.get('version')}, expected {SNAPSHOT_VERSION}")
+    if len(payload) != header.get("size") or hashlib.sha256(payload).hexdigest() != header.get("sha256"):
+        raise ValueError("snapshot checksum mismatch")
+    with np.load(io.BytesIO(payload), allow_pickle=False) as npz:
+        arrays = {name: npz[name] for name in npz.files}
+    meta = json.loads(arrays.pop("meta").tobytes())
+    return meta, arrays
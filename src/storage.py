@@ -0,0 +1,561 @@
+import bisect
+import csv
+import io
+import json
+import os
+from datetime import datetime
+from pathlib import Path
+from typing import List, Tuple
+
+import numpy as np
+import pandas as pd
+
+from config import data_path, storage_backend
+
+# Rows between entries of the sparse time index kept for CSV logs
+CSV_INDEX_STRIDE = 1000
+
+# Packed fixed-size record of the binary logs: int64 epoch nanoseconds followed by a float32 value (12 bytes)
+RECORD_DTYPE = np.dtype([("timestamp", "<i8"), ("value", "<f4")])
+
+# Compacted partitions of the logs in a directory live under this sub-directory, next to their manifest
+PARTITION_DIR = "partitions"
+MANIFEST_VERSION = 1
+# Rewrites of each live log remembered for readers that have not caught up with them
+MANIFEST_REWRITES = 20
+
+
+def empty_frame(sensor: str) -> pd.DataFrame:
+    return pd.DataFrame({sensor: pd.Series(dtype=float), "timestamp": pd.Series(dtype="datetime64[ns]")})
+
+
+class PartitionManifest:
+    """
+    Index of the compacted partitions of a directory of sensor logs, kept in `partitions/manifest.json`.
+
+    Everything is kept per live log file name, so logs of both storage formats can share a directory. Records the time
+    bounds of every partition, how many bytes at the start of each live log have already been moved
+    into partitions, and how byte offsets map across rewrites of the live logs, so that range loads only open the
+    partitions they need and incremental readers can follow a live log through compaction.
+
+    Args:
+        root (Path): The directory holding the logs.
+    """
+
+    def __init__(self, root: Path) -> None:
+        self.root = Path(root) / PARTITION_DIR
+        self.path = self.root / "manifest.json"
+        self._stamp = None
+        self.data = self._empty()
+
+    @staticmethod
+    def _empty() -> dict:
+        return {"version": MANIFEST_VERSION, "partitions": {}, "heads": {}, "rewrites": {}, "retained_from": {}}
+
+    def refresh(self) -> "PartitionManifest":
+        """Reload the manifest if it changed on disk since the last call."""
+        try:
+            stat = os.stat(self.path)
+        except FileNotFoundError:
+            self._stamp, self.data = None, self._empty()
+            return self
+        # Saves replace the file, so the inode changes even when two saves share an mtime
+        stamp = (stat.st_ino, stat.st_mtime_ns)
+        if stamp != self._stamp:
+            with open(self.path) as f:
+                data = json.load(f)
+            if data.get("version") != MANIFEST_VERSION:
+                raise ValueError(f"Unsupported partition manifest version {data.get('version')} in {self.path}")
+            self._stamp, self.data = stamp, data
+        return self
+
+    def save(self) -> None:
+        """Atomically write the manifest."""
+        self.root.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        with open(tmp_path, "w") as f:
+            json.dump(self.data, f, indent=1)
+        os.replace(tmp_path, self.path)
+        stat = os.stat(self.path)
+        self._stamp = (stat.st_ino, stat.st_mtime_ns)
+
+    def entries(self, log_path: Path) -> dict:
+        """Return the manifest entries of the partitions of a live log by partition key."""
+        return self.data["partitions"].get(Path(log_path).name, {})
+
+    def partitions(self, log_path: Path, start: datetime = None, end: datetime = None) -> List[Path]:
+        """
+        Return the partition files of a live log that overlap a time range, oldest first.
+
+        Args:
+            log_path (Path): The live log.
+            start (datetime, optional): The start of the range. Defaults to unbounded.
+            end (datetime, optional): The end of the range. Defaults to unbounded.
+
+        Returns:
+            List[Path]: The partition files.
+        """
+        lo = None if start is None else pd.Timestamp(start).value
+        hi = None if end is None else pd.Timestamp(end).value
+        entries = sorted(self.entries(log_path).values(), key=lambda entry: entry["start"])
+        return [
+            self.root / entry["file"]
+            for entry in entries
+            if (lo is None or entry["end"] >= lo) and (hi is None or entry["start"] <= hi)
+        ]
+
+    def set_partition(self, log_path: Path, key: str, file_path: Path, df: pd.DataFrame, until: datetime) -> None:
+        """Record the file and time bounds of a partition holding the sorted rows of `df`, ending before `until`."""
+        self.data["partitions"].setdefault(Path(log_path).name, {})[key] = {
+            "file": Path(file_path).name,
+            "start": int(df["timestamp"].iloc[0].value),
+            "end": int(df["timestamp"].iloc[-1].value),
+            "until": int(pd.Timestamp(until).value),
+            "rows": len(df),
+        }
+
+    def remove_partition(self, log_path: Path, key: str) -> None:
+        self.entries(log_path).pop(key, None)
+
+    def retained_from(self, log_path: Path) -> int:
+        """Return the epoch nanoseconds before which the raw readings of a log were deleted, or None."""
+        return self.data["retained_from"].get(Path(log_path).name)
+
+    def head_start(self, log_path: Path) -> int:
+        """Return the byte offset of the first row of a live log that is not in a partition."""
+        try:
+            inode = os.stat(log_path).st_ino
+        except FileNotFoundError:
+            return 0
+        return self.data["heads"].get(Path(log_path).name, {}).get(str(inode), 0)
+
+    def set_head(self, log_path: Path, inode: int, offset: int) -> None:
+        """Record that the rows of a live log before `offset` have been moved into partitions."""
+        heads = self.data["heads"].setdefault(Path(log_path).name, {})
+        heads.pop(str(inode), None)
+        heads[str(inode)] = offset
+        # The file being rewritten and its replacement, in case the rewrite is interrupted
+        for stale in list(heads)[:-2]:
+            del heads[stale]
+
+    def add_rewrite(self, log_path: Path, from_inode: int, to_inode: int, dropped: int, header: int) -> None:
+        """
+        Record that a live log was replaced by a copy without its first `dropped` bytes, behind a `header` byte header.
+
+        Only the latest `MANIFEST_REWRITES` rewrites of each log are kept, a reader further behind starts over.
+        """
+        rewrites = self.data["rewrites"].setdefault(Path(log_path).name, [])
+        rewrites.append({"from_inode": from_inode, "to_inode": to_inode, "dropped": dropped, "header": header})
+        del rewrites[:-MANIFEST_REWRITES]
+
+    def follow(self, log_path: Path, inode: int, offset: int) -> int:
+        """
+        Map a byte offset in an earlier version of a live log to the same row in the current file.
+
+        Args:
+            log_path (Path): The live log.
+            inode (int): The inode of the file the offset refers to.
+            offset (int): The byte offset in that file.
+
+        Returns:
+            int: The offset in the current file, or None if the file was replaced by something other than compaction
+            or the offset falls in rows moved to the partitions.
+        """
+        rewrites = self.data["rewrites"].get(Path(log_path).name, [])
+        current = os.stat(log_path).st_ino
+        # Inode numbers can be reused by later rewrites, so walk forward from the latest rewrite of the reader's file
+        starts = [i for i, rewrite in enumerate(rewrites) if rewrite["from_inode"] == inode]
+        for rewrite in rewrites[starts[-1] :] if starts else []:
+            if rewrite["from_inode"] != inode:
+                continue
+            if offset < rewrite["dropped"]:
+                return None
+            inode, offset = rewrite["to_inode"], offset - rewrite["dropped"] + rewrite["header"]
+        return offset if inode == current else None
+
+
+_manifests = {}
+
+
+def get_manifest(root: Path) -> PartitionManifest:
+    """Return the shared, refreshed partition manifest of a directory of logs."""
+    key = str(Path(root).resolve())
+    if key not in _manifests:
+        _manifests[key] = PartitionManifest(root)
+    return _manifests[key].refresh()
+
+
+class LogBackend:
+    """
+    Shared loading of the live sensor logs together with their compacted partitions.
+
+    Subclasses implement `_load_head` for the live log and `read_partition` and `write_partition` for partition files
+    in the same format.
+
+    Args:
+        root (Path): The directory holding the logs.
+    """
+
+    suffix = None
+
+    def __init__(self, root: Path) -> None:
+        self.root = Path(root)
+
+    def log_path(self, sensor: str) -> Path:
+        return self.root / f"{sensor}_log{self.suffix}"
+
+    @property
+    def manifest(self) -> PartitionManifest:
+        return get_manifest(self.root)
+
+    def load(self, sensor: str, start: datetime = None, end: datetime = None) -> pd.DataFrame:
+        """
+        Load the readings of a sensor, optionally limited to a time range.
+
+        Only the partitions overlapping the range are read, followed by the rows of the live log that have not been
+        compacted yet.
+
+        Args:
+            sensor (str): The name of the sensor.
+            start (datetime, optional): The earliest reading to include. Defaults to the start of the log.
+            end (datetime, optional): The latest reading to include. Defaults to the end of the log.
+
+        Returns:
+            pd.DataFrame: A DataFrame with the sensor and timestamp columns.
+        """
+        manifest = self.manifest
+        frames = [self.read_partition(path, sensor) for path in manifest.partitions(self.log_path(sensor), start, end)]
+        head = self._load_head(sensor, start, end, manifest.head_start(self.log_path(sensor)))
+        if not frames:
+            return head
+        df = pd.concat(frames + [head], ignore_index=True)
+        if start is not None:
+            df = df[df["timestamp"] >= pd.Timestamp(start)]
+        if end is not None:
+            df = df[df["timestamp"] <= pd.Timestamp(end)]
+        return df.reset_index(drop=True)
+
+
+class CsvLogBackend(LogBackend):
+    """
+    Text storage of sensor readings, one `{sensor}_log.csv` per sensor.
+
+    Time range loads go through a sparse in-memory index of the timestamp and byte offset of every
+    `CSV_INDEX_STRIDE`th row. The index is extended with only the bytes appended since it was last updated, so a
+    range query reads the rows near the range rather than the whole log.
+
+    Args:
+        root (Path): The directory holding the logs.
+    """
+
+    suffix = ".csv"
+
+    def __init__(self, root: Path) -> None:
+        super().__init__(root)
+        self._index = {}
+
+    def append(self, sensor: str, rows: List[Tuple[float, datetime]]) -> None:
+        """
+        Append readings to a sensor log.
+
+        Args:
+            sensor (str): The name of the sensor.
+            rows (List[Tuple[float, datetime]]): The (value, timestamp) readings to append, oldest first.
+        """
+        file_path = self.log_path(sensor)
+        new_file = not file_path.exists()
+        with open(file_path, "ab") as f:
+            f.write(self.encode(sensor, rows, header=new_file))
+
+    def encode(self, sensor: str, rows: List[Tuple[float, datetime]], header: bool = False) -> bytes:
+        """
+        Encode readings as complete CSV rows.
+
+        Args:
+            sensor (str): The name of the sensor.
+            rows (List[Tuple[float, datetime]]): The (value, timestamp) readings, oldest first.
+            header (bool, optional): Start with the header row of a new log. Defaults to False.
+
+        Returns:
+            bytes: The encoded rows, each terminated by a newline.
+        """
+        buffer = io.StringIO()
+        sensor_writer = csv.writer(
+            buffer, delimiter=",", quotechar="|", quoting=csv.QUOTE_MINIMAL, lineterminator="\n"
+        )
+        if header:
+            sensor_writer.writerow([sensor, "timestamp"])
+        for value, timestamp in rows:
+            sensor_writer.writerow([value, timestamp.strftime("%Y-%m-%d %H:%M:%S")])
+        return buffer.getvalue().encode()
+
+    def trim_torn_tail(self, sensor: str) -> int:
+        """
+        Remove a partially written last row left by a crash.
+
+        Args:
+            sensor (str): The name of the sensor.
+
+        Returns:
+            int: The number of bytes removed.
+        """
+        file_path = self.log_path(sensor)
+        if not file_path.exists():
+            return 0
+        with open(file_path, "r+b") as f:
+            size = f.seek(0, 2)
+            pos = size
+            while pos > 0:
+                step = min(4096, pos)
+                f.seek(pos - step)
+                block = f.read(step)
+                newline = block.rfind(b"\n")
+                if newline >= 0:
+                    pos = pos - step + newline + 1
+                    break
+                pos -= step
+            f.truncate(pos)
+        return size - pos
+
+    def _update_index(self, sensor: str) -> dict:
+        """Extend the sparse time index of a log with the rows appended since the last update."""
+        file_path = self.log_path(sensor)
+        stat = file_path.stat()
+        index = self._index.get(sensor)
+        if index is None or index["inode"] != stat.st_ino or stat.st_size < index["end"]:
+            index = {"inode": stat.st_ino, "times": [], "offsets": [], "end": 0, "rows": 0}
+            self._index[sensor] = index
+        if stat.st_size == index["end"]:
+            return index
+        with open(file_path, "rb") as f:
+            f.seek(index["end"])
+            offset = index["end"]
+            for line in f:
+                if not line.endswith(b"\n"):
+                    # Half-written trailing row, index it once complete
+                    break
+                if index["rows"] % CSV_INDEX_STRIDE == 0:
+                    fields = line.split(b",")
+                    try:
+                        float(fields[0])
+                        index["times"].append(pd.Timestamp(fields[1].strip().decode()))
+                        index["offsets"].append(offset)
+                        index["rows"] += 1
+                    except (ValueError, IndexError):
+                        # Header row or a corrupt line
+                        pass
+                else:
+                    index["rows"] += 1
+                offset += len(line)
+        index["end"] = offset
+        return index
+
+    def _load_head(self, sensor: str, start: datetime, end: datetime, head_start: int) -> pd.DataFrame:
+        if start is None and end is None and head_start == 0:
+            df = pd.read_csv(self.log_path(sensor)).drop_duplicates().reset_index(drop=True)
+            df["timestamp"] = pd.to_datetime(df["timestamp"])
+            return df
+
+        index = self._update_index(sensor)
+        if not index["offsets"]:
+            return empty_frame(sensor)
+        lo = 0 if start is None else max(bisect.bisect_left(index["times"], pd.Timestamp(start)) - 1, 0)
+        hi = len(index["times"]) if end is None else bisect.bisect_right(index["times"], pd.Timestamp(end))
+        byte_start = max(index["offsets"][lo], head_start)
+        byte_end = index["offsets"][hi] if hi < len(index["offsets"]) else index["end"]
+        if byte_end <= byte_start:
+            return empty_frame(sensor)
+        with open(self.log_path(sensor), "rb") as f:
+            f.seek(byte_start)
+            chunk = f.read(byte_end - byte_start)
+
+        df = pd.read_csv(io.BytesIO(chunk), header=None, names=[sensor, "timestamp"]).drop_duplicates()
+        df["timestamp"] = pd.to_datetime(df["timestamp"])
+        if start is not None:
+            df = df[df["timestamp"] >= start]
+        if end is not None:
+            df = df[df["timestamp"] <= end]
+        return df.reset_index(drop=True)
+
+    def scan(self, sensor: str, start_offset: int = 0) -> pd.DataFrame:
+        """
+        Read the complete rows of a sensor log from a byte offset, with the byte offset just past each row.
+
+        Args:
+            sensor (str): The name of the sensor.
+            start_offset (int, optional): The byte offset to start from. Defaults to the start of the log.
+
+        Returns:
+            pd.DataFrame: A DataFrame with the sensor, timestamp and `end` offset columns, without the header row,
+            corrupt rows or a half-written trailing row.
+        """
+        values, times, ends = [], [], []
+        offset = start_offset
+        with open(self.log_path(sensor), "rb") as f:
+            f.seek(start_offset)
+            for line in f:
+                if not line.endswith(b"\n"):
+                    break
+                offset += len(line)
+                fields = line.split(b",")
+                try:
+                    value, timestamp = float(fields[0]), fields[1].strip().decode()
+                except (ValueError, IndexError):
+                    # Header row or a corrupt line
+                    continue
+                values.append(value)
+                times.append(timestamp)
+                ends.append(offset)
+        return pd.DataFrame({sensor: values, "timestamp": pd.to_datetime(times), "end": ends})
+
+    def read_partition(self, file_path: Path, sensor: str) -> pd.DataFrame:
+        df = pd.read_csv(file_path)
+        df["timestamp"] = pd.to_datetime(df["timestamp"])
+        return df
+
+    def write_partition(self, file_path: Path, sensor: str, df: pd.DataFrame) -> None:
+        tmp_path = file_path.with_suffix(".tmp")
+        df[[sensor, "timestamp"]].to_csv(tmp_path, index=False, date_format="%Y-%m-%d %H:%M:%S")
+        os.replace(tmp_path, file_path)
+
+
+class BinaryLogBackend(LogBackend):
+    """
+    Append-only binary storage of sensor readings, one `{sensor}_log.bin` of fixed-size records per sensor.
+
+    Each append is written as whole records in a single call and readers memory-map only the complete records, so
+    a torn write at the end of the file is never read back. Readings are appended in time order, so time ranges are
+    found by binary search over the memory-mapped timestamps without reading the rest of the file.
+
+    Args:
+        root (Path): The directory holding the logs.
+    """
+
+    suffix = ".bin"
+
+    def append(self, sensor: str, rows: List[Tuple[float, datetime]]) -> None:
+        """
+        Append readings to a sensor log.
+
+        Args:
+            sensor (str): The name of the sensor.
+            rows (List[Tuple[float, datetime]]): The (value, timestamp) readings to append, oldest first.
+        """
+        with open(self.log_path(sensor), "ab") as f:
+            f.write(self.encode(sensor, rows))
+
+    def encode(self, sensor: str, rows: List[Tuple[float, datetime]], header: bool = False) -> bytes:
+        """
+        Encode readings as complete fixed-size records.
+
+        Args:
+            sensor (str): The name of the sensor.
+            rows (List[Tuple[float, datetime]]): The (value, timestamp) readings, oldest first.
+            header (bool, optional): Unused, binary logs have no header. Defaults to False.
+
+        Returns:
+            bytes: The encoded records.
+        """
+        records = np.empty(len(rows), dtype=RECORD_DTYPE)
+        records["value"] = [value for value, _ in rows]
+        timestamps = pd.to_datetime([timestamp for _, timestamp in rows]).values.astype("datetime64[ns]")
+        records["timestamp"] = timestamps.astype(np.int64)
+        return records.tobytes()
+
+    def trim_torn_tail(self, sensor: str) -> int:
+        """
+        Remove a partially written last record left by a crash.
+
+        Args:
+            sensor (str): The name of the sensor.
+
+        Returns:
+            int: The number of bytes removed.
+        """
+        file_path = self.log_path(sensor)
+        if not file_path.exists():
+            return 0
+        size = file_path.stat().st_size
+        torn = size % RECORD_DTYPE.itemsize
+        if torn:
+            with open(file_path, "r+b") as f:
+                f.truncate(size - torn)
+        return torn
+
+    def memmap(self, sensor: str) -> np.ndarray:
+        """
+        Memory-map the complete records of a sensor log.
+
+        Args:
+            sensor (str): The name of the sensor.
+
+        Returns:
+            np.ndarray: A read-only structured array with `timestamp` and `value` fields.
+        """
+        file_path = self.log_path(sensor)
+        n_records = file_path.stat().st_size // RECORD_DTYPE.itemsize if file_path.exists() else 0
+        if n_records == 0:
+            return np.empty(0, dtype=RECORD_DTYPE)
+        return np.memmap(file_path, dtype=RECORD_DTYPE, mode="r", shape=(n_records,))
+
+    def _load_head(self, sensor: str, start: datetime, end: datetime, head_start: int) -> pd.DataFrame:
+        records = self.memmap(sensor)[head_start // RECORD_DTYPE.itemsize :]
+        times = records["timestamp"]
+        lo = 0 if start is None else np.searchsorted(times, pd.Timestamp(start).value, side="left")
+        hi = len(records) if end is None else np.searchsorted(times, pd.Timestamp(end).value, side="right")
+        return pd.DataFrame(
+            {
+                sensor: records["value"][lo:hi].astype(float),
+                "timestamp": pd.to_datetime(times[lo:hi]),
+            }
+        )
+
+    def scan(self, sensor: str, start_offset: int = 0) -> pd.DataFrame:
+        """
+        Read the complete records of a sensor log from a byte offset, with the byte offset just past each record.
+
+        Args:
+            sensor (str): The name of the sensor.
+            start_offset (int, optional): The byte offset to start from. Defaults to the start of the log.
+
+        Returns:
+            pd.DataFrame: A DataFrame with the sensor, timestamp and `end` offset columns.
+        """
+        first = start_offset // RECORD_DTYPE.itemsize
+        records = self.memmap(sensor)[first:]
+        return pd.DataFrame(
+            {
+                sensor: records["value"].astype(float),
+                "timestamp": pd.to_datetime(records["timestamp"]),
+                "end": (np.arange(len(records)) + first + 1) * RECORD_DTYPE.itemsize,
+            }
+        )
+
+    def read_partition(self, file_path: Path, sensor: str) -> pd.DataFrame:
+        records = np.fromfile(file_path, dtype=RECORD_DTYPE)
+        return pd.DataFrame({sensor: records["value"].astype(float), "timestamp": pd.to_datetime(records["timestamp"])})
+
+    def write_partition(self, file_path: Path, sensor: str, df: pd.DataFrame) -> None:
+        records = np.empty(len(df), dtype=RECORD_DTYPE)
+        records["value"] = df[sensor].values
+        records["timestamp"] = df["timestamp"].values.astype("datetime64[ns]").astype(np.int64)
+        tmp_path = file_path.with_suffix(".tmp")
+        records.tofile(tmp_path)
+        os.replace(tmp_path, file_path)
+
+
+storage_backends = {"csv": CsvLogBackend, "binary": BinaryLogBackend}
+
+
+def get_storage_backend(name: str = storage_backend, root: Path = data_path):
+    """
+    Create the storage backend selected in the config.
+
+    Args:
+        name (str, optional): The backend name, one of `storage_backends`. Defaults to `storage_backend` in the config.
+        root (Path, optional): The directory holding the logs. Defaults to `data_path`.
+
+    Returns:
+        CsvLogBackend | BinaryLogBackend: The storage backend.
+    """
+    return storage_backends[name](root)
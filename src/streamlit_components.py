@@ -1,18 +1,19 @@
-from datetime import date, datetime
-from typing import Tuple
+from datetime import date, datetime, timedelta
+from typing import Dict, Tuple
 
 import altair as alt
+import numpy as np
 import pandas as pd
 import streamlit as st
 from PIL import Image
 
-from config import data_path, image_path, sensor_dry, sensor_wet
-from sensor_calculations import (
-    calc_chart_limits,
-    calc_metrics,
-    convert_cap_to_moisture,
-    load_latest_data,
-)
+from config import chart_history_days, chart_max_points, chart_window_points, configured_sensors, image_path
+from downsample import lttb
+from instrumentation import timed
+from query import query_series
+from sensor_calculations import calc_chart_limits, calc_metrics, plant
+from sensor_store import SensorRingBuffer
+from window_stats import SensorStats
 
 
 def add_spacer(spacer_height: int) -> None:
@@ -24,9 +25,9 @@ def init_hero_components() -> Tuple[st.empty, st.empty]:
     # Centre the image
     left, mid, right = st.columns([1, 1, 2])
     with mid:
-        st.image(Image.open(image_path / "snake.png"), use_column_width=True)
+        st.image(Image.open(image_path / plant.image), use_column_width=True)
         st.markdown(
-            "<h3 style='text-align: center; color: white;'>Malfoy</h3>",
+            f"<h3 style='text-align: center; color: white;'>{plant.name}</h3>",
             unsafe_allow_html=True,
         )
     with right:
@@ -43,8 +44,10 @@ def init_hero_components() -> Tuple[st.empty, st.empty]:
     return hero, info
 
 
-def streamlit_init_layout(available_sensors: list, today: date) -> Tuple[dict, st.empty, st.empty]:
-    """Initialisation of streamlit app"""
+def streamlit_init_layout(
+    available_sensors: list, today: date, history: Dict[str, pd.DataFrame]
+) -> Tuple[dict, st.empty, st.empty]:
+    """Initialisation of streamlit app from the readings held by the data service"""
     sensor_dict = {}
     st.markdown(
         "<h1 style='text-align: center; color: white;'>Plant Monitoring</h1>",
@@ -58,19 +61,97 @@ def streamlit_init_layout(available_sensors: list, today: date) -> Tuple[dict, s
 
     for sensor in available_sensors:
         # Streamlit expects columns for each sensor
-        plot_df = load_latest_data(data_path / f"{sensor}_log.csv")
-        if sensor == "moisture":
-            plot_df[sensor] = convert_cap_to_moisture(
-                plot_df[sensor], sensor_dry, sensor_wet
-            )
-        sensor_dict = create_sensor_dict(plot_df, sensor, sensor_dict, today)
+        sensor_dict = create_sensor_dict(history[sensor], sensor, sensor_dict, today)
 
     st.markdown("## All Sensors")
-    sensor_dict["all"] = st.empty()
+    sensor_dict["all"] = CombinedChart({sensor: sensor_dict[sensor][2] for sensor in available_sensors})
     return sensor_dict, hero, info
 
 
-def plot_combined(plot_df: pd.DataFrame, sensor: str, chart_limits: list) -> st.empty:
+class CombinedChart:
+    """
+    The chart of every sensor together, built once and then extended with only the new readings.
+
+    Streamlit cannot patch a Plotly figure in the browser, so this is an Altair chart in long format whose new readings
+    are sent with `add_rows`. Appended rows pile up in the browser, so the chart is rebuilt from the downsampled stores
+    once the readings run past the end of its x-range or `rebuild_rows` rows have been appended.
+
+    Args:
+        stores (Dict[str, SensorRingBuffer]): The store of each charted sensor.
+        window (timedelta, optional): The span of the rolling x-range. Defaults to `chart_history_days`.
+        rebuild_rows (int, optional): Appended rows that trigger a rebuild. Defaults to `chart_max_points`.
+    """
+
+    def __init__(
+        self,
+        stores: Dict[str, SensorRingBuffer],
+        window: timedelta = timedelta(days=chart_history_days),
+        rebuild_rows: int = chart_max_points,
+    ) -> None:
+        self.stores = stores
+        self.window = window
+        self.rebuild_rows = rebuild_rows
+        self.placeholder = st.empty()
+        self.rebuild()
+
+    def _encode(self, df: pd.DataFrame, domain: list) -> alt.Chart:
+        return (
+            alt.Chart(df)
+            .mark_line()
+            .encode(
+                x=alt.X("timestamp:T", scale=alt.Scale(domain=domain)),
+                y=alt.Y("value:Q"),
+                color=alt.Color(
+                    "sensor:N",
+                    scale=alt.Scale(domain=list(self.stores), range=[configured_sensors[s] for s in self.stores]),
+                ),
+                tooltip=["sensor", "value", "timestamp"],
+            )
+            .interactive()
+        )
+
+    @timed("chart_rebuild")
+    def rebuild(self) -> None:
+        """Redraw the chart from the stores and move the x-range to end at the newest reading."""
+        frames = []
+        for sensor, store in self.stores.items():
+            times, values = store.window()
+            keep = lttb(times.view(np.int64), values, chart_max_points)
+            frames.append(
+                pd.DataFrame({"timestamp": times[keep], "sensor": sensor, "value": values[keep].astype(float)})
+            )
+        df = pd.concat(frames, ignore_index=True)
+        end = df["timestamp"].max() if len(df) else pd.Timestamp(datetime.now())
+        # Leave headroom past the newest reading so live readings land inside the range until the next rebuild
+        self.range_end = end + self.window / 10
+        # Vega-Lite takes the x domain in epoch milliseconds
+        domain = [pd.Timestamp(end - self.window).value / 10**6, pd.Timestamp(self.range_end).value / 10**6]
+        self.chart = self.placeholder.altair_chart(self._encode(df, domain), use_container_width=True)
+        self.appended = 0
+
+    @timed("chart_extend")
+    def extend(self, rows: pd.DataFrame) -> None:
+        """
+        Append new readings to the chart.
+
+        Args:
+            rows (pd.DataFrame): The new readings with `timestamp`, `sensor` and `value` columns.
+        """
+        if len(rows) == 0:
+            return
+        if rows["timestamp"].max() > self.range_end or self.appended + len(rows) > self.rebuild_rows:
+            # The stores already hold the new readings
+            self.rebuild()
+            return
+        self.chart.add_rows(rows)
+        self.appended += len(rows)
+
+
+def plot_combined(sensor: str, chart_limits: list) -> st.empty:
+    # The charted window downsampled server-side so the chart payload stays bounded
+    plot_df = query_series(
+        sensor, start=datetime.now() - timedelta(days=chart_history_days), max_points=chart_max_points
+    )
     # Plot (Plotly would be preferred but is not supported by the add_rows function)
     with st.expander(f"{sensor.capitalize()} timeseries"):
         chart = st.empty()
@@ -89,33 +170,37 @@ def plot_combined(plot_df: pd.DataFrame, sensor: str, chart_limits: list) -> st.
     return chart
 
 
-def create_sensor_info(plot_df: pd.DataFrame, sensor: str) -> Tuple[pd.DataFrame, st.dataframe]:
+def create_sensor_info(sensor: str, store: SensorRingBuffer) -> Tuple[st.empty, st.dataframe, SensorStats]:
     st.markdown(f"## {sensor.capitalize()}")
 
-    # Calculate metrics from loaded data
+    # Streaming metrics seeded from loaded data, later readings update them incrementally
+    stats = SensorStats()
+    stats.extend(*store.window())
     metrics_df = st.empty()
-    metrics_df.text(calc_metrics(plot_df))
+    metrics_df.text(calc_metrics(stats, sensor))
 
     # Datframe with historical data
     with st.expander(f"{sensor.capitalize()} dataframe"):
-        frame = st.dataframe(plot_df)
-    return metrics_df, frame
+        frame = st.dataframe(store.to_df())
+    return metrics_df, frame, stats
 
 
 def create_sensor_dict(plot_df: pd.DataFrame, sensor: str, sensor_dict: dict, current_day: datetime) -> dict:
     # Stores objects returned by function
     sensor_dict[sensor] = []
 
-    metrics_df, frame = create_sensor_info(plot_df, sensor)
+    store = SensorRingBuffer.from_df(plot_df, sensor, chart_window_points)
+    metrics_df, frame, stats = create_sensor_info(sensor, store)
 
     # Set the axis limits dynamically to the last month of data - TODO: Needs to be dynamic with sensor refreshes
     chart_limits = calc_chart_limits(current_day)
-    chart = plot_combined(plot_df, sensor, chart_limits)
+    chart = plot_combined(sensor, chart_limits)
 
     # Assign the ouput streamlit objects to the sensor dict object
     sensor_dict[sensor].append(frame)  # Index 0 - Streamlit df
     sensor_dict[sensor].append(chart)  # Index 1 - Streamlit chart
-    sensor_dict[sensor].append(plot_df)  # Index 2 - Initial df
+    sensor_dict[sensor].append(store)  # Index 2 - Sensor store
     sensor_dict[sensor].append(metrics_df)  # Index 3 - Metrics df
+    sensor_dict[sensor].append(stats)  # Index 4 - Streaming metrics
 
     return sensor_dict
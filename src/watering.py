@@ -0,0 +1,215 @@
+import json
+import os
+from pathlib import Path
+from typing import Callable, List
+
+import numpy as np
+import pandas as pd
+
+from config import watering_jump_pct
+from log_reader import open_log_reader
+from storage import get_storage_backend
+
+
+def watering_events(values: np.ndarray, jump_threshold: float, last_value: float = None) -> np.ndarray:
+    """
+    Find the readings where a watering shows as a rise in moisture percentage from the previous reading.
+
+    Args:
+        values (np.ndarray): Consecutive moisture percentages.
+        jump_threshold (float): The rise between readings that counts as a watering.
+        last_value (float, optional): The reading before `values`, if any.
+
+    Returns:
+        np.ndarray: The indices into `values` of the waterings.
+    """
+    prev = np.concatenate([[np.nan if last_value is None else last_value], values[:-1]])
+    return np.flatnonzero(values - prev > jump_threshold)
+
+
+class WateringDetector:
+    """
+    Stateful watering event detector fed incrementally from the moisture log.
+
+    Only rows appended since the last update are converted and compared, a watering event is emitted whenever the
+    moisture percentage jumps by more than `jump_threshold` between consecutive readings. The readings since the last
+    event are kept as the current cycle. The log offset, last reading, last event and the offset of the read that found
+    it are saved to `state_file`, so a restart resumes where it left off instead of rescanning the history and rebuilds
+    the cycle from that offset, or from the partitions once it has been compacted. Without saved state, the readings
+    already compacted out of the log are scanned from the newest partition back to the last watering.
+
+    Args:
+        file_path (Path): The path to the moisture log, in either storage format.
+        state_file (Path): The path of the file used to persist the detector state.
+        convert (Callable): Converts an array of raw sensor readings to moisture percentages.
+        jump_threshold (float): The increase in moisture percentage between readings that counts as a watering.
+    """
+
+    def __init__(
+        self, file_path: Path, state_file: Path, convert: Callable, jump_threshold: float = watering_jump_pct
+    ) -> None:
+        file_path = Path(file_path)
+        self.reader = open_log_reader(file_path)
+        self.backend = get_storage_backend("binary" if Path(file_path).suffix == ".bin" else "csv", file_path.parent)
+        self.state_file = Path(state_file)
+        self.convert = convert
+        self.jump_threshold = jump_threshold
+        self._clear()
+        self.load()
+
+    def _clear(self) -> None:
+        self.last_value = None
+        self.last_watered = None
+        self._cycle_times = []
+        self._cycle_values = []
+        # The inode and offset of the read that found the last watering, None when it was found in a partition
+        self._cycle_start = None
+
+    def update(self) -> List[pd.Timestamp]:
+        """
+        Consume the moisture readings appended since the last update.
+
+        Returns:
+            List[pd.Timestamp]: The watering events found in the new readings, oldest first.
+        """
+        fresh = self.reader.offset is None
+        start = [self.reader.inode, self.reader.offset]
+        rows = self.reader.read_rows()
+        if self.reader.reset:
+            print("Moisture log was replaced, rebuilding watering state")
+            self._clear()
+        if fresh or self.reader.reset:
+            start = [self.reader.inode, self.backend.manifest.head_start(self.reader.file_path)]
+        # Scan the partitions once the log exists, its rows continue where they end
+        rescan = (fresh and self.reader.offset is not None) or self.reader.reset
+        if not rows and not rescan:
+            return []
+
+        events = self._consume_partitions() if rescan else []
+        if rows:
+            values = np.asarray(self.convert(np.array([row[0] for row in rows])), dtype=float)
+            times = pd.to_datetime([row[1] for row in rows]).values.astype(np.int64)
+            events += self._consume(values, times, start)
+        self.save()
+        for event in events:
+            print(f"Watering detected at {event}")
+        return events
+
+    def _consume_partitions(self) -> List[pd.Timestamp]:
+        """Consume the compacted readings, loading partitions newest first only until one holds a watering."""
+        sensor = self.reader.sensor
+        frames = []
+        for file_path in reversed(self.backend.manifest.partitions(self.reader.file_path)):
+            frames.insert(0, self.backend.read_partition(file_path, sensor))
+            values = np.asarray(self.convert(frames[0][sensor].values), dtype=float)
+            if np.any(np.diff(values) > self.jump_threshold):
+                break
+        if not frames:
+            return []
+        df = pd.concat(frames, ignore_index=True)
+        values = np.asarray(self.convert(df[sensor].values), dtype=float)
+        return self._consume(values, df["timestamp"].values.astype("datetime64[ns]").astype(np.int64))
+
+    def _consume(self, values: np.ndarray, times: np.ndarray, start: list = None) -> List[pd.Timestamp]:
+        """
+        Detect the waterings in consecutive moisture percentages and extend the current cycle with them.
+
+        `start` is the inode and offset of the live log the readings were read from, None for partitions.
+        """
+        event_idx = watering_events(values, self.jump_threshold, self.last_value)
+
+        events = [pd.Timestamp(times[idx]) for idx in event_idx]
+        if len(event_idx) > 0:
+            # A new cycle starts at the latest watering
+            self.last_watered = events[-1]
+            self._cycle_times = times[event_idx[-1] :].tolist()
+            self._cycle_values = values[event_idx[-1] :].tolist()
+            self._cycle_start = start
+        else:
+            self._cycle_times.extend(times.tolist())
+            self._cycle_values.extend(values.tolist())
+        self.last_value = float(values[-1])
+        return events
+
+    def cycle_df(self) -> pd.DataFrame:
+        """
+        Return the readings of the current watering cycle.
+
+        Returns:
+            pd.DataFrame: A DataFrame of moisture percentages and timestamps since the last watering, or all readings if
+            no watering has been detected.
+        """
+        return pd.DataFrame(
+            {
+                "moisture": np.array(self._cycle_values, dtype=float),
+                "timestamp": pd.to_datetime(np.array(self._cycle_times, dtype=np.int64)),
+            }
+        )
+
+    def save(self) -> None:
+        """Atomically write the detector state to the state file."""
+        self.state_file.parent.mkdir(parents=True, exist_ok=True)
+        state = {
+            "offset": self.reader.offset,
+            "inode": self.reader.inode,
+            "last_value": self.last_value,
+            "last_watered": None if self.last_watered is None else self.last_watered.isoformat(),
+            "cycle_start": self._cycle_start,
+        }
+        tmp_file = self.state_file.with_suffix(".tmp")
+        with open(tmp_file, "w") as f:
+            json.dump(state, f)
+        os.replace(tmp_file, self.state_file)
+
+    def load(self) -> None:
+        """Restore the detector state from the state file if one exists."""
+        if not self.state_file.exists():
+            return
+        try:
+            with open(self.state_file) as f:
+                state = json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Could not load watering state, rescanning history: {e}")
+            return
+        self.reader.offset = state["offset"]
+        self.reader.inode = state["inode"]
+        self.last_value = state["last_value"]
+        self.last_watered = None if state["last_watered"] is None else pd.Timestamp(state["last_watered"])
+        self._cycle_start = state.get("cycle_start")
+        self._rebuild_cycle()
+
+    def _current_offset(self, inode: int, offset: int) -> int:
+        """Map an offset in a version of the moisture log to the current file, None if its rows were compacted."""
+        try:
+            if os.stat(self.reader.file_path).st_ino == inode:
+                return offset
+        except FileNotFoundError:
+            return None
+        return self.backend.manifest.follow(self.reader.file_path, inode, offset)
+
+    def _rebuild_cycle(self) -> None:
+        """Reload the readings of the current cycle up to the saved offset from the log and its partitions."""
+        if self.reader.offset is None:
+            return
+        end = self._current_offset(self.reader.inode, self.reader.offset)
+        if end is None:
+            # The log was replaced, the next update rebuilds the state
+            return
+        sensor = self.reader.sensor
+        manifest = self.backend.manifest
+        head_start = manifest.head_start(self.reader.file_path)
+        start = None if self._cycle_start is None else self._current_offset(*self._cycle_start)
+        frames = []
+        if start is None or start < head_start:
+            # The cycle starts in the partitions
+            partitions = manifest.partitions(self.reader.file_path, start=self.last_watered)
+            frames = [self.backend.read_partition(file_path, sensor) for file_path in partitions]
+            start = head_start
+        head = self.backend.scan(sensor, start)
+        frames.append(head.loc[head["end"] <= end, [sensor, "timestamp"]])
+        df = pd.concat(frames, ignore_index=True)
+        if self.last_watered is not None:
+            df = df[df["timestamp"] >= self.last_watered]
+        self._cycle_times = df["timestamp"].values.astype("datetime64[ns]").astype(np.int64).tolist()
+        self._cycle_values = np.asarray(self.convert(df[sensor].values), dtype=float).tolist()
+
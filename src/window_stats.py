@@ -0,0 +1,194 @@
+import heapq
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Dict, Union
+
+import numpy as np
+import pandas as pd
+
+from config import metrics_ewm_alpha, metrics_windows
+
+
+class WindowStats:
+    """
+    Mean, min, max and median of a sliding window of readings, maintained as readings arrive.
+
+    The sum gives the mean in O(1), monotonic deques give the min and max in amortised O(1), and the median comes from
+    a max-heap of the lower half and a min-heap of the upper half, where readings leaving the window are dropped
+    lazily once they reach the top of their heap, so each reading costs O(log n). Readings that left the window but
+    never reached a top are dropped by rebuilding both heaps once they outnumber the window, so the heaps stay within
+    twice the window whatever the trend of the readings.
+
+    Args:
+        size (int, optional): Keep the most recent `size` readings.
+        duration (timedelta, optional): Keep the readings within `duration` of the newest one.
+
+    Raises:
+        ValueError: If not exactly one of `size` and `duration` is given.
+    """
+
+    def __init__(self, size: int = None, duration: timedelta = None) -> None:
+        if (size is None) == (duration is None):
+            raise ValueError("Give exactly one of a window size or duration")
+        self.size = size
+        self.duration = None if duration is None else pd.Timedelta(duration).value
+        self._items = deque()
+        self._sum = 0.0
+        self._seq = 0
+        self._min = deque()
+        self._max = deque()
+        self._low = []
+        self._high = []
+        self._in_low = {}
+        self._removed = set()
+        self._n_low = 0
+        self._n_high = 0
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def add(self, timestamp: int, value: float) -> None:
+        """
+        Add a reading and drop the readings that leave the window.
+
+        Args:
+            timestamp (int): The time of the reading in epoch nanoseconds.
+            value (float): The value of the reading.
+        """
+        seq = self._seq
+        self._seq += 1
+        self._items.append((timestamp, seq, value))
+        self._sum += value
+        while self._min and self._min[-1][1] >= value:
+            self._min.pop()
+        self._min.append((seq, value))
+        while self._max and self._max[-1][1] <= value:
+            self._max.pop()
+        self._max.append((seq, value))
+
+        if self._n_low == 0 or value <= -self._low[0][0]:
+            heapq.heappush(self._low, (-value, seq))
+            self._in_low[seq] = True
+            self._n_low += 1
+        else:
+            heapq.heappush(self._high, (value, seq))
+            self._in_low[seq] = False
+            self._n_high += 1
+
+        while self._items and (
+            (self.size is not None and len(self._items) > self.size)
+            or (self.duration is not None and self._items[0][0] < timestamp - self.duration)
+        ):
+            self._evict()
+        self._rebalance()
+        if len(self._removed) > len(self._items):
+            self._compact()
+
+    def _evict(self) -> None:
+        _, seq, value = self._items.popleft()
+        self._sum -= value
+        if self._min[0][0] == seq:
+            self._min.popleft()
+        if self._max[0][0] == seq:
+            self._max.popleft()
+        self._removed.add(seq)
+        if self._in_low.pop(seq):
+            self._n_low -= 1
+        else:
+            self._n_high -= 1
+
+    def _compact(self) -> None:
+        # Amortised O(1) per reading, as at least len(self._items) removals happen between rebuilds
+        self._low = [(-value, seq) for _, seq, value in self._items if self._in_low[seq]]
+        self._high = [(value, seq) for _, seq, value in self._items if not self._in_low[seq]]
+        heapq.heapify(self._low)
+        heapq.heapify(self._high)
+        self._removed.clear()
+
+    def _prune(self, heap: list) -> None:
+        while heap and heap[0][1] in self._removed:
+            self._removed.discard(heapq.heappop(heap)[1])
+
+    def _rebalance(self) -> None:
+        # Keep the lower half equal to or one larger than the upper half
+        self._prune(self._low)
+        self._prune(self._high)
+        while self._n_low > self._n_high + 1:
+            value, seq = heapq.heappop(self._low)
+            heapq.heappush(self._high, (-value, seq))
+            self._in_low[seq] = False
+            self._n_low -= 1
+            self._n_high += 1
+            self._prune(self._low)
+        while self._n_high > self._n_low:
+            value, seq = heapq.heappop(self._high)
+            heapq.heappush(self._low, (-value, seq))
+            self._in_low[seq] = True
+            self._n_high -= 1
+            self._n_low += 1
+            self._prune(self._high)
+
+    def mean(self) -> float:
+        return self._sum / len(self._items) if self._items else np.nan
+
+    def min(self) -> float:
+        return self._min[0][1] if self._min else np.nan
+
+    def max(self) -> float:
+        return self._max[0][1] if self._max else np.nan
+
+    def median(self) -> float:
+        if not self._items:
+            return np.nan
+        if self._n_low > self._n_high:
+            return -self._low[0][0]
+        return (-self._low[0][0] + self._high[0][0]) / 2
+
+
+class SensorStats:
+    """
+    Streaming metrics of one sensor over several windows plus an exponentially weighted mean.
+
+    Args:
+        windows (Dict[str, Union[int, str]], optional): The windows by label, an int counts readings and a string is a
+            pandas duration such as "1h". Defaults to `metrics_windows`.
+        ewm_alpha (float, optional): The smoothing factor of the exponentially weighted mean. Defaults to
+            `metrics_ewm_alpha`.
+    """
+
+    def __init__(
+        self, windows: Dict[str, Union[int, str]] = metrics_windows, ewm_alpha: float = metrics_ewm_alpha
+    ) -> None:
+        self.windows = {
+            label: WindowStats(size=window) if isinstance(window, int) else WindowStats(duration=window)
+            for label, window in windows.items()
+        }
+        self.ewm_alpha = ewm_alpha
+        self.ewm = np.nan
+
+    def add(self, timestamp: datetime, value: float) -> None:
+        """
+        Add a reading to every window.
+
+        Args:
+            timestamp (datetime): The time of the reading.
+            value (float): The value of the reading.
+        """
+        self._add(pd.Timestamp(timestamp).value, float(value))
+
+    def extend(self, times: np.ndarray, values: np.ndarray) -> None:
+        """Add readings given as datetime64 timestamps and values, oldest first."""
+        for ts, value in zip(times.astype("datetime64[ns]").astype(np.int64).tolist(), values.tolist()):
+            self._add(ts, value)
+
+    def _add(self, ts: int, value: float) -> None:
+        for window in self.windows.values():
+            window.add(ts, value)
+        self.ewm = value if np.isnan(self.ewm) else self.ewm + self.ewm_alpha * (value - self.ewm)
+
+    def summary(self) -> Dict[str, dict]:
+        """Return the mean, min, max and median of each window by label."""
+        return {
+            label: {"mean": window.mean(), "min": window.min(), "max": window.max(), "median": window.median()}
+            for label, window in self.windows.items()
+        }
@@ -0,0 +1,27 @@
+import numpy as np
+
+from downsample import lttb
+
+
+def test_keeps_first_last_and_requested_count():
+    x = np.arange(1000)
+    y = np.sin(x / 50)
+    selected = lttb(x, y, 100)
+    assert len(selected) == 100
+    assert selected[0] == 0
+    assert selected[-1] == 999
+    assert np.all(np.diff(selected) > 0)
+
+
+def test_keeps_spikes():
+    x = np.arange(1000)
+    y = np.zeros(1000)
+    y[[123, 456, 789]] = [10.0, -10.0, 5.0]
+    selected = lttb(x, y, 50)
+    assert {123, 456, 789} <= set(selected.tolist())
+
+
+def test_short_series_is_returned_whole():
+    x = np.arange(10)
+    assert lttb(x, x, 20).tolist() == list(range(10))
+    assert lttb(x, x, 2).tolist() == list(range(10))
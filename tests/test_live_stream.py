@@ -0,0 +1,28 @@
+import time
+
+import pandas as pd
+
+from live_stream import StreamPublisher, StreamSubscriber, round_trip_check
+
+
+def test_round_trip_across_a_publisher_restart():
+    round_trip_check(timeout=10)
+
+
+def test_subscriber_wakes_when_a_reading_arrives():
+    publisher = StreamPublisher(["moisture"], host="localhost", port=0)
+    publisher.start()
+    subscriber = StreamSubscriber(host="localhost", port=publisher.address[1])
+    subscriber.start()
+    try:
+        while not publisher._clients:
+            time.sleep(0.01)
+        assert not subscriber.wait_for_readings(0.05)
+        publisher.publish("moisture", 1.0, pd.Timestamp("2024-01-01"))
+        started = time.monotonic()
+        assert subscriber.wait_for_readings(5)
+        assert time.monotonic() - started < 1
+        assert subscriber.read_new("moisture")["moisture"].tolist() == [1.0]
+    finally:
+        subscriber.stop()
+        publisher.close()
@@ -0,0 +1,94 @@
+import os
+
+import pandas as pd
+
+from compaction import compact_log
+from log_reader import open_log_reader
+from storage import get_storage_backend
+
+
+def append_rows(backend, start: int, n: int) -> None:
+    t0 = pd.Timestamp("2024-01-01")
+    backend.append("moisture", [(float(i), t0 + pd.Timedelta(hours=i)) for i in range(start, start + n)])
+
+
+def values(rows) -> list:
+    return [row[0] for row in rows]
+
+
+def test_reads_only_appended_rows(tmp_path):
+    backend = get_storage_backend("csv", tmp_path)
+    append_rows(backend, 0, 3)
+    reader = open_log_reader(backend.log_path("moisture"))
+    assert values(reader.read_rows()) == [0.0, 1.0, 2.0]
+    assert reader.read_rows() == []
+    append_rows(backend, 3, 2)
+    assert values(reader.read_rows()) == [3.0, 4.0]
+
+
+def test_half_written_row_is_left_for_the_next_read(tmp_path):
+    backend = get_storage_backend("csv", tmp_path)
+    append_rows(backend, 0, 2)
+    reader = open_log_reader(backend.log_path("moisture"))
+    with open(backend.log_path("moisture"), "ab") as f:
+        f.write(b"7.0,2024-01-0")
+    assert values(reader.read_rows()) == [0.0, 1.0]
+    with open(backend.log_path("moisture"), "ab") as f:
+        f.write(b"2T00:00:00\n")
+    assert values(reader.read_rows()) == [7.0]
+
+
+def test_tail_starts_from_the_last_rows(tmp_path):
+    for name in ["csv", "binary"]:
+        backend = get_storage_backend(name, tmp_path / name)
+        backend.root.mkdir()
+        append_rows(backend, 0, 5)
+        reader = open_log_reader(backend.log_path("moisture"))
+        assert values(reader.read_rows(tail=2)) == [3.0, 4.0]
+
+
+def test_truncated_log_is_reread_with_reset(tmp_path):
+    backend = get_storage_backend("csv", tmp_path)
+    append_rows(backend, 0, 3)
+    reader = open_log_reader(backend.log_path("moisture"))
+    reader.read_rows()
+    os.remove(backend.log_path("moisture"))
+    append_rows(backend, 10, 1)
+    assert values(reader.read_rows()) == [10.0]
+    assert reader.reset
+
+
+def test_compacted_log_is_followed_to_the_same_row(tmp_path):
+    for name in ["csv", "binary"]:
+        backend = get_storage_backend(name, tmp_path / name)
+        backend.root.mkdir()
+        append_rows(backend, 0, 48)
+        reader = open_log_reader(backend.log_path("moisture"))
+        reader.read_rows()
+        compact_log(backend, "moisture", pd.Timestamp("2024-01-02"))
+        append_rows(backend, 48, 2)
+        assert values(reader.read_rows()) == [48.0, 49.0]
+        assert not reader.reset
+
+
+def test_seek_end_returns_the_last_row_and_skips_it(tmp_path):
+    for name in ["csv", "binary"]:
+        backend = get_storage_backend(name, tmp_path / name)
+        backend.root.mkdir()
+        append_rows(backend, 0, 3)
+        reader = open_log_reader(backend.log_path("moisture"))
+        last = reader.seek_end()
+        assert last[0] == 2.0
+        assert pd.Timestamp(last[1]) == pd.Timestamp("2024-01-01 02:00")
+        assert reader.read_rows() == []
+        append_rows(backend, 3, 2)
+        assert values(reader.read_rows()) == [3.0, 4.0]
+
+
+def test_seek_end_on_a_missing_log_reads_it_whole_once_created(tmp_path):
+    backend = get_storage_backend("csv", tmp_path)
+    reader = open_log_reader(backend.log_path("moisture"))
+    assert reader.seek_end() is None
+    append_rows(backend, 0, 3)
+    assert values(reader.read_rows()) == [0.0, 1.0, 2.0]
+    assert not reader.reset
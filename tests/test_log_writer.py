@@ -0,0 +1,34 @@
+from datetime import datetime
+
+from clock import ScaledClock
+from log_writer import BufferedLogWriter, write_all
+from storage import get_storage_backend
+
+
+class ShortWrites:
+    """A raw file that accepts at most three bytes per write."""
+
+    def __init__(self) -> None:
+        self.data = b""
+
+    def write(self, data) -> int:
+        self.data += bytes(data[:3])
+        return min(len(data), 3)
+
+
+def test_write_all_repeats_partial_writes():
+    f = ShortWrites()
+    write_all(f, b"0.5,2024-01-01T00:00:00\n")
+    assert f.data == b"0.5,2024-01-01T00:00:00\n"
+
+
+def test_flush_interval_follows_the_clock(tmp_path):
+    backend = get_storage_backend("csv", tmp_path)
+    clock = ScaledClock(speedup=1000)
+    writer = BufferedLogWriter(backend, ["moisture"], flush_rows=100, flush_interval=3600, clock=clock)
+    writer.write("moisture", 1.0, datetime(2024, 1, 1))
+    assert backend.load("moisture").empty
+    clock.sleep(3600)
+    writer.flush_if_due()
+    assert backend.load("moisture")["moisture"].tolist() == [1.0]
+    writer.close()
@@ -0,0 +1,47 @@
+import pandas as pd
+
+from sensor_calculations import poll_sensors
+from sensor_store import SensorRingBuffer
+from window_stats import SensorStats
+
+
+class Placeholder:
+    """Stands in for the Streamlit elements, recording what they were sent."""
+
+    def __init__(self) -> None:
+        self.rows = []
+
+    def add_rows(self, df: pd.DataFrame) -> None:
+        self.rows.append(df)
+
+    def extend(self, df: pd.DataFrame) -> None:
+        self.rows.append(df)
+
+    def text(self, text: str) -> None:
+        pass
+
+
+def sensor_dict(sensors: list) -> dict:
+    sensor_dict = {"all": Placeholder()}
+    for sensor in sensors:
+        sensor_dict[sensor] = [Placeholder(), Placeholder(), SensorRingBuffer(sensor, 100), Placeholder(), SensorStats()]
+    return sensor_dict
+
+
+def test_every_new_reading_is_stored_and_charted():
+    sensors = sensor_dict(["moisture", "temperature"])
+    times = pd.date_range("2024-01-01", periods=3, freq="1min")
+    updates = {"moisture": pd.DataFrame({"moisture": [1.0, 2.0, 3.0], "timestamp": times})}
+    _, new_vals, sensor_time = poll_sensors(sensors, ["moisture", "temperature"], updates)
+    assert new_vals == [3.0, None]
+    assert pd.Timestamp(sensor_time) == times[-1]
+    assert sensors["moisture"][2].values().tolist() == [1.0, 2.0, 3.0]
+    assert sensors["all"].rows[0]["value"].tolist() == [1.0, 2.0, 3.0]
+
+
+def test_sensors_without_readings_are_not_rendered():
+    sensors = sensor_dict(["moisture"])
+    _, new_vals, sensor_time = poll_sensors(sensors, ["moisture"], {})
+    assert new_vals == [None]
+    assert sensor_time is None
+    assert sensors["all"].rows == []
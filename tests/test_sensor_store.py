@@ -0,0 +1,47 @@
+import numpy as np
+import pandas as pd
+
+from sensor_store import SensorRingBuffer
+
+
+def readings(n: int, start: int = 0) -> pd.DataFrame:
+    return pd.DataFrame(
+        {
+            "moisture": np.arange(start, start + n, dtype=float),
+            "timestamp": pd.date_range("2024-01-01", periods=n, freq="1min") + pd.Timedelta(minutes=start),
+        }
+    )
+
+
+def test_window_is_most_recent_readings_oldest_first():
+    store = SensorRingBuffer.from_df(readings(5), "moisture", capacity=3)
+    times, values = store.window()
+    assert len(store) == 3
+    assert values.tolist() == [2.0, 3.0, 4.0]
+    assert list(times) == list(readings(5)["timestamp"].values[2:])
+
+
+def test_append_and_extend_wrap_around():
+    store = SensorRingBuffer("moisture", capacity=4)
+    store.extend(readings(3))
+    store.append(pd.Timestamp("2024-01-02"), 10.0)
+    store.extend(readings(2, start=20))
+    assert store.values().tolist() == [2.0, 10.0, 20.0, 21.0]
+    assert store.values(2).tolist() == [20.0, 21.0]
+    assert store.last() == (np.datetime64(pd.Timestamp("2024-01-01 00:21:00")), 21.0)
+
+
+def test_window_is_a_view():
+    store = SensorRingBuffer.from_df(readings(10), "moisture", capacity=8)
+    _, values = store.window()
+    assert values.base is not None
+
+
+def test_to_df_round_trips():
+    df = readings(6)
+    store = SensorRingBuffer.from_df(df, "moisture", capacity=10)
+    pd.testing.assert_frame_equal(store.to_df(), df.astype({"moisture": np.float32}))
+
+
+def test_last_is_none_when_empty():
+    assert SensorRingBuffer("moisture", capacity=4).last() is None
@@ -0,0 +1,69 @@
+from datetime import timedelta
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from window_stats import SensorStats, WindowStats
+
+
+def test_count_window_matches_pandas():
+    rng = np.random.default_rng(0)
+    values = rng.normal(50, 10, 500)
+    window = WindowStats(size=25)
+    for i, value in enumerate(values):
+        window.add(i, value)
+        expected = pd.Series(values[max(0, i - 24) : i + 1])
+        assert window.mean() == pytest.approx(expected.mean())
+        assert window.min() == expected.min()
+        assert window.max() == expected.max()
+        assert window.median() == pytest.approx(expected.median())
+
+
+def test_duration_window_drops_old_readings():
+    window = WindowStats(duration=timedelta(minutes=10))
+    minute = pd.Timedelta(minutes=1).value
+    for i in range(30):
+        window.add(i * minute, float(i))
+    assert len(window) == 11
+    assert window.min() == 19.0
+    assert window.max() == 29.0
+
+
+def test_needs_exactly_one_bound():
+    with pytest.raises(ValueError):
+        WindowStats()
+    with pytest.raises(ValueError):
+        WindowStats(size=10, duration=timedelta(hours=1))
+
+
+def test_sensor_stats_extend_matches_add():
+    times = pd.date_range("2024-01-01", periods=100, freq="1min")
+    values = np.linspace(80, 20, 100)
+    added, extended = SensorStats(), SensorStats()
+    for ts, value in zip(times, values):
+        added.add(ts, value)
+    extended.extend(times.values, values)
+    assert added.summary() == extended.summary()
+    assert added.ewm == pytest.approx(extended.ewm)
+
+
+def test_heaps_stay_bounded_on_a_monotonic_series():
+    window = WindowStats(size=50)
+    values = np.linspace(80, 20, 20000)
+    for i, value in enumerate(values):
+        window.add(i, value)
+    assert window.median() == pytest.approx(np.median(values[-50:]))
+    assert len(window._low) + len(window._high) <= 2 * 50 + 1
+    assert len(window._removed) <= 50 + 1
+    assert len(window._in_low) == 50
+
+
+def test_median_stays_correct_across_rebuilds():
+    rng = np.random.default_rng(1)
+    values = np.concatenate([np.linspace(0, 100, 3000), rng.normal(50, 20, 3000), np.linspace(100, 0, 3000)])
+    window = WindowStats(size=37)
+    for i, value in enumerate(values):
+        window.add(i, value)
+        if i % 97 == 0:
+            assert window.median() == pytest.approx(np.median(values[max(0, i - 36) : i + 1]))